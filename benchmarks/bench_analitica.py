@@ -0,0 +1,168 @@
+"""Co-matrícula con matrices dispersas contra SQL: compañeros de un estudiante y solapamiento entre cursos.
+
+Sobre una base sintética de --estudiantes x --cursos (generador, popularidad tipo Zipf):
+
+1. carga completa de la matriz (tiempo, matrículas, memoria);
+2. top-k compañeros de --muestra estudiantes: bincount sobre la matriz contra un self-join de `matricula`
+   agrupado por estudiante (p50 y p95);
+3. solapamiento de todos los pares de cursos: A^T A contra el self-join agrupado por par (una vez; --sin-sql
+   lo omite, en bases grandes tarda minutos);
+4. refresco incremental desde el feed tras --escrituras matrículas/desmatrículas y el borrado de un curso,
+   contra recargar la matriz entera; comprueba que ambas quedan iguales;
+5. la misma consulta otra vez: la respuesta sale de la caché.
+
+Sale con código 1 si la matriz incremental difiere de la recargada o si el top-k no coincide con el de SQL.
+
+Uso: python -m benchmarks.bench_analitica --estudiantes 100000 --cursos 1000 --muestra 200 --escrituras 1000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _percentil(valores, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=100000)
+    parser.add_argument("--cursos", type=int, default=1000)
+    parser.add_argument("--muestra", type=int, default=200, help="Estudiantes para el top-k de compañeros")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--escrituras", type=int, default=1000, help="Cambios antes del refresco incremental")
+    parser.add_argument("--sin-sql", action="store_true", help="No medir el solapamiento completo con SQL")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'analitica.db')}"
+    os.environ["SLOW_QUERY_MS"] = "0"
+
+    import numpy as np
+    from sqlalchemy import text
+    from sqlmodel import Session, select
+
+    from benchmarks.generador import generar
+    from data.models import Curso, Estudiante
+    from operations import analitica, operations_db as ops
+    from utils.cache import cache
+    from utils.db import engine
+
+    rnd = random.Random(args.semilla)
+    t0 = time.perf_counter()
+    generar(engine, args.estudiantes, args.cursos)
+    print(f"base generada en {time.perf_counter() - t0:.1f}s")
+    fallos = []
+
+    # 1. Carga completa
+    with Session(engine) as s:
+        t0 = time.perf_counter()
+        matriz = analitica.cargar(s)
+        carga = time.perf_counter() - t0
+    estado = matriz.estado()
+    print(f"carga completa:      {carga * 1000:.0f} ms, {estado['matriculas']} matrículas, "
+          f"{estado['estudiantes']} x {estado['cursos']}, {estado['memoria_bytes'] / 2**20:.1f} MB")
+
+    # 2. Compañeros
+    sql_companeros = text(
+        "SELECT m2.estudiante_id, COUNT(*) AS n FROM matricula m1 "
+        "JOIN matricula m2 ON m2.curso_id = m1.curso_id AND m2.estudiante_id != m1.estudiante_id "
+        "JOIN estudiante e ON e.id = m2.estudiante_id AND NOT e.is_deleted "
+        "JOIN curso c ON c.id = m1.curso_id AND NOT c.is_deleted "
+        "WHERE m1.estudiante_id = :id GROUP BY m2.estudiante_id ORDER BY n DESC, m2.estudiante_id LIMIT :k"
+    )
+    muestra = rnd.sample(matriz.estudiantes.tolist(), min(args.muestra, len(matriz.estudiantes)))
+    tiempos_sql, tiempos_np, distintos = [], [], 0
+    with Session(engine) as s:
+        for est_id in muestra:
+            t0 = time.perf_counter()
+            esperado = [tuple(f) for f in s.execute(sql_companeros, {"id": est_id, "k": args.k}).all()]
+            tiempos_sql.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            obtenido = matriz.companeros(est_id, args.k)["top"]
+            tiempos_np.append((time.perf_counter() - t0) * 1000)
+            if [(c["estudiante_id"], c["compartidos"]) for c in obtenido] != esperado:
+                distintos += 1
+    print(f"\n{'compañeros (k=' + str(args.k) + ')':<22} {'p50 ms':>9} {'p95 ms':>9}")
+    for nombre, tiempos in (("SQL self-join", tiempos_sql), ("matriz dispersa", tiempos_np)):
+        print(f"{nombre:<22} {statistics.median(tiempos):>9.2f} {_percentil(tiempos, 0.95):>9.2f}")
+    print(f"{'x':<22} {statistics.median(tiempos_sql) / statistics.median(tiempos_np):>8.0f}x")
+    if distintos:
+        fallos.append(f"{distintos} top-k distintos de SQL")
+
+    # 3. Solapamiento entre todos los pares de cursos
+    t0 = time.perf_counter()
+    solapamiento = matriz.solapamiento
+    t_np = time.perf_counter() - t0
+    pares_np = (solapamiento.nnz - len(matriz.cursos)) // 2
+    print(f"\nsolapamiento A^T A:  {t_np * 1000:.0f} ms, {pares_np} pares con estudiantes en común")
+    if not args.sin_sql:
+        with Session(engine) as s:
+            t0 = time.perf_counter()
+            pares_sql = s.execute(text(
+                "SELECT COUNT(*) FROM (SELECT m1.curso_id, m2.curso_id FROM matricula m1 "
+                "JOIN matricula m2 ON m2.estudiante_id = m1.estudiante_id AND m2.curso_id > m1.curso_id "
+                "JOIN estudiante e ON e.id = m1.estudiante_id AND NOT e.is_deleted "
+                "GROUP BY m1.curso_id, m2.curso_id)"
+            )).scalar()
+            t_sql = time.perf_counter() - t0
+        print(f"solapamiento SQL:    {t_sql * 1000:.0f} ms, {pares_sql} pares ({t_sql / t_np:.0f}x)")
+    t0 = time.perf_counter()
+    matriz.pares(20)
+    print(f"top 20 pares:        {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    # 4. Refresco incremental
+    with Session(engine) as s:
+        cursos = s.exec(select(Curso.id).where(Curso.is_deleted == False)).all()  # noqa: E712
+        estudiantes = s.exec(select(Estudiante.id).where(Estudiante.is_deleted == False)).all()  # noqa: E712
+    hechos = 0
+    with Session(engine) as s:
+        while hechos < args.escrituras:
+            est_id, curso_id = rnd.choice(estudiantes), rnd.choice(cursos)
+            try:
+                if matriz._indice(matriz.estudiantes, est_id) is not None and rnd.random() < 0.5:
+                    fila = matriz._indice(matriz.estudiantes, est_id)
+                    curso_id = int(matriz.cursos[rnd.choice(matriz.csr.indices[matriz.csr.indptr[fila]:matriz.csr.indptr[fila + 1]])])
+                    ops.desmatricular(s, est_id, curso_id)
+                else:
+                    ops.matricular(s, est_id, curso_id, "ignorar")
+                hechos += 1
+            except Exception:
+                s.rollback()
+        ops.eliminar_curso(s, int(matriz.cursos[len(matriz.cursos) // 2]))
+    with Session(engine) as s:
+        t0 = time.perf_counter()
+        incremental, tipo = analitica.refrescar(s, matriz)
+        t_inc = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        recargada = analitica.cargar(s)
+        t_full = time.perf_counter() - t0
+    iguales = np.array_equal(incremental.est_ids, recargada.est_ids) and np.array_equal(incremental.cur_ids, recargada.cur_ids)
+    print(f"\nrefresco {tipo}: {t_inc * 1000:.0f} ms tras {hechos + 1} cambios "
+          f"(recarga completa {t_full * 1000:.0f} ms, {t_full / t_inc:.1f}x); iguales: {iguales}")
+    if not iguales:
+        fallos.append("la matriz incremental difiere de la recargada")
+
+    # 5. Caché
+    analitica.analitica.matriz = incremental
+    analitica.analitica._ultimo_chequeo = time.monotonic()
+    cache.clear()
+    with Session(engine) as s:
+        for etiqueta in ("sin caché", "con caché"):
+            t0 = time.perf_counter()
+            analitica.solapamiento_curso(s, int(incremental.cursos[0]), args.k)
+            print(f"solapamiento de un curso ({etiqueta}): {(time.perf_counter() - t0) * 1000:.2f} ms")
+
+    if fallos:
+        print(f"ERROR: {fallos}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Archivo de eliminados: borrado masivo por filtro, tarea de archivado y consultas sobre tablas calientes.
+
+Sobre una base sintética de --estudiantes:
+
+1. borra --por-fila estudiantes de un semestre uno a uno (DELETE /estudiantes/{id}) y el resto de
+   --semestres-borrados semestres con un solo UPDATE por filtro, y compara el costo por fila;
+2. envejece los borrados y ejecuta la tarea de archivado en lotes de --lote (filas/s y duración del lote
+   más largo, que es lo que bloquea a las escrituras concurrentes en SQLite);
+3. mide las consultas que recorren la tabla (búsqueda ILIKE, exportación de matrículas, reconciliación)
+   antes y después de archivar;
+4. restaura un estudiante archivado y un semestre completo por filtro, y comprueba con la reconciliación
+   que los contadores no derivan en ningún paso. Sale con código 1 si derivan.
+
+Uso: python -m benchmarks.bench_archivo --estudiantes 50000 --cursos 500 --semestres-borrados 6 --lote 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _medir(fn, repeticiones: int) -> float:
+    fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=50000)
+    parser.add_argument("--cursos", type=int, default=500)
+    parser.add_argument("--semestres-borrados", type=int, default=6, help="Semestres 1..N pasan a eliminados")
+    parser.add_argument("--por-fila", type=int, default=200, help="Borrados uno a uno para comparar")
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'archivo.db')}"
+    os.environ["CACHE_BACKEND"] = "ninguno"
+    os.environ["SLOW_QUERY_MS"] = "0"
+
+    from datetime import timedelta
+    from sqlalchemy import update, func
+    from sqlmodel import Session, select
+
+    from benchmarks.generador import generar
+    from data.models import Estudiante, EstudianteArchivo, MatriculaArchivo, Matricula, ahora
+    from operations import archivo, estadisticas, operations_db as ops
+    from operations.exportacion import exportar
+    from utils.db import engine
+    from utils.indices import analizar
+
+    generar(engine, args.estudiantes, args.cursos)
+
+    deriva = []
+
+    def reconciliar(paso: str) -> None:
+        with Session(engine) as s:
+            corregidas = estadisticas.reconciliar(s)
+        if any(corregidas.values()):
+            deriva.append((paso, corregidas))
+        print(f"  reconciliación tras {paso}: {corregidas}")
+
+    def contar(modelo) -> int:
+        with Session(engine) as s:
+            return s.exec(select(func.count()).select_from(modelo)).one()
+
+    def consultas():
+        def exportar_todo():
+            for _ in exportar(engine, "matriculas", filtros={}):
+                pass
+        casos = {
+            "búsqueda ILIKE": lambda: ops.buscar_estudiante_por_nombre(Session(engine), "mar"),
+            "exportar matrículas": exportar_todo,
+            "reconciliar": lambda: estadisticas.reconciliar(Session(engine)),
+        }
+        return {nombre: _medir(fn, args.repeticiones) for nombre, fn in casos.items()}
+
+    # 1. Borrado por fila contra borrado por filtro
+    with Session(engine) as s:
+        ultimo = s.exec(select(func.max(Estudiante.id))).one()
+        uno_a_uno = s.exec(
+            select(Estudiante.id).where(Estudiante.semestre == 1, Estudiante.id < ultimo).limit(args.por_fila)
+        ).all()
+    t0 = time.perf_counter()
+    for est_id in uno_a_uno:
+        with Session(engine) as s:
+            ops.eliminar_estudiante(s, est_id)
+    por_fila = (time.perf_counter() - t0) / max(len(uno_a_uno), 1) * 1000
+    t0 = time.perf_counter()
+    masivos = 0
+    for semestre in range(1, args.semestres_borrados + 1):
+        with Session(engine) as s:
+            masivos += ops.cambiar_estado_estudiantes(s, True, {"semestre": semestre})["afectados"]
+    duracion = time.perf_counter() - t0
+    print(f"borrado uno a uno:    {len(uno_a_uno)} filas, {por_fila:.2f} ms/fila")
+    print(f"borrado por filtro:   {masivos} filas en {duracion * 1000:.0f} ms "
+          f"({duracion / max(masivos, 1) * 1000:.3f} ms/fila, {por_fila / (duracion / max(masivos, 1) * 1000):.0f}x)")
+    reconciliar("borrado por filtro")
+
+    # 2. Archivado
+    antes = consultas()
+    calientes = (contar(Estudiante), contar(Matricula))
+    with Session(engine) as s:
+        s.exec(update(Estudiante).where(Estudiante.is_deleted == True)  # noqa: E712
+               .values(eliminado_en=ahora() - timedelta(days=archivo.ARCHIVO_RETENCION_DIAS + 1)))
+        s.commit()
+    lotes = []
+    original = archivo._archivar_lote
+
+    def cronometrado(*a, **k):
+        t = time.perf_counter()
+        try:
+            return original(*a, **k)
+        finally:
+            lotes.append((time.perf_counter() - t) * 1000)
+
+    archivo._archivar_lote = cronometrado
+    t0 = time.perf_counter()
+    resultado = archivo.archivar(engine, lote=args.lote)
+    duracion = time.perf_counter() - t0
+    archivo._archivar_lote = original
+    analizar(engine)
+    print(f"archivado:            {resultado['estudiantes']} estudiantes y {resultado['matriculas']} matrículas en "
+          f"{duracion:.2f}s ({resultado['estudiantes'] / duracion:.0f} filas/s), {resultado['lotes']} lotes, "
+          f"lote más largo {max(lotes):.0f} ms")
+    print(f"tablas calientes:     estudiante {calientes[0]} -> {contar(Estudiante)}, "
+          f"matricula {calientes[1]} -> {contar(Matricula)} "
+          f"(archivo: {contar(EstudianteArchivo)} / {contar(MatriculaArchivo)})")
+    reconciliar("archivado")
+    despues = consultas()
+    print(f"\n{'consulta':<22} {'antes ms':>9} {'después ms':>11} {'x':>6}")
+    for nombre in antes:
+        print(f"{nombre:<22} {antes[nombre]:>9.1f} {despues[nombre]:>11.1f} {antes[nombre] / despues[nombre]:>5.1f}x")
+
+    # 3. Restauración desde el archivo
+    print()
+    with Session(engine) as s:
+        archivado = s.exec(select(EstudianteArchivo.id).order_by(EstudianteArchivo.id)).first()
+        cursos_antes = s.exec(select(func.count()).select_from(MatriculaArchivo)
+                              .where(MatriculaArchivo.estudiante_id == archivado)).one()
+    t0 = time.perf_counter()
+    with Session(engine) as s:
+        ops.restaurar_estudiante(s, archivado)
+    print(f"restaurar archivado:  estudiante {archivado} ({cursos_antes} matrículas) en "
+          f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+    t0 = time.perf_counter()
+    with Session(engine) as s:
+        r = ops.cambiar_estado_estudiantes(s, False, {"semestre": args.semestres_borrados})
+    print(f"restaurar por filtro: semestre {args.semestres_borrados}: {r['afectados']} filas "
+          f"({r['desarchivados']} desde el archivo) en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    reconciliar("restauración")
+    with Session(engine) as s:
+        eliminados = len(ops.listar_estudiantes_eliminados(s))
+    print(f"/estudiantes/deleted: {eliminados} (tabla caliente + archivo)")
+
+    if deriva:
+        print(f"ERROR: los contadores derivaron: {deriva}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Arranque en frío: import de main, startup de la app y latencia de las primeras peticiones.
+
+Cada muestra es un proceso nuevo de Python (como un worker o una instancia serverless recién
+creada) sobre la misma base ya poblada, y mide por separado:
+  import   -> `import main` (módulos propios y dependencias)
+  startup  -> eventos de arranque (verificación de esquema, etc.)
+  primera  -> primera petición a cada ruta (conexión, compilación de SQL, caches vacías)
+  segunda  -> la misma petición ya en caliente
+
+Uso: python -m benchmarks.bench_arranque --muestras 7 --estudiantes 20000 --cursos 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HIJO = r"""
+import json, time
+from fastapi.testclient import TestClient   # fuera de la medición: solo lo usa el benchmark
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+cliente = TestClient(main.app)
+cliente.__enter__()
+t2 = time.perf_counter()
+res = {"import": t1 - t0, "startup": t2 - t1}
+for ruta in ("/estudiantes/?limit=20", "/estudiantes/1", "/cursos/1/estudiantes"):
+    for fase in ("primera", "segunda"):
+        t = time.perf_counter()
+        assert cliente.get(ruta).status_code == 200
+        res[f"{fase} {ruta}"] = time.perf_counter() - t
+cliente.__exit__(None, None, None)
+print(json.dumps(res))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--muestras", type=int, default=7)
+    parser.add_argument("--estudiantes", type=int, default=20_000)
+    parser.add_argument("--cursos", type=int, default=500)
+    parser.add_argument("--database-url", help="Base ya poblada; por defecto se genera una temporal")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'arranque.db')}"
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.generador", "--database-url", url,
+             "--estudiantes", str(args.estudiantes), "--cursos", str(args.cursos)],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+    entorno = dict(os.environ, DATABASE_URL=url, CACHE_BACKEND="memoria", SLOW_QUERY_MS="0")
+    # Un arranque previo deja la base en su estado estable (migrada, índices creados)
+    subprocess.run([sys.executable, "-c", HIJO], env=entorno, check=True, stdout=subprocess.DEVNULL)
+
+    muestras = []
+    for _ in range(args.muestras):
+        salida = subprocess.run([sys.executable, "-c", HIJO], env=entorno, check=True, capture_output=True, text=True)
+        muestras.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    print(f"{'fase':<40} {'mediana ms':>10} {'mín ms':>8} {'máx ms':>8}")
+    for clave in muestras[0]:
+        valores = [m[clave] * 1000 for m in muestras]
+        print(f"{clave:<40} {statistics.median(valores):>10.1f} {min(valores):>8.1f} {max(valores):>8.1f}")
+    total = [(m["import"] + m["startup"] + m["primera /estudiantes/?limit=20"]) * 1000 for m in muestras]
+    print(f"{'import + startup + primera petición':<40} {statistics.median(total):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
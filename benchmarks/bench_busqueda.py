@@ -0,0 +1,112 @@
+"""Búsqueda indexada (FTS5): /busqueda (prefijos, ranking bm25) y el filtro nombre= del listado (subcadena,
+índice trigram, orden por id).
+
+Después comprueba el ranking con un prefijo común: una fila muy relevante insertada al final (rowid alto)
+sale primera, y tras eliminar la primera página la siguiente búsqueda devuelve una página completa sin
+filas eliminadas. Sale con código 1 si falla alguna comprobación.
+
+Uso: python -m benchmarks.bench_busqueda --estudiantes 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert, update
+from sqlmodel import SQLModel, Session
+
+from data.models import Estudiante
+from operations.busqueda import buscar, crear_indices_busqueda
+from operations.operations_db import listar_estudiantes
+from utils.db import crear_engine
+
+NOMBRES = ["José", "María", "Andrés", "Lucía", "Carlos", "Sofía", "Martín", "Valentina", "Tomás", "Camila"]
+APELLIDOS = ["Gómez", "Pérez", "Rodríguez", "Fernández", "López", "Martínez", "Sánchez", "Ramírez", "Torres", "Núñez"]
+SILABAS = ["ba", "ce", "di", "lo", "mu", "ra", "se", "ti", "vo", "za", "qui", "ño"]
+# prefijo común, apellido con tilde, término raro y término inexistente
+CONSULTAS = ["mar", "gomez", "nunez", "valentina torres", "zaquiño", "xyzw"]
+
+
+def _apellido(rnd: random.Random) -> str:
+    if rnd.random() < 0.5:
+        return rnd.choice(APELLIDOS)
+    return "".join(rnd.choice(SILABAS) for _ in range(3)).capitalize()
+
+
+def _poblar(engine, n: int, bloque: int = 5000):
+    rnd = random.Random(42)
+    with Session(engine) as session:
+        for inicio in range(0, n, bloque):
+            filas = []
+            for i in range(inicio, min(n, inicio + bloque)):
+                nombre = f"{rnd.choice(NOMBRES)} {_apellido(rnd)} {_apellido(rnd)}"
+                filas.append({"cedula": f"{1000000 + i}", "nombre": nombre, "email": f"u{i}@uni.edu",
+                              "semestre": 1 + i % 10, "is_deleted": False})
+            session.exec(insert(Estudiante).values(filas))
+        session.commit()
+
+
+def _medir(fn, repeticiones: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - t0) / repeticiones * 1000
+
+
+def _comprobar_ranking(session: Session, limit: int) -> int:
+    fallos = 0
+
+    def comprobar(condicion: bool, mensaje: str) -> None:
+        nonlocal fallos
+        print(f"  {'ok   ' if condicion else 'FALLA'} {mensaje}")
+        fallos += not condicion
+
+    print()
+    session.add(Estudiante(cedula="9999999", nombre="Mar Mar Mar", email="mar@uni.edu", semestre=1))
+    session.commit()
+    primera = buscar(session, "estudiantes", "mar", limit)
+    comprobar(bool(primera) and primera[0].cedula == "9999999", "la fila más relevante sale primera aunque sea la última")
+
+    session.exec(update(Estudiante).where(Estudiante.id.in_([e.id for e in primera])).values(is_deleted=True))
+    session.commit()
+    segunda = buscar(session, "estudiantes", "mar", limit)
+    comprobar(len(segunda) == limit, f"tras eliminar la primera página sigue habiendo {limit} resultados ({len(segunda)})")
+    comprobar(not any(e.is_deleted for e in segunda), "ningún resultado eliminado")
+    siguiente = buscar(session, "estudiantes", "mar", limit, skip=limit)
+    comprobar(not {e.id for e in segunda} & {e.id for e in siguiente}, "skip avanza sin repetir filas")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--estudiantes", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'busqueda.db')}")
+        SQLModel.metadata.create_all(engine)
+        crear_indices_busqueda(engine)
+        t0 = time.perf_counter()
+        _poblar(engine, args.estudiantes)
+        print(f"{args.estudiantes} filas insertadas (con índice) en {time.perf_counter() - t0:.1f}s")
+
+        with Session(engine) as session:
+            print(f"{'consulta':<18} {'listado ms':>10} {'busqueda ms':>11}")
+            for q in CONSULTAS:
+                t_listado = _medir(lambda: listar_estudiantes(session, 0, args.limit, nombre=q), args.repeticiones)
+                t_busqueda = _medir(lambda: buscar(session, "estudiantes", q, args.limit), args.repeticiones)
+                print(f"{q:<18} {t_listado:10.2f} {t_busqueda:11.2f}")
+
+            fallos = _comprobar_ranking(session, args.limit)
+        engine.dispose()
+    if fallos:
+        print(f"ERROR: {fallos} comprobaciones fallaron", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Feed de cambios con cientos de suscriptores: latencia de entrega, orden y backpressure.
+
+Levanta uvicorn contra una base sintética, abre --suscriptores streams SSE (y --ws WebSockets) sobre
+/changes/stream y, cuando todos están conectados, hace --escrituras PATCH a --tasa por segundo.
+Cada suscriptor comprueba que recibe todos los offsets escritos, en orden y sin repetidos; la latencia
+es recepción - creado_en del cambio. Los --lentos dejan de leer --pausa-lento segundos tras el primer
+evento: si llenan su cola (CAMBIOS_COLA) pasan a leer la tabla y también deben terminar completos,
+sin retrasar a los demás.
+
+--escritores reparte los PATCH entre clientes concurrentes (la latencia de escritura muestra si los
+escritores se serializan) y --database-url usa una base vacía propia, p. ej. PostgreSQL, en lugar de
+una SQLite temporal.
+
+Uso: python -m benchmarks.bench_cambios --suscriptores 300 --ws 50 --lentos 20 --escrituras 1000 --tasa 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.bench_concurrencia import _esperar_servidor, _percentil
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Receptor:
+    def __init__(self, nombre: str, lento: bool):
+        self.nombre = nombre
+        self.lento = lento
+        self.inicio: Optional[int] = None
+        self.ids: List[int] = []
+        self.latencias: List[float] = []
+        self.conectado = asyncio.Event()
+
+    def recibir(self, cambio: Dict) -> None:
+        self.ids.append(cambio["id"])
+        self.latencias.append((_ahora() - datetime.fromisoformat(cambio["creado_en"])).total_seconds())
+
+    def completo(self, final: int) -> bool:
+        return self.inicio is not None and self.ids == list(range(self.inicio + 1, final + 1))
+
+
+async def _sse(cliente: httpx.AsyncClient, r: Receptor, pausa: float):
+    async with cliente.stream("GET", "/changes/stream", params={"entidad": "estudiante"}) as resp:
+        async for linea in resp.aiter_lines():
+            if linea.startswith(": offset "):
+                r.inicio = int(linea.split()[-1])
+                r.conectado.set()
+            elif linea.startswith("data: "):
+                r.recibir(json.loads(linea[6:]))
+                if r.lento and len(r.ids) == 1:
+                    await asyncio.sleep(pausa)
+
+
+async def _ws(base: str, r: Receptor, desde: int):
+    import websockets
+    async with websockets.connect(f"ws{base[4:]}/changes/ws?since={desde}&entidad=estudiante") as ws:
+        r.inicio = desde
+        r.conectado.set()
+        async for mensaje in ws:
+            for cambio in json.loads(mensaje):
+                r.recibir(cambio)
+
+
+async def _cabeza(cliente: httpx.AsyncClient, desde: int = 0) -> int:
+    while True:
+        pagina = (await cliente.get("/changes", params={"since": desde, "limit": 1000})).json()
+        desde = pagina["ultimo"]
+        if not pagina["hay_mas"]:
+            return desde
+
+
+async def _escribir(cliente: httpx.AsyncClient, args) -> Dict:
+    # PATCH a ritmo fijo, repartidos entre --escritores clientes concurrentes
+    t0 = time.perf_counter()
+    errores, latencias = 0, []
+
+    async def escritor(i: int):
+        nonlocal errores
+        rnd = random.Random(3 + i)
+        for n in range(i, args.escrituras, args.escritores):
+            espera = t0 + n / args.tasa - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            t = time.perf_counter()
+            resp = await cliente.patch(
+                f"/estudiantes/{rnd.randint(1, args.estudiantes)}", json={"semestre": rnd.randint(1, 10)},
+            )
+            latencias.append(time.perf_counter() - t)
+            errores += resp.status_code != 200
+
+    await asyncio.gather(*(escritor(i) for i in range(args.escritores)))
+    return {"duracion": time.perf_counter() - t0, "errores": errores, "latencias": latencias}
+
+
+async def _escenario(base: str, args) -> None:
+    limites = httpx.Limits(max_connections=args.suscriptores + 10, max_keepalive_connections=args.suscriptores + 10)
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=httpx.Timeout(120, connect=30)) as cliente:
+        desde = await _cabeza(cliente)   # offset de arranque de los WebSocket
+        receptores = [Receptor(f"sse{i}", i < args.lentos) for i in range(args.suscriptores)]
+        receptores += [Receptor(f"ws{i}", False) for i in range(args.ws)]
+        tareas = [
+            asyncio.create_task(_sse(cliente, r, args.pausa_lento)) if r.nombre.startswith("sse")
+            else asyncio.create_task(_ws(base, r, desde))
+            for r in receptores
+        ]
+        try:
+            t0 = time.perf_counter()
+            await asyncio.wait_for(asyncio.gather(*(r.conectado.wait() for r in receptores)), 60)
+            conexion = time.perf_counter() - t0
+            escritura = await _escribir(cliente, args)
+            ultimo = await _cabeza(cliente, desde)
+            limite = time.perf_counter() + args.pausa_lento + 60
+            while time.perf_counter() < limite and not all(r.ids and r.ids[-1] >= ultimo for r in receptores):
+                await asyncio.sleep(0.1)
+            estado = {
+                linea.split('"')[1]: float(linea.split()[-1])
+                for linea in (await cliente.get("/metrics")).text.splitlines()
+                if linea.startswith("cambios_feed{")
+            }
+        finally:
+            for t in tareas:
+                t.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+
+    rapidos = [r for r in receptores if not r.lento]
+    latencias = [x for r in rapidos for x in r.latencias]
+    fallidos = [r.nombre for r in receptores if not r.completo(ultimo)]
+    print(f"suscriptores: {args.suscriptores} SSE ({args.lentos} lentos) + {args.ws} WebSocket, "
+          f"conectados en {conexion:.2f}s")
+    print(f"escrituras:   {args.escrituras} en {escritura['duracion']:.2f}s "
+          f"({args.escrituras / escritura['duracion']:.0f}/s), {escritura['errores']} errores, "
+          f"{ultimo - desde} cambios en el feed")
+    print(f"PATCH:        {args.escritores} escritores; p50 {_percentil(escritura['latencias'], 0.5):.1f} ms, "
+          f"p99 {_percentil(escritura['latencias'], 0.99):.1f} ms")
+    print(f"entregas:     {len(latencias)} eventos a suscriptores al día; "
+          f"latencia p50 {_percentil(latencias, 0.5):.1f} ms, p95 {_percentil(latencias, 0.95):.1f} ms, "
+          f"p99 {_percentil(latencias, 0.99):.1f} ms")
+    if args.lentos:
+        lentas = [r.latencias[-1] for r in receptores if r.lento and r.latencias]
+        print(f"lentos:       último evento {min(lentas):.1f}-{max(lentas):.1f}s después de escribirse; "
+              f"{estado.get('atrasos', 0):.0f} pasaron a leer la tabla (cola llena)")
+    print(f"completos:    {len(receptores) - len(fallidos)}/{len(receptores)}"
+          + (f"  incompletos: {fallidos[:10]}" if fallidos else ""))
+    if fallidos:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suscriptores", type=int, default=300, help="Streams SSE")
+    parser.add_argument("--ws", type=int, default=50, help="Conexiones WebSocket")
+    parser.add_argument("--lentos", type=int, default=20, help="SSE que se detienen tras el primer evento")
+    parser.add_argument("--pausa-lento", type=float, default=5.0)
+    parser.add_argument("--escrituras", type=int, default=1000)
+    parser.add_argument("--tasa", type=float, default=200, help="PATCH por segundo")
+    parser.add_argument("--escritores", type=int, default=1, help="Clientes que reparten los PATCH")
+    parser.add_argument("--cola", type=int, default=8, help="CAMBIOS_COLA del servidor (lotes por suscriptor)")
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--cursos", type=int, default=100)
+    parser.add_argument("--modo", default="sync", choices=["sync", "async"])
+    parser.add_argument("--puerto", type=int, default=8766)
+    parser.add_argument("--database-url", help="Base vacía (por defecto una SQLite temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'cambios.db')}"
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.generador", "--database-url", url,
+             "--estudiantes", str(args.estudiantes), "--cursos", str(args.cursos)],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        base = f"http://127.0.0.1:{args.puerto}"
+        env = {
+            **os.environ, "DATABASE_URL": url, "DB_MODO": args.modo, "CACHE_BACKEND": "memoria",
+            "SLOW_QUERY_MS": "0", "CAMBIOS_COLA": str(args.cola),
+        }
+        proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.puerto), "--log-level", "warning",
+             "--timeout-graceful-shutdown", "5"],
+            env=env,
+        )
+        try:
+            _esperar_servidor(base, proceso)
+            asyncio.run(_escenario(base, args))
+        finally:
+            proceso.terminate()
+            try:
+                proceso.wait(30)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Requests/s y p99 de los endpoints en modo sync vs async (DB_MODO).
+
+Levanta uvicorn contra una base SQLite temporal, la puebla y lanza N clientes
+concurrentes sobre GET /estudiantes/{id} y GET /cursos/{id}/estudiantes.
+
+Uso: python -m benchmarks.bench_concurrencia --clientes 50 100 250 500 --segundos 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session
+
+from data.models import Estudiante, Curso, Matricula
+from utils.db import crear_engine
+from utils.migraciones import migrar
+
+
+def _poblar(url: str, n_estudiantes: int, n_cursos: int):
+    engine = crear_engine(url)
+    SQLModel.metadata.create_all(engine)
+    rnd = random.Random(7)
+    with Session(engine) as session:
+        session.exec(insert(Curso).values([
+            {"codigo": f"C{i:04d}", "nombre": f"Curso {i}", "creditos": 3, "horario": "", "is_deleted": False}
+            for i in range(n_cursos)
+        ]))
+        session.exec(insert(Estudiante).values([
+            {"cedula": f"{100000 + i}", "nombre": f"Estudiante {i}", "email": f"e{i}@uni.edu",
+             "semestre": 1 + i % 10, "is_deleted": False}
+            for i in range(n_estudiantes)
+        ]))
+        pares = {(e, rnd.randint(1, n_cursos)) for e in range(1, n_estudiantes + 1) for _ in range(5)}
+        session.exec(insert(Matricula).values([{"estudiante_id": e, "curso_id": c} for e, c in pares]))
+        session.commit()
+    # Los workers solo verifican la versión: contadores, franjas e índices se construyen aquí, una vez
+    migrar(engine)
+    engine.dispose()
+
+
+def _percentil(valores, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+
+async def _carga(base: str, clientes: int, segundos: float, n_estudiantes: int, n_cursos: int):
+    latencias, errores = [], 0
+    fin = time.perf_counter() + segundos
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=60) as cliente:
+        async def trabajador(semilla: int):
+            nonlocal errores
+            rnd = random.Random(semilla)
+            while time.perf_counter() < fin:
+                if rnd.random() < 0.5:
+                    ruta = f"/estudiantes/{rnd.randint(1, n_estudiantes)}"
+                else:
+                    ruta = f"/cursos/{rnd.randint(1, n_cursos)}/estudiantes"
+                t0 = time.perf_counter()
+                try:
+                    r = await cliente.get(ruta)
+                    if r.status_code != 200:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append(time.perf_counter() - t0)
+
+        await asyncio.gather(*(trabajador(i) for i in range(clientes)))
+    return latencias, errores
+
+
+def _esperar_servidor(base: str, proceso):
+    for _ in range(100):
+        if proceso.poll() is not None:
+            raise RuntimeError("uvicorn terminó antes de aceptar conexiones")
+        try:
+            httpx.get(base + "/health", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("uvicorn no respondió a /health")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, nargs="+", default=[50, 100, 250, 500])
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--estudiantes", type=int, default=20_000)
+    parser.add_argument("--cursos", type=int, default=500)
+    parser.add_argument("--modos", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    parser.add_argument("--puerto", type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'concurrencia.db')}"
+        _poblar(url, args.estudiantes, args.cursos)
+        base = f"http://127.0.0.1:{args.puerto}"
+
+        print(f"{'modo':<6} {'clientes':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errores':>8}")
+        for modo in args.modos:
+            # Sin caché para medir el camino a la base de datos
+            env = {**os.environ, "DATABASE_URL": url, "DB_MODO": modo, "CACHE_BACKEND": "ninguno"}
+            proceso = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.puerto), "--log-level", "warning"],
+                env=env,
+            )
+            try:
+                _esperar_servidor(base, proceso)
+                for clientes in args.clientes:
+                    latencias, errores = asyncio.run(
+                        _carga(base, clientes, args.segundos, args.estudiantes, args.cursos)
+                    )
+                    print(f"{modo:<6} {clientes:>8} {len(latencias) / args.segundos:>10.0f} "
+                          f"{_percentil(latencias, 0.50):>9.1f} {_percentil(latencias, 0.99):>9.1f} {errores:>8}")
+            finally:
+                proceso.terminate()
+                proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
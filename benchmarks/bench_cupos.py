@@ -0,0 +1,233 @@
+"""Matrícula concurrente en cursos con cupo: ni sobreventa ni estudiantes por encima del tope de créditos.
+
+Levanta uvicorn (--workers procesos) contra una base SQLite temporal de --estudiantes x --cursos, añade
+--populares cursos con --cupo plazas y lanza --clientes clientes concurrentes con --solicitudes peticiones
+por camino, muchas más que plazas, una fase tras otra:
+
+1. POST /matriculas/      sobre la mitad de los cursos populares (incremento condicionado por petición);
+2. POST /matriculas/cola  sobre la otra mitad (micro-lotes; sin plaza, lista de espera).
+
+Compara throughput y latencia de los dos caminos y comprueba:
+
+- ningún curso supera su cupo y los llenos quedan exactamente en el cupo;
+- cada 201 es una matrícula real y EstadisticaCurso.inscritos coincide con el conteo;
+- ningún estudiante que obtuvo plaza supera --max-creditos;
+- ningún 5xx en la cola (el camino directo, una transacción por petición, puede agotar SQLITE_BUSY_TIMEOUT con
+  muchos clientes: la columna 5xx lo muestra);
+- la lista de espera tiene una entrada por solicitud aceptada con 202, con posiciones 1..n;
+- la cola agrupó solicitudes (lote máximo > 1);
+- al liberar plazas, promover las asigna a la lista en orden de llegada y el curso vuelve a quedar lleno.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python -m benchmarks.bench_cupos --estudiantes 5000 --populares 4 --cupo 50 --solicitudes 3000 --clientes 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+
+def _percentil(valores, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000 if valores else 0.0
+
+
+async def _carga(base: str, clientes: int, solicitudes):
+    import httpx
+
+    resultados = []
+    pendientes = list(solicitudes)
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=120) as cliente:
+        async def trabajador():
+            while pendientes:
+                ruta, e, c = pendientes.pop()
+                t0 = time.perf_counter()
+                try:
+                    r = await cliente.post(ruta, params={"estudiante_id": e, "curso_id": c, "conflictos": "ignorar"})
+                    status = r.status_code
+                except httpx.HTTPError:
+                    status = None    # conexión cortada: la solicitud puede haberse aplicado o no
+                resultados.append((ruta, e, c, status, time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(clientes)))
+    return resultados, time.perf_counter() - t0
+
+
+def _esperar_servidor(base: str, proceso):
+    import httpx
+
+    for _ in range(200):
+        if proceso.poll() is not None:
+            raise RuntimeError("uvicorn terminó antes de aceptar conexiones")
+        try:
+            httpx.get(base + "/health", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("uvicorn no respondió a /health")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--cursos", type=int, default=100)
+    parser.add_argument("--populares", type=int, default=4, help="Cursos con cupo (mitad por cada camino)")
+    parser.add_argument("--cupo", type=int, default=50)
+    parser.add_argument("--solicitudes", type=int, default=3000, help="Peticiones por camino")
+    parser.add_argument("--clientes", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2, help="Procesos uvicorn (cada uno con su cola)")
+    parser.add_argument("--max-creditos", type=int, default=30)
+    parser.add_argument("--modo", default="sync", choices=["sync", "async"])
+    parser.add_argument("--puerto", type=int, default=8766)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(tmp, 'cupos.db')}"
+    os.environ["DATABASE_URL"] = url
+    os.environ["MATRICULA_MAX_CREDITOS"] = str(args.max_creditos)
+
+    import httpx
+    from sqlalchemy import func, insert
+    from sqlmodel import Session, select
+
+    from benchmarks.generador import generar
+    from data.models import Curso, EstadisticaCurso, ListaEspera, Matricula
+    from operations import cupos
+    from utils.db import crear_engine
+
+    engine = crear_engine(url)
+    generar(engine, args.estudiantes, args.cursos)
+    with Session(engine) as session:
+        session.exec(insert(Curso).values([
+            {"codigo": f"POP{i:03d}", "nombre": f"Popular {i}", "creditos": 4, "horario": "", "cupo": args.cupo,
+             "is_deleted": False}
+            for i in range(args.populares)
+        ]))
+        session.commit()
+        populares = session.exec(select(Curso.id).where(Curso.codigo.like("POP%")).order_by(Curso.id)).all()
+    directos, en_cola = populares[: len(populares) // 2], populares[len(populares) // 2:]
+
+    rnd = random.Random(42)
+    fases = {
+        ruta: [(ruta, rnd.randint(1, args.estudiantes), rnd.choice(cursos)) for _ in range(args.solicitudes)]
+        for ruta, cursos in (("/matriculas/", directos), ("/matriculas/cola", en_cola))
+    }
+
+    fallos = []
+
+    def comprobar(condicion: bool, mensaje: str) -> None:
+        print(f"  {'ok   ' if condicion else 'FALLA'} {mensaje}")
+        if not condicion:
+            fallos.append(mensaje)
+
+    base = f"http://127.0.0.1:{args.puerto}"
+    env = {**os.environ, "DB_MODO": args.modo, "COLA_PROMOCION_S": "0", "SLOW_QUERY_MS": "0"}
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.puerto), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        _esperar_servidor(base, proceso)
+        resultados, segundos = [], {}
+        for ruta, solicitudes in fases.items():
+            filas, segundos[ruta] = asyncio.run(_carga(base, args.clientes, solicitudes))
+            resultados += filas
+        metricas = httpx.get(base + "/metrics").text
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    por_ruta = defaultdict(list)
+    for fila in resultados:
+        por_ruta[fila[0]].append(fila)
+    print(f"\n{args.solicitudes} solicitudes por camino, {args.clientes} clientes, {args.workers} workers, "
+          f"{len(populares)} cursos x {args.cupo} plazas")
+    print(f"{'':<18} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'201':>6} {'202':>6} {'409':>6} {'5xx':>5} {'red':>5}")
+    for ruta, filas in por_ruta.items():
+        latencias = [f[4] for f in filas]
+        estados = Counter(f[3] for f in filas)
+        print(f"{ruta:<18} {len(filas) / segundos[ruta]:>7.0f} {_percentil(latencias, 0.5):>8.1f} {_percentil(latencias, 0.95):>8.1f} "
+              f"{_percentil(latencias, 0.99):>8.1f} {estados[201]:>6} {estados[202]:>6} {estados[409]:>6} "
+              f"{sum(n for s, n in estados.items() if s and s >= 500):>5} {estados[None]:>5}")
+    print()
+
+    # Una conexión cortada deja la solicitud sin respuesta: pudo aplicarse o no
+    aceptadas = Counter(c for _, _, c, s, _ in resultados if s == 201)
+    cortadas = Counter(c for _, _, c, s, _ in resultados if s is None)
+    en_espera = {(e, c) for _, e, c, s, _ in resultados if s == 202}
+    with Session(engine) as session:
+        reales = dict(session.exec(
+            select(Matricula.curso_id, func.count()).where(Matricula.curso_id.in_(populares)).group_by(Matricula.curso_id)
+        ).all())
+        contadores = dict(session.exec(
+            select(EstadisticaCurso.curso_id, EstadisticaCurso.inscritos).where(EstadisticaCurso.curso_id.in_(populares))
+        ).all())
+        creditos = dict(session.exec(
+            select(Matricula.estudiante_id, func.sum(Curso.creditos))
+            .join(Curso, Curso.id == Matricula.curso_id)
+            .where(
+                Matricula.estudiante_id.in_(select(Matricula.estudiante_id).where(Matricula.curso_id.in_(populares))),
+                Curso.is_deleted == False,  # noqa: E712
+            )
+            .group_by(Matricula.estudiante_id)
+        ).all())
+        espera = {(e, c) for e, c in session.exec(select(ListaEspera.estudiante_id, ListaEspera.curso_id)).all()}
+
+    comprobar(not any(s and s >= 500 for ruta, _, _, s, _ in resultados if ruta == "/matriculas/cola"), "ningún 5xx en la cola")
+    comprobar(all(reales.get(c, 0) <= args.cupo for c in populares), f"sin sobreventa: {[reales.get(c, 0) for c in populares]}")
+    comprobar(all(reales.get(c, 0) == args.cupo for c in populares), "los cursos populares quedaron llenos")
+    comprobar(all(aceptadas[c] <= reales.get(c, 0) <= aceptadas[c] + cortadas[c] for c in populares),
+              "cada 201 es una matrícula real")
+    comprobar(all(contadores.get(c, 0) == reales.get(c, 0) for c in populares),
+              "inscritos coincide con el conteo real")
+    excedidos = [e for e, cr in creditos.items() if cr > args.max_creditos]
+    comprobar(not excedidos, f"nadie con plaza supera {args.max_creditos} créditos ({len(creditos)} estudiantes)")
+    comprobar(en_espera <= espera and len(espera - en_espera) <= sum(cortadas.values()),
+              f"lista de espera = solicitudes con 202 ({len(espera)})")
+
+    with Session(engine) as session:
+        for c in en_cola:
+            posiciones = [f["posicion"] for f in cupos.lista_de_espera(session, c, 0, 10 ** 6)]
+            comprobar(posiciones == list(range(1, len(posiciones) + 1)), f"curso {c}: posiciones 1..{len(posiciones)}")
+    lotes = [int(float(v)) for v in re.findall(r'cola_matriculas\{tipo="max_lote"\} (\S+)', metricas)]
+    comprobar(bool(lotes) and max(lotes) > 1, f"la cola agrupó solicitudes (lote máximo {max(lotes, default=0)} en el worker consultado)")
+
+    # Promoción: se liberan plazas y pasan los primeros de la lista
+    curso = en_cola[0]
+    liberar = min(3, args.cupo)
+    with Session(engine) as session:
+        orden = [f["estudiante_id"] for f in cupos.lista_de_espera(session, curso, 0, 10 ** 6)]
+        salen = session.exec(select(Matricula.estudiante_id).where(Matricula.curso_id == curso).limit(liberar)).all()
+    from operations.operations_db import desmatricular
+    for e in salen:
+        with Session(engine) as session:
+            desmatricular(session, e, curso)
+    t0 = time.perf_counter()
+    promovidas = cupos.promover(engine)
+    ms = (time.perf_counter() - t0) * 1000
+    with Session(engine) as session:
+        inscritos = set(session.exec(select(Matricula.estudiante_id).where(Matricula.curso_id == curso)).all())
+        quedan = [f["estudiante_id"] for f in cupos.lista_de_espera(session, curso, 0, 10 ** 6)]
+    print(f"promoción: {promovidas} plazas en {ms:.1f} ms")
+    comprobar(len(inscritos) == args.cupo or not quedan, f"curso {curso} lleno de nuevo ({len(inscritos)})")
+    atendidos = [e for e in orden if e not in quedan]
+    comprobar(orden[:len(atendidos)] == atendidos, "se atiende la lista en orden de llegada")
+    comprobar(quedan == orden[len(atendidos):], "los que siguen esperando conservan su orden")
+
+    if fallos:
+        print(f"ERROR: {len(fallos)} comprobaciones fallaron", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
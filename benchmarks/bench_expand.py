@@ -0,0 +1,92 @@
+"""Consultas por página: ?expand=cursos y /estudiantes/batch contra el patrón N+1.
+
+Cuenta las sentencias SQL que ejecuta cada petición (evento before_cursor_execute) y
+falla si la expansión deja de ser constante respecto al tamaño de página.
+
+Uso: python -m benchmarks.bench_expand --estudiantes 300 --cursos 20 --paginas 10 50 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=300)
+    parser.add_argument("--cursos", type=int, default=20)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[10, 50, 100])
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'expand.db')}"
+    os.environ["CACHE_BACKEND"] = "ninguno"
+    os.environ.setdefault("DB_MODO", "sync")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from sqlmodel import Session
+
+    import main as app_main
+    from utils.migraciones import migrar
+    from data.schemas import CursoCreate
+    from operations.operations_db import crear_curso, matricular_lote
+    from data.models import Estudiante
+
+    sentencias = [0]
+
+    @event.listens_for(app_main.engine, "before_cursor_execute")
+    def _contar(*_):
+        sentencias[0] += 1
+
+    migrar(app_main.engine)
+    with TestClient(app_main.app) as cliente:
+        with Session(app_main.engine) as session:
+            session.add_all(
+                Estudiante(cedula=f"{10000 + i}", nombre=f"Estudiante {i}", email=f"e{i}@uni.edu", semestre=1 + i % 10)
+                for i in range(args.estudiantes)
+            )
+            session.commit()
+            for i in range(args.cursos):
+                crear_curso(session, CursoCreate(codigo=f"C{i:03d}", nombre=f"Curso {i}", creditos=3))
+            pares = [(e, 1 + (e + k) % args.cursos) for e in range(1, args.estudiantes + 1) for k in range(5)]
+            matricular_lote(session, pares, conflictos="ignorar")
+
+        def medir(fn):
+            sentencias[0] = 0
+            t0 = time.perf_counter()
+            fn()
+            return sentencias[0], (time.perf_counter() - t0) * 1000
+
+        filas = []
+        for n in args.paginas:
+            def n_mas_1():
+                pagina = cliente.get("/estudiantes/", params={"limit": n}).json()
+                for est in pagina:
+                    cliente.get(f"/estudiantes/{est['id']}/cursos")
+
+            def expand():
+                pagina = cliente.get("/estudiantes/", params={"limit": n, "expand": "cursos"}).json()
+                assert len(pagina) == n and all(len(e["cursos"]) == 5 for e in pagina)
+
+            def lote():
+                ids = ",".join(str(i) for i in range(1, n + 1))
+                assert len(cliente.get("/estudiantes/batch", params={"ids": ids, "expand": "cursos"}).json()) == n
+
+            filas.append((n, medir(n_mas_1), medir(expand), medir(lote)))
+
+    print(f"{'página':>7} | {'N+1 (sql / ms)':>16} | {'expand (sql / ms)':>18} | {'batch (sql / ms)':>17}")
+    for n, (q1, t1), (q2, t2), (q3, t3) in filas:
+        print(f"{n:>7} | {q1:>6} / {t1:8.1f} | {q2:>6} / {t2:9.1f} | {q3:>6} / {t3:8.1f}")
+
+    por_expand = {q for _, _, (q, _), _ in filas}
+    por_lote = {q for _, _, _, (q, _) in filas}
+    if len(por_expand) != 1 or len(por_lote) != 1:
+        print("ERROR: el número de consultas de expand/batch depende del tamaño de página", file=sys.stderr)
+        sys.exit(1)
+    print(f"OK: expand y batch ejecutan un número fijo de consultas ({por_expand.pop()} y {por_lote.pop()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Detección de choques de horario: máscara de ocupación contra comparación par a par.
+
+Cada estudiante queda matriculado en --cursos-por-estudiante cursos sin choques; luego se
+comprueba un curso candidato por estudiante de dos formas:
+  - par a par: cargar los horarios de sus cursos, parsearlos y comparar cada franja (O(n²))
+  - máscara: AND entre la ocupación guardada y la máscara del candidato (horarios.choque)
+y se mide también conflictos_matricula (identifica los cursos que chocan) y
+POST /estudiantes/{id}/horario/verificar con una propuesta completa.
+
+Uso: python -m benchmarks.bench_horarios --estudiantes 500 --cursos-por-estudiante 12
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlmodel import SQLModel, Session, select
+
+from data.models import Estudiante, Curso, Matricula
+from operations import horarios
+from operations.operations_db import crear_curso, matricular_lote
+from data.schemas import CursoCreate
+from utils import horario as utils_horario
+from utils.db import crear_engine
+
+DIAS = ("Lu", "Ma", "Mi", "Ju", "Vi", "Sa")
+
+
+def _catalogo():
+    # Un curso por día y bloque de 1 hora entre 07:00 y 21:00, más cursos de dos días
+    cursos = []
+    for d, dia in enumerate(DIAS):
+        for hora in range(7, 21):
+            cursos.append(f"{dia} {hora:02d}-{hora + 1:02d}")
+            if d + 2 < len(DIAS):
+                cursos.append(f"{dia}/{DIAS[d + 2]} {hora:02d}:30-{hora + 1:02d}:30")
+    return cursos
+
+
+def _poblar(engine, n_estudiantes: int, por_estudiante: int):
+    rnd = random.Random(7)
+    catalogo = _catalogo()
+    with Session(engine) as session:
+        session.add_all(
+            Estudiante(cedula=f"{10000 + i}", nombre=f"Estudiante {i}", email=f"e{i}@uni.edu", semestre=1 + i % 10)
+            for i in range(n_estudiantes)
+        )
+        session.commit()
+        for i, h in enumerate(catalogo):
+            crear_curso(session, CursoCreate(codigo=f"H{i:04d}", nombre=f"Curso {i}", creditos=3, horario=h))
+        mascaras = horarios.mascaras_cursos(session, range(1, len(catalogo) + 1))
+        pares = []
+        for e in range(1, n_estudiantes + 1):
+            ocupado, elegidos = 0, 0
+            for c in rnd.sample(list(mascaras), len(mascaras)):
+                if not ocupado & mascaras[c]:
+                    ocupado |= mascaras[c]
+                    pares.append((e, c))
+                    elegidos += 1
+                    if elegidos == por_estudiante:
+                        break
+        matricular_lote(session, pares, conflictos="ignorar")
+    return len(catalogo), pares
+
+
+def _par_a_par(session: Session, estudiante_id: int, curso_id: int) -> bool:
+    textos = session.exec(
+        select(Curso.horario).join(Matricula, Matricula.curso_id == Curso.id)
+        .where(Matricula.estudiante_id == estudiante_id, Curso.is_deleted == False)  # noqa: E712
+    ).all()
+    candidato = utils_horario.parsear(session.get(Curso, curso_id).horario)
+    actuales = [f for t in textos for f in utils_horario.parsear(t)]
+    return any(
+        a.dia == b.dia and a.inicio < b.fin and b.inicio < a.fin
+        for a in candidato for b in actuales
+    )
+
+
+def _medir(fn, casos):
+    tiempos = []
+    for caso in casos:
+        t0 = time.perf_counter()
+        fn(*caso)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    return statistics.mean(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=500)
+    parser.add_argument("--cursos-por-estudiante", type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'horarios.db')}")
+        SQLModel.metadata.create_all(engine)
+        n_cursos, pares = _poblar(engine, args.estudiantes, args.cursos_por_estudiante)
+        rnd = random.Random(11)
+        matriculados = set(pares)
+        # Candidato: un curso en el que el estudiante aún no está matriculado
+        casos = []
+        for e in range(1, args.estudiantes + 1):
+            c = rnd.randint(1, n_cursos)
+            while (e, c) in matriculados:
+                c = rnd.randint(1, n_cursos)
+            casos.append((e, c))
+        propuestas = [(e, rnd.sample(range(1, n_cursos + 1), args.cursos_por_estudiante)) for e in range(1, args.estudiantes + 1)]
+
+        with Session(engine) as session:
+            esperado = [_par_a_par(session, e, c) for e, c in casos]
+            obtenido = [bool(horarios.choque(session, e, c)) for e, c in casos]
+            assert esperado == obtenido, "la máscara no coincide con la comparación par a par"
+            assert obtenido == [bool(horarios.conflictos_matricula(session, e, c)) for e, c in casos]
+
+            media_pp, p95_pp = _medir(lambda e, c: _par_a_par(session, e, c), casos)
+            media_m, p95_m = _medir(lambda e, c: horarios.choque(session, e, c), casos)
+            media_c, p95_c = _medir(lambda e, c: horarios.conflictos_matricula(session, e, c), casos)
+            media_v, p95_v = _medir(lambda e, ids: horarios.verificar(session, e, ids), propuestas)
+        engine.dispose()
+
+    print(f"estudiantes: {args.estudiantes}  cursos por estudiante: {args.cursos_por_estudiante}  catálogo: {n_cursos}")
+    print(f"choques detectados: {sum(esperado)}/{len(casos)}")
+    print(f"par a par        : media {media_pp:7.3f} ms  p95 {p95_pp:7.3f} ms")
+    print(f"máscara          : media {media_m:7.3f} ms  p95 {p95_m:7.3f} ms  ({media_pp / media_m:.1f}x)")
+    print(f"con identificación: media {media_c:7.3f} ms  p95 {p95_c:7.3f} ms")
+    print(f"verificar ({args.cursos_por_estudiante:>2} cursos): media {media_v:7.3f} ms  p95 {p95_v:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""POST /batch contra una petición por operación: la misma secuencia mixta de escrituras de una herramienta de
+administración (crear estudiante, renombrar curso, matricular, desmatricular).
+
+Sobre una base sintética de --estudiantes x --cursos, --rondas veces:
+
+1. --operaciones escrituras como peticiones sueltas (un commit cada una);
+2. las mismas escrituras en un único POST /batch (un commit para todas);
+
+y compara tiempo total, tiempo por operación y commits. Después comprueba:
+
+3. modo atomico: un lote cuya última operación falla no deja rastro (estudiantes, matrículas, feed de cambios y
+   estadísticas iguales que antes) y responde con el código de la operación que falló;
+4. modo continuar: la operación que falla se deshace sola y las demás quedan confirmadas;
+5. las referencias "$N" enlazan una operación con el id creado por otra anterior.
+
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python -m benchmarks.bench_lotes --estudiantes 5000 --cursos 100 --operaciones 40 --rondas 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--cursos", type=int, default=100)
+    parser.add_argument("--operaciones", type=int, default=40, help="Escrituras por ronda (grupos de 5)")
+    parser.add_argument("--rondas", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'lotes.db')}"
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ.setdefault("DB_MODO", "sync")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, func
+    from sqlmodel import Session, select
+
+    from benchmarks.generador import generar
+    from data.models import Cambio, Matricula
+    from utils.db import engine
+
+    generar(engine, args.estudiantes, args.cursos)
+
+    import main as app_main
+
+    commits = [0]
+
+    def contar_commit(conn) -> None:
+        commits[0] += 1
+
+    for motor in (engine, app_main.async_engine and app_main.async_engine.sync_engine):
+        if motor is not None:
+            event.listen(motor, "commit", contar_commit)
+
+    fallos = []
+
+    def comprobar(condicion: bool, mensaje: str) -> None:
+        print(f"  {'ok   ' if condicion else 'FALLA'} {mensaje}")
+        if not condicion:
+            fallos.append(mensaje)
+
+    secuencia = [0]
+
+    def operaciones(n: int):
+        # Grupos de 5: crear estudiante, renombrar un curso, matricularlo en dos cursos, desmatricularlo del segundo
+        ops = []
+        for _ in range(n // 5):
+            secuencia[0] += 1
+            k = secuencia[0]
+            i = len(ops)
+            curso, otro = 1 + k % args.cursos, 1 + (k + 1) % args.cursos
+            ops += [
+                {"op": "crear_estudiante", "datos": {"cedula": f"77{k:06d}", "nombre": f"Lote {k}", "email": f"lote{k}@uni.edu", "semestre": 1 + k % 10}},
+                {"op": "actualizar_curso", "id": curso, "datos": {"nombre": f"Curso revisado {k}"}},
+                {"op": "matricular", "estudiante_id": f"${i}", "curso_id": curso, "conflictos": "ignorar"},
+                {"op": "matricular", "estudiante_id": f"${i}", "curso_id": otro, "conflictos": "ignorar"},
+                {"op": "desmatricular", "estudiante_id": f"${i}", "curso_id": otro},
+            ]
+        return ops
+
+    def sueltas(c, ops) -> bool:
+        creados = {}
+        for i, op in enumerate(ops):
+            ref = lambda v: creados[int(v[1:])] if isinstance(v, str) else v  # noqa: E731
+            if op["op"] == "crear_estudiante":
+                r = c.post("/estudiantes/", json=op["datos"])
+                creados[i] = r.json()["id"]
+            elif op["op"] == "actualizar_curso":
+                r = c.patch(f"/cursos/{op['id']}", json=op["datos"])
+            elif op["op"] == "matricular":
+                r = c.post("/matriculas/", params={"estudiante_id": ref(op["estudiante_id"]), "curso_id": op["curso_id"], "conflictos": "ignorar"})
+            else:
+                r = c.request("DELETE", "/matriculas/", params={"estudiante_id": ref(op["estudiante_id"]), "curso_id": op["curso_id"]})
+            if r.status_code >= 400:
+                return False
+        return True
+
+    def estado(c):
+        with Session(engine) as s:
+            filas = (s.exec(select(func.count()).select_from(Matricula)).one(), s.exec(select(func.max(Cambio.id))).one())
+        return filas, c.get("/stats/semestres").json(), c.get("/stats/cursos/1").json()
+
+    with TestClient(app_main.app) as c:
+        tiempos = {"peticiones sueltas": [], "POST /batch": []}
+        n_commits = {"peticiones sueltas": [], "POST /batch": []}
+        ok = True
+        for _ in range(args.rondas):
+            ops = operaciones(args.operaciones)
+            commits[0] = 0
+            t0 = time.perf_counter()
+            ok &= sueltas(c, ops)
+            tiempos["peticiones sueltas"].append((time.perf_counter() - t0) * 1000)
+            n_commits["peticiones sueltas"].append(commits[0])
+
+            ops = operaciones(args.operaciones)
+            commits[0] = 0
+            t0 = time.perf_counter()
+            r = c.post("/batch", json=ops)
+            tiempos["POST /batch"].append((time.perf_counter() - t0) * 1000)
+            n_commits["POST /batch"].append(commits[0])
+            ok &= r.status_code == 200 and r.json()["ok"] == len(ops)
+        n = len(operaciones(args.operaciones))
+        print(f"\n{n} escrituras por ronda, {args.rondas} rondas (p50)")
+        print(f"{'':<20} {'total ms':>9} {'ms/op':>7} {'commits':>8}")
+        for nombre in tiempos:
+            total = statistics.median(tiempos[nombre])
+            print(f"{nombre:<20} {total:>9.1f} {total / n:>7.2f} {statistics.median(n_commits[nombre]):>8.0f}")
+        print(f"{'x':<20} {statistics.median(tiempos['peticiones sueltas']) / statistics.median(tiempos['POST /batch']):>8.1f}x\n")
+        comprobar(ok, "todas las escrituras respondieron bien en ambos caminos")
+
+        print("atomico")
+        antes = estado(c)
+        ops = operaciones(10) + [{"op": "matricular", "estudiante_id": 1, "curso_id": 10 ** 9}]
+        r = c.post("/batch", json=ops)
+        cuerpo = r.json()
+        comprobar(r.status_code == 404 and not cuerpo["confirmado"], f"responde el código de la operación que falló ({r.status_code})")
+        comprobar(all(x.get("revertida") for x in cuerpo["resultados"][:-1]), "las anteriores figuran como revertidas")
+        creado = cuerpo["resultados"][0]["resultado"]["id"]
+        comprobar(c.get(f"/estudiantes/{creado}").status_code == 404, "el estudiante creado no existe")
+        comprobar(estado(c) == antes, "estadísticas y feed de cambios sin tocar")
+
+        print("continuar")
+        ops = operaciones(5)
+        ops.insert(1, {"op": "crear_estudiante", "datos": ops[0]["datos"]})      # cédula repetida: 409
+        r = c.post("/batch", params={"modo": "continuar"}, json=ops)
+        cuerpo = r.json()
+        comprobar(r.status_code == 200 and cuerpo["confirmado"], "el lote se confirma")
+        comprobar([x["status"] for x in cuerpo["resultados"]] == [201, 409, 200, 201, 201, 200],
+                  f"solo falla la repetida: {[x['status'] for x in cuerpo['resultados']]}")
+        nuevo = cuerpo["resultados"][0]["resultado"]["id"]
+        cursos = [x["id"] for x in c.get(f"/estudiantes/{nuevo}/cursos").json()]
+        comprobar(cursos == [ops[3]["curso_id"]], f"referencia $0 resuelta: {cursos}")
+
+    if fallos:
+        print(f"ERROR: {len(fallos)} comprobaciones fallaron", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compara matricular (fila a fila) contra matricular_lote.
+
+Uso: python -m benchmarks.bench_matriculas_lote --estudiantes 2000 --cursos 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlmodel import SQLModel, Session
+
+from data.models import Estudiante, Curso
+from operations.operations_db import matricular, matricular_lote
+from utils.db import crear_engine
+
+
+def _poblar(engine, n_estudiantes: int, n_cursos: int):
+    with Session(engine) as session:
+        session.add_all(
+            Estudiante(cedula=f"{10000 + i}", nombre=f"Estudiante {i}", email=f"e{i}@uni.edu", semestre=1 + i % 10)
+            for i in range(n_estudiantes)
+        )
+        session.add_all(
+            Curso(codigo=f"C{i:03d}", nombre=f"Curso {i}", creditos=3) for i in range(n_cursos)
+        )
+        session.commit()
+
+
+def _nuevo_engine(directorio: str, nombre: str, n_estudiantes: int, n_cursos: int):
+    engine = crear_engine(f"sqlite:///{os.path.join(directorio, nombre)}")
+    SQLModel.metadata.create_all(engine)
+    _poblar(engine, n_estudiantes, n_cursos)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--estudiantes", type=int, default=2000)
+    parser.add_argument("--cursos", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    pares = [(e, c) for c in range(1, args.cursos + 1) for e in range(1, args.estudiantes + 1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _nuevo_engine(tmp, "fila.db", args.estudiantes, args.cursos)
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            for e, c in pares:
+                matricular(session, e, c)
+            t_fila = time.perf_counter() - t0
+        engine.dispose()
+
+        engine = _nuevo_engine(tmp, "lote.db", args.estudiantes, args.cursos)
+        with Session(engine) as session:
+            t0 = time.perf_counter()
+            reporte = matricular_lote(session, pares, args.chunk_size)
+            t_lote = time.perf_counter() - t0
+        engine.dispose()
+
+    assert reporte["creadas"] == len(pares)
+    print(f"pares: {len(pares)}")
+    print(f"fila a fila : {t_fila:8.3f}s  {len(pares) / t_fila:10.0f} matrículas/s")
+    print(f"lote        : {t_lote:8.3f}s  {len(pares) / t_lote:10.0f} matrículas/s")
+    print(f"aceleración : {t_fila / t_lote:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
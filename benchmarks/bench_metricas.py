@@ -0,0 +1,70 @@
+"""Coste de la instrumentación: misma carga con métricas activas y desactivadas.
+
+Se alternan rondas con y sin middleware/hooks SQL sobre la misma app (TestClient, sin red)
+para que el ruido del sistema afecte por igual a ambos lados.
+
+Uso: python -m benchmarks.bench_metricas --peticiones 2000 --rondas 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--rondas", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'metricas.db')}"
+    os.environ["CACHE_BACKEND"] = "ninguno"
+    os.environ["SLOW_QUERY_MS"] = "0"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main as app_main
+    from utils.migraciones import migrar
+    from utils import metricas
+
+    def activar(valor: bool):
+        metricas.METRICAS = valor
+        for nombre, hook in (("before_cursor_execute", metricas._antes), ("after_cursor_execute", metricas._despues)):
+            if valor and not event.contains(app_main.engine, nombre, hook):
+                event.listen(app_main.engine, nombre, hook)
+            elif not valor and event.contains(app_main.engine, nombre, hook):
+                event.remove(app_main.engine, nombre, hook)
+
+    migrar(app_main.engine)
+    with TestClient(app_main.app) as cliente:
+        for i in range(50):
+            cliente.post("/estudiantes/", json={
+                "cedula": f"{10000 + i}", "nombre": f"Estudiante {i}", "email": f"e{i}@uni.edu", "semestre": 1 + i % 10,
+            })
+        rutas = ["/estudiantes/?limit=20", "/estudiantes/7", "/health"]
+
+        def ronda() -> float:
+            t0 = time.perf_counter()
+            for n in range(args.peticiones):
+                cliente.get(rutas[n % len(rutas)])
+            return (time.perf_counter() - t0) / args.peticiones * 1e6
+
+        ronda()  # calentamiento
+        con, sin = [], []
+        for _ in range(args.rondas):
+            activar(False)
+            sin.append(ronda())
+            activar(True)
+            con.append(ronda())
+
+    med_sin, med_con = statistics.median(sin), statistics.median(con)
+    print(f"sin métricas : {med_sin:8.1f} µs/petición")
+    print(f"con métricas : {med_con:8.1f} µs/petición")
+    print(f"sobrecoste   : {med_con - med_sin:8.1f} µs/petición ({(med_con / med_sin - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Latencia de página 1 vs página profunda: offset contra cursor (keyset).
+
+Uso: python -m benchmarks.bench_paginacion --estudiantes 200000 --pagina 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session
+
+from data.models import Estudiante
+from operations.operations_db import listar_estudiantes, codificar_cursor
+from utils.db import crear_engine
+
+
+def _poblar(engine, n: int, bloque: int = 5000):
+    with Session(engine) as session:
+        for inicio in range(0, n, bloque):
+            filas = [
+                {"cedula": f"{100000 + i}", "nombre": f"Estudiante {i}", "email": f"e{i}@uni.edu",
+                 "semestre": 1 + i % 10, "is_deleted": False}
+                for i in range(inicio, min(n, inicio + bloque))
+            ]
+            session.exec(insert(Estudiante).values(filas))
+        session.commit()
+
+
+def _medir(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--estudiantes", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pagina", type=int, default=5000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'paginacion.db')}")
+        SQLModel.metadata.create_all(engine)
+        _poblar(engine, args.estudiantes)
+
+        skip = (args.pagina - 1) * args.limit
+        with Session(engine) as session:
+            # El cursor de la página N es el id de la última fila de la página N-1
+            cursor = codificar_cursor("id", skip, skip)
+            casos = {
+                "offset p1": lambda: listar_estudiantes(session, 0, args.limit),
+                f"offset p{args.pagina}": lambda: listar_estudiantes(session, skip, args.limit),
+                "cursor p1": lambda: listar_estudiantes(session, 0, args.limit, cursor=None),
+                f"cursor p{args.pagina}": lambda: listar_estudiantes(session, 0, args.limit, cursor=cursor),
+            }
+            assert [e.id for e in casos[f"offset p{args.pagina}"]()] == [e.id for e in casos[f"cursor p{args.pagina}"]()]
+            for nombre, fn in casos.items():
+                print(f"{nombre:<14} {_medir(fn, args.repeticiones):8.2f} ms (mediana)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Réplicas de lectura con dos archivos SQLite: reparto, read-your-writes, atraso y caída de una réplica.
+
+Crea una base primaria sintética y --replicas copias (API de backup de SQLite, lo mismo que
+`python -m utils.replicas copiar`), levanta la aplicación con DATABASE_REPLICA_URLS apuntando a ellas y comprueba:
+
+1. las lecturas (listas, estadísticas, exportación) se reparten en round-robin entre las réplicas
+   (cabecera X-Origen-Lectura);
+2. read-your-writes: tras un POST el mismo cliente lee del primario y ve su fila durante --ventana segundos,
+   mientras que otro cliente sin la cookie lee de una réplica que todavía no la tiene; pasada la ventana
+   el primer cliente vuelve a las réplicas;
+3. una réplica con más atraso que REPLICA_MAX_ATRASO_S sale del reparto y vuelve al ponerse al día;
+4. una réplica caída sale del reparto y las lecturas siguen respondiendo (otra réplica o el primario);
+5. la caché no se llena con lecturas de réplicas;
+
+y mide el p50 de GET /estudiantes/{id} y /cursos/{id}/estudiantes sobre el primario y sobre las réplicas.
+Sale con código 1 si falla alguna comprobación.
+
+Uso: python -m benchmarks.bench_replicas --estudiantes 5000 --cursos 100 --replicas 2 --ventana 1
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _medir(fn, repeticiones: int) -> float:
+    fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--cursos", type=int, default=100)
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--ventana", type=float, default=1.0, help="REPLICA_VENTANA_S")
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    primario = os.path.join(tmp, "primario.db")
+    copias = [os.path.join(tmp, f"replica{i}.db") for i in range(1, args.replicas + 1)]
+    os.environ["DATABASE_URL"] = f"sqlite:///{primario}"
+    os.environ["DATABASE_REPLICA_URLS"] = ",".join(f"sqlite:///{c}" for c in copias)
+    os.environ["REPLICA_VENTANA_S"] = str(args.ventana)
+    os.environ["REPLICA_CHEQUEO_S"] = "0"          # los chequeos se lanzan a mano
+    os.environ["REPLICA_MAX_ATRASO_S"] = "0.5"
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ.setdefault("DB_MODO", "sync")
+
+    from fastapi.testclient import TestClient
+
+    from benchmarks.generador import generar
+    from utils.db import engine
+    from utils.replicas import copiar_sqlite
+
+    generar(engine, args.estudiantes, args.cursos)
+    for copia in copias:
+        copiar_sqlite(primario, copia)
+
+    import main as app_main
+    from utils.cache import cache
+    from utils.replicas import enrutador
+
+    fallos = []
+
+    def comprobar(condicion: bool, mensaje: str) -> None:
+        print(f"  {'ok   ' if condicion else 'FALLA'} {mensaje}")
+        if not condicion:
+            fallos.append(mensaje)
+
+    def origen(resp) -> str:
+        return resp.headers.get("x-origen-lectura", "?")
+
+    with TestClient(app_main.app) as escritor, TestClient(app_main.app) as lector:
+        enrutador.chequear()
+
+        print("1. reparto")
+        origenes = [origen(lector.get("/estudiantes/", params={"limit": 5})) for _ in range(2 * args.replicas)]
+        comprobar(sorted(set(origenes)) == [r.nombre for r in enrutador.replicas], f"round-robin: {origenes}")
+        comprobar(origen(lector.get("/stats/semestres")).startswith("replica"), "estadísticas en réplica")
+        comprobar(origen(lector.get("/export/cursos")).startswith("replica"), "exportación en réplica")
+
+        print("2. read-your-writes")
+        r = escritor.post("/estudiantes/", json={"cedula": "990001", "nombre": "Nueva Lectura", "email": "n@uni.edu", "semestre": 1})
+        nuevo = r.json()["id"]
+        comprobar(r.status_code == 201 and "leer_primario" in escritor.cookies, "el POST deja la cookie leer_primario")
+        r = escritor.get(f"/estudiantes/{nuevo}")
+        comprobar(r.status_code == 200 and origen(r) == "primario", f"el escritor lee su fila del primario ({origen(r)})")
+        r = lector.get(f"/estudiantes/{nuevo}")
+        comprobar(r.status_code == 404 and origen(r).startswith("replica"),
+                  f"otro cliente lee de la réplica sin la fila ({r.status_code}, {origen(r)})")
+        comprobar(cache.get(f"estudiante:{nuevo}") is not None, "la lectura del primario llenó la caché")
+        cache.clear()
+        lector.get("/estudiantes/1")
+        comprobar(cache.get("estudiante:1") is None, "la lectura de la réplica no llena la caché")
+        time.sleep(args.ventana + 0.1)
+        r = escritor.get("/estudiantes/1")
+        comprobar(origen(r).startswith("replica"), f"pasada la ventana el escritor vuelve a las réplicas ({origen(r)})")
+
+        print("3. atraso")
+        time.sleep(0.6)
+        enrutador.chequear()
+        atrasos = {rep.nombre: rep.atraso_s for rep in enrutador.replicas}
+        comprobar(not any(rep.sana for rep in enrutador.replicas), f"réplicas atrasadas fuera del reparto {atrasos}")
+        r = lector.get(f"/estudiantes/{nuevo}")
+        comprobar(r.status_code == 200 and origen(r) == "primario", f"sin réplicas sanas se lee del primario ({origen(r)})")
+        for copia in copias:
+            copiar_sqlite(primario, copia)
+        enrutador.chequear()
+        comprobar(all(rep.sana and rep.atraso_s == 0 for rep in enrutador.replicas), "al ponerse al día vuelven")
+        r = lector.get(f"/estudiantes/{nuevo}")
+        comprobar(r.status_code == 200 and origen(r).startswith("replica"), "la réplica ya tiene la fila")
+
+        print("4. caída")
+        caida = enrutador.replicas[0]
+        caida.engine.dispose()
+        shutil.move(copias[0], copias[0] + ".fuera")
+        os.makedirs(copias[0])                      # un directorio en su lugar: la conexión falla
+        enrutador.chequear()
+        comprobar(not caida.sana and caida.ultimo_error, f"{caida.nombre} fuera del reparto ({caida.ultimo_error})")
+        origenes = {origen(lector.get("/estudiantes/1")) for _ in range(4)}
+        comprobar(caida.nombre not in origenes, f"las lecturas siguen en {sorted(origenes)}")
+        os.rmdir(copias[0])
+        shutil.move(copias[0] + ".fuera", copias[0])
+        enrutador.chequear()
+        comprobar(caida.sana, f"{caida.nombre} vuelve al reparto")
+
+        print("\np50 ms (sin caché)")
+        rutas = ["/estudiantes/1", "/cursos/1/estudiantes"]
+        print(f"{'ruta':<26} {'primario':>9} {'réplicas':>9}")
+        for ruta in rutas:
+            def leer():
+                cache.clear()
+                return lector.get(ruta)
+            lector.cookies.set("leer_primario", str(time.time() + 3600))
+            en_primario = _medir(leer, args.repeticiones)
+            lector.cookies.clear()
+            en_replicas = _medir(leer, args.repeticiones)
+            print(f"{ruta:<26} {en_primario:>9.2f} {en_replicas:>9.2f}")
+        print(f"\nlecturas: primario {enrutador.lecturas_primario}, "
+              + ", ".join(f"{rep.nombre} {rep.lecturas}" for rep in enrutador.replicas))
+
+    if fallos:
+        print(f"ERROR: {len(fallos)} comprobaciones fallaron", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Serialización de listas y rosters: response_model + json contra filas proyectadas + orjson.
+
+Compara, para una página de --pagina estudiantes y para el roster de un curso con --estudiantes matriculados:
+
+- antes: objetos del ORM -> validación del response_model (EmailStr incluido) -> json.dumps, lo que hacía
+  FastAPI con las listas hasta ahora;
+- rápido: solo las columnas de EstudianteRead -> dicts -> orjson (el camino actual de los endpoints);
+- fields: lo mismo con ?fields=nombre (id + nombre);
+
+y después mide los endpoints por HTTP sin comprimir, con gzip y con brotli (tiempo y bytes enviados).
+Sale con código 1 si el camino rápido no es más rápido que el anterior.
+
+Uso: python -m benchmarks.bench_serializacion --estudiantes 10000 --pagina 100 --repeticiones 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _medir(fn, repeticiones: int):
+    fn()  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estudiantes", type=int, default=10000, help="Tamaño del roster (todos en el curso 1)")
+    parser.add_argument("--pagina", type=int, default=100, help="Tamaño de la página de /estudiantes/")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'serializacion.db')}"
+    os.environ["CACHE_BACKEND"] = "ninguno"
+    os.environ["SLOW_QUERY_MS"] = "0"
+    os.environ.setdefault("DB_MODO", "sync")
+
+    import orjson
+    from fastapi.testclient import TestClient
+    from pydantic import TypeAdapter
+    from sqlmodel import Session
+    from typing import List
+
+    import main as app_main
+    from utils.migraciones import migrar
+    from data.models import Estudiante
+    from data.schemas import CursoCreate, EstudianteExpandido, EstudianteRead
+    from operations import operations_db as ops
+
+    migrar(app_main.engine)
+    with TestClient(app_main.app) as cliente:
+        with Session(app_main.engine) as session:
+            session.add_all(
+                Estudiante(cedula=f"{10000 + i}", nombre=f"Estudiante {i}", email=f"e{i}@uni.edu", semestre=1 + i % 10)
+                for i in range(args.estudiantes)
+            )
+            session.commit()
+            ops.crear_curso(session, CursoCreate(codigo="C000", nombre="Curso 0", creditos=3))
+            ops.matricular_lote(session, [(e, 1) for e in range(1, args.estudiantes + 1)], conflictos="ignorar")
+
+        lista = TypeAdapter(List[EstudianteExpandido])
+        roster = TypeAdapter(List[EstudianteRead])
+
+        def antes(adaptador, cargar, **dump):
+            # serialize_response de FastAPI: validar contra el response_model y volcar a JSON
+            def fn():
+                with Session(app_main.engine) as s:
+                    datos = adaptador.validate_python(cargar(s), from_attributes=True)
+                    return json.dumps(adaptador.dump_python(datos, mode="json", **dump), ensure_ascii=False,
+                                      separators=(",", ":")).encode()
+            return fn
+
+        def rapido(cargar):
+            def fn():
+                with Session(app_main.engine) as s:
+                    return orjson.dumps(cargar(s))
+            return fn
+
+        completo = ops.parsear_campos(Estudiante)
+        solo_nombre = ops.parsear_campos(Estudiante, "nombre")
+        casos = [
+            (f"página ({args.pagina})", [
+                ("antes", antes(lista, lambda s: ops.expandir(ops.listar_estudiantes(s, 0, args.pagina), None),
+                                exclude_none=True)),
+                ("rápido", rapido(lambda s: ops.a_dicts(ops.listar_estudiantes_filas(s, completo, 0, args.pagina), completo, True))),
+                ("fields", rapido(lambda s: ops.a_dicts(ops.listar_estudiantes_filas(s, solo_nombre, 0, args.pagina), solo_nombre, True))),
+            ]),
+            (f"roster ({args.estudiantes})", [
+                ("antes", antes(roster, lambda s: [ops._a_dict(e) for e in ops.estudiantes_de_curso(s, 1)])),
+                ("rápido", rapido(lambda s: ops.filas_estudiantes_de_curso(s, 1))),
+                ("fields", rapido(lambda s: ops.filas_estudiantes_de_curso(s, 1, solo_nombre))),
+            ]),
+        ]
+
+        print(f"{'carga':<16} {'camino':<8} {'p50 ms':>9} {'bytes':>10} {'x':>6}")
+        lento = False
+        for nombre, caminos in casos:
+            base = None
+            for camino, fn in caminos:
+                ms, cuerpo = _medir(fn, args.repeticiones)
+                base = base or ms
+                print(f"{nombre:<16} {camino:<8} {ms:>9.2f} {len(cuerpo):>10} {base / ms:>5.1f}x")
+                if camino == "rápido" and ms >= base:
+                    lento = True
+
+        print(f"\n{'HTTP':<44} {'p50 ms':>9} {'bytes':>10}")
+        rutas = [
+            (f"/estudiantes/?limit={args.pagina}", {"limit": args.pagina}),
+            ("/cursos/1/estudiantes", {}),
+            ("/cursos/1/estudiantes?fields=nombre", {"fields": "nombre"}),
+        ]
+        for ruta, params in rutas:
+            for codificacion in ("identity", "gzip", "br"):
+                url = ruta.split("?")[0]
+                ms, resp = _medir(
+                    lambda: cliente.get(url, params=params, headers={"Accept-Encoding": codificacion}),
+                    args.repeticiones,
+                )
+                enviados = resp.headers.get("content-length") or len(resp.content)
+                print(f"{ruta + ' [' + codificacion + ']':<44} {ms:>9.2f} {int(enviados):>10}")
+
+    if lento:
+        print("ERROR: el camino rápido no mejora al anterior", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
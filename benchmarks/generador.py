@@ -0,0 +1,168 @@
+"""Generador de datos sintéticos de universidad, reproducible por semilla.
+
+- Estudiantes con nombres/apellidos combinados y más matrícula en los primeros semestres.
+- Cursos con horario ('Lu/Mi 08-10') y popularidad tipo Zipf: pocos cursos concentran
+  gran parte de las matrículas.
+- Entre --min-cursos y --max-cursos cursos distintos por estudiante, elegidos según esa popularidad.
+- Al final se recalculan estadísticas, ocupación horaria, índices de búsqueda y ANALYZE, así la base
+  queda igual que si se hubiera llenado a través de la API.
+
+Uso: python -m benchmarks.generador --database-url sqlite:///bench.db --estudiantes 100000 --cursos 2000
+"""
+import argparse
+import itertools
+import random
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from data.models import Estudiante, Curso, Matricula
+from operations import estadisticas, horarios
+from operations.busqueda import crear_indices_busqueda
+from utils.indices import analizar
+from utils.migraciones import migrar
+
+NOMBRES = (
+    "Ana", "Andrés", "Camila", "Carlos", "Daniela", "David", "Diego", "Elena", "Felipe", "Gabriela",
+    "Javier", "José", "Juan", "Laura", "Lucía", "Luis", "María", "Mateo", "Natalia", "Pablo",
+    "Paula", "Ricardo", "Sara", "Sebastián", "Sofía", "Tomás", "Valentina", "Valeria",
+)
+APELLIDOS = (
+    "Álvarez", "Castro", "Díaz", "Fernández", "García", "Gómez", "González", "Hernández", "Jiménez", "López",
+    "Martínez", "Moreno", "Muñoz", "Núñez", "Ortiz", "Pérez", "Ramírez", "Rodríguez", "Romero", "Ruiz",
+    "Sánchez", "Torres", "Vargas", "Vásquez",
+)
+AREAS = (
+    "Cálculo", "Álgebra", "Física", "Química", "Programación", "Bases de Datos", "Redes", "Estadística",
+    "Economía", "Contabilidad", "Derecho", "Historia", "Filosofía", "Biología", "Inglés", "Ética",
+)
+NIVELES = ("I", "II", "III", "Avanzado", "Aplicado", "Introducción a")
+DIAS = ("Lu", "Ma", "Mi", "Ju", "Vi")
+# Peso por semestre: más estudiantes en los primeros
+PESOS_SEMESTRE = (18, 16, 13, 11, 10, 9, 8, 6, 5, 4)
+
+
+def _horario(rnd: random.Random) -> str:
+    inicio = rnd.randrange(7, 20)
+    duracion = rnd.choice((1, 2, 2, 3))
+    fin = min(inicio + duracion, 22)
+    d = rnd.randrange(len(DIAS))
+    dias = DIAS[d] if rnd.random() < 0.4 else f"{DIAS[d]}/{DIAS[(d + 2) % len(DIAS)]}"
+    return f"{dias} {inicio:02d}-{fin:02d}"
+
+
+def _nombre_curso(rnd: random.Random, i: int) -> str:
+    nivel = rnd.choice(NIVELES)
+    area = AREAS[i % len(AREAS)]
+    return f"{nivel} {area}" if nivel == "Introducción a" else f"{area} {nivel}"
+
+
+def generar(
+    engine: Engine,
+    estudiantes: int = 1000,
+    cursos: int = 100,
+    min_cursos: int = 4,
+    max_cursos: int = 8,
+    zipf: float = 1.1,
+    semilla: int = 42,
+    bloque: int = 5000,
+    progreso: bool = False,
+) -> Dict[str, float]:
+    # Requiere una base vacía: los ids se asumen 1..N
+    rnd = random.Random(semilla)
+    max_cursos = min(max_cursos, cursos)
+    min_cursos = min(min_cursos, max_cursos)
+    tiempos: Dict[str, float] = {}
+
+    def log(msg: str):
+        if progreso:
+            print(msg, flush=True)
+
+    migrar(engine)
+    with Session(engine) as session:
+        if session.exec(select(Estudiante.id).limit(1)).first() is not None:
+            raise SystemExit("La base ya tiene estudiantes; use una base vacía")
+
+        t0 = time.perf_counter()
+        semestres = list(range(1, 11))
+        for inicio in range(0, estudiantes, bloque):
+            filas = []
+            for i in range(inicio, min(estudiantes, inicio + bloque)):
+                nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+                filas.append({
+                    "cedula": f"{10_000_000 + i}",
+                    "nombre": nombre,
+                    "email": f"{nombre.split()[0].lower()}.{i}@uni.edu",
+                    "semestre": rnd.choices(semestres, PESOS_SEMESTRE)[0],
+                    "is_deleted": False,
+                })
+            session.execute(insert(Estudiante), filas)
+        session.execute(insert(Curso), [
+            {"codigo": f"CUR{i:05d}", "nombre": _nombre_curso(rnd, i), "creditos": rnd.choice((2, 3, 3, 4, 4, 5)),
+             "horario": _horario(rnd), "is_deleted": False}
+            for i in range(cursos)
+        ])
+        session.commit()
+        tiempos["entidades_s"] = time.perf_counter() - t0
+        log(f"{estudiantes} estudiantes y {cursos} cursos en {tiempos['entidades_s']:.1f}s")
+
+        # Popularidad Zipf sobre un orden aleatorio de cursos
+        ids_cursos = list(range(1, cursos + 1))
+        rnd.shuffle(ids_cursos)
+        acumulados = list(itertools.accumulate(1 / (rango ** zipf) for rango in range(1, cursos + 1)))
+
+        t0 = time.perf_counter()
+        total = 0
+        pendientes = []
+        for e in range(1, estudiantes + 1):
+            k = rnd.randint(min_cursos, max_cursos)
+            elegidos = set()
+            while len(elegidos) < k:
+                elegidos.update(rnd.choices(ids_cursos, cum_weights=acumulados, k=k - len(elegidos)))
+            pendientes.extend({"estudiante_id": e, "curso_id": c} for c in elegidos)
+            if len(pendientes) >= bloque:
+                session.execute(insert(Matricula), pendientes)
+                total += len(pendientes)
+                pendientes = []
+        if pendientes:
+            session.execute(insert(Matricula), pendientes)
+            total += len(pendientes)
+        session.commit()
+        tiempos["matriculas_s"] = time.perf_counter() - t0
+        tiempos["matriculas"] = total
+        log(f"{total} matrículas en {tiempos['matriculas_s']:.1f}s")
+
+    # Estado derivado: franjas y ocupación horaria, contadores e índices de búsqueda
+    t0 = time.perf_counter()
+    horarios.inicializar(engine)
+    with Session(engine) as session:
+        estadisticas.reconciliar(session)
+    crear_indices_busqueda(engine)
+    analizar(engine)
+    tiempos["derivados_s"] = time.perf_counter() - t0
+    log(f"estadísticas, horarios e índices en {tiempos['derivados_s']:.1f}s")
+    return tiempos
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--estudiantes", type=int, default=1000)
+    parser.add_argument("--cursos", type=int, default=100)
+    parser.add_argument("--min-cursos", type=int, default=4)
+    parser.add_argument("--max-cursos", type=int, default=8)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponente de popularidad de cursos")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from utils.db import crear_engine
+    engine = crear_engine(args.database_url)
+    generar(engine, args.estudiantes, args.cursos, args.min_cursos, args.max_cursos, args.zipf, args.semilla,
+            progreso=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Planes de ejecución de las consultas de operations_db: falla si una consulta caliente recorre una tabla entera.
+
+Ejecuta cada operación sobre una base sintética (benchmarks.generador + ANALYZE), captura las
+sentencias SQL que emite y pide su plan con EXPLAIN QUERY PLAN (SQLite) o EXPLAIN con
+enable_seqscan=off (PostgreSQL). Un recorrido completo (SCAN / Seq Scan) de una tabla de la
+aplicación se acepta solo si:
+- recorre un índice parcial (ya contiene solo las filas del filtro, p.ej. ix_estudiante_eliminados),
+- la sentencia tiene LIMIT y el recorrido ya entrega el orden pedido (sin TEMP B-TREE / Sort), es
+  decir, se detiene tras la primera página, o
+- la tabla tiene menos de --min-filas filas: ahí el planificador elige el recorrido con razón
+  (catálogos como franja_horario o estadistica_semestre).
+
+Las operaciones marcadas como frías (agregados, reconciliación) se informan sin fallar.
+
+Uso: python -m benchmarks.planes_consultas --estudiantes 5000 --cursos 200 [--database-url URL] [-v]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from typing import Any, Callable, List, Set, Tuple
+
+
+def _escaneos_sqlite(conn, sentencia: str, parametros, parciales: Set[str]) -> Tuple[List[str], List[str]]:
+    plan = [fila[3] for fila in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sentencia, parametros)]
+    escaneos = [
+        m.group(1) for d in plan for m in [re.match(r"SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?", d)]
+        if m and m.group(2) not in parciales
+    ]
+    ordena = any("TEMP B-TREE" in d for d in plan)
+    return plan, (escaneos if not ordena else escaneos + ["<orden>"])
+
+def _escaneos_postgres(conn, sentencia: str, parametros, _parciales: Set[str]) -> Tuple[List[str], List[str]]:
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = [fila[0] for fila in conn.exec_driver_sql("EXPLAIN " + sentencia, parametros)]
+    escaneos = [m.group(1) for d in plan for m in [re.search(r"Seq Scan on (\w+)", d)] if m]
+    ordena = any(re.search(r"-> +Sort|^Sort", d.strip()) for d in plan)
+    return plan, (escaneos if not ordena else escaneos + ["<orden>"])
+
+
+def _operaciones(ids_est: List[int], ids_cur: List[int]) -> List[Tuple[str, bool, Callable[[Any], Any]]]:
+    from data.schemas import EstudianteUpdate, CursoUpdate
+    from data.models import Estudiante, Curso, ahora
+    from operations import operations_db as ops, archivo, estadisticas, horarios
+    from operations.exportacion import exportar
+    from utils.db import engine
+
+    # e, c: solo lectura; e2, c2: los usan las operaciones de escritura
+    e, c = ids_est[len(ids_est) // 2], ids_cur[0]
+    e2, c2 = ids_est[-1], ids_cur[-1]
+    cursor = ops.codificar_cursor("id", None, e)
+    cursor_nombre = ops.codificar_cursor("nombre", "María", e)
+
+    def consumir(it):
+        for _ in it:
+            pass
+
+    # (nombre, caliente, fn(session))
+    return [
+        ("listar_estudiantes", True, lambda s: ops.listar_estudiantes(s, 0, 20)),
+        ("listar_estudiantes semestre", True, lambda s: ops.listar_estudiantes(s, 0, 20, semestre=3)),
+        ("listar_estudiantes cursor", True, lambda s: ops.listar_estudiantes(s, 0, 20, cursor=cursor)),
+        ("listar_estudiantes order_by=nombre", True, lambda s: ops.listar_estudiantes(s, 0, 20, order_by="nombre")),
+        ("listar_estudiantes order_by=nombre cursor", True,
+         lambda s: ops.listar_estudiantes(s, 0, 20, order_by="nombre", cursor=cursor_nombre)),
+        ("listar_estudiantes order_by=semestre", True, lambda s: ops.listar_estudiantes(s, 0, 20, order_by="semestre")),
+        ("listar_estudiantes order_by=cedula", True, lambda s: ops.listar_estudiantes(s, 0, 20, order_by="cedula")),
+        ("listar_estudiantes expand", True, lambda s: ops.expandir(ops.listar_estudiantes(s, 0, 50, expand="cursos"), "cursos")),
+        ("listar_estudiantes nombre (trigram)", True, lambda s: ops.listar_estudiantes(s, 0, 20, nombre="mar")),
+        ("listar_estudiantes_eliminados", True, lambda s: ops.listar_estudiantes_eliminados(s)),
+        ("listar_cursos", True, lambda s: ops.listar_cursos(s, 0, 20)),
+        ("listar_cursos creditos", True, lambda s: ops.listar_cursos(s, 0, 20, creditos=3)),
+        ("listar_cursos order_by=nombre", True, lambda s: ops.listar_cursos(s, 0, 20, order_by="nombre")),
+        ("listar_cursos order_by=creditos", True, lambda s: ops.listar_cursos(s, 0, 20, order_by="creditos")),
+        ("listar_cursos expand", True, lambda s: ops.expandir(ops.listar_cursos(s, 0, 5, expand="estudiantes"), "estudiantes")),
+        ("listar_cursos_eliminados", True, lambda s: ops.listar_cursos_eliminados(s)),
+        ("obtener_estudiante", True, lambda s: ops.obtener_estudiante(s, e)),
+        ("obtener_curso", True, lambda s: ops.obtener_curso(s, c)),
+        ("obtener_lote estudiantes", True, lambda s: ops.obtener_lote(s, Estudiante, ids_est[:50], "cursos")),
+        ("obtener_lote cursos", True, lambda s: ops.obtener_lote(s, Curso, ids_cur[:20], "estudiantes")),
+        ("buscar_estudiante_por_nombre (trigram)", True, lambda s: ops.buscar_estudiante_por_nombre(s, "mar")),
+        ("buscar_curso_por_nombre (trigram)", True, lambda s: ops.buscar_curso_por_nombre(s, "cálc")),
+        ("cursos_de_estudiante", True, lambda s: ops.cursos_de_estudiante(s, e)),
+        ("estudiantes_de_curso", True, lambda s: ops.estudiantes_de_curso(s, c)),
+        ("matricular", True, lambda s: ops.matricular(s, e2, c2, "ignorar")),
+        ("desmatricular", True, lambda s: ops.desmatricular(s, e2, c2)),
+        ("matricular_lote", True, lambda s: ops.matricular_lote(s, [(e2, x) for x in ids_cur[-5:]], conflictos="marcar")),
+        ("actualizar_estudiante", True, lambda s: ops.actualizar_estudiante(s, e2, EstudianteUpdate(semestre=4))),
+        ("actualizar_curso", True, lambda s: ops.actualizar_curso(s, c2, CursoUpdate(creditos=4, horario="Sa 08-10"))),
+        ("eliminar_estudiante", True, lambda s: ops.eliminar_estudiante(s, e2)),
+        ("restaurar_estudiante", True, lambda s: ops.restaurar_estudiante(s, e2)),
+        ("eliminar_curso", True, lambda s: ops.eliminar_curso(s, c2)),
+        ("restaurar_curso", True, lambda s: ops.restaurar_curso(s, c2)),
+        ("eliminar_estudiantes semestre (masivo)", True, lambda s: ops.cambiar_estado_estudiantes(s, True, {"semestre": 9})),
+        ("restaurar_estudiantes semestre (masivo)", True, lambda s: ops.cambiar_estado_estudiantes(s, False, {"semestre": 9})),
+        ("eliminar_cursos creditos (masivo)", True, lambda s: ops.cambiar_estado_cursos(s, True, {"creditos": 5})),
+        ("restaurar_cursos creditos (masivo)", True, lambda s: ops.cambiar_estado_cursos(s, False, {"creditos": 5})),
+        ("archivar (un lote)", True, lambda s: archivo._archivar_lote(s, Estudiante, ahora(), 100)),
+        ("conflictos_matricula", True, lambda s: horarios.conflictos_matricula(s, e, c2)),
+        ("horario_estudiante", True, lambda s: horarios.horario_estudiante(s, e)),
+        ("verificar horario", True, lambda s: horarios.verificar(s, e, ids_cur[:6])),
+        ("estadistica_curso", True, lambda s: estadisticas.estadistica_curso(s, c)),
+        ("estadistica_estudiante", True, lambda s: estadisticas.estadistica_estudiante(s, e)),
+        ("cursos_mas_inscritos", True, lambda s: estadisticas.cursos_mas_inscritos(s, 10)),
+        ("distribucion_semestres", True, lambda s: estadisticas.distribucion_semestres(s)),
+        ("exportar matriculas de un curso", True,
+         lambda s: consumir(exportar(engine, "matriculas", filtros={"curso_id": c}))),
+        ("exportar matriculas de un estudiante", True,
+         lambda s: consumir(exportar(engine, "matriculas", filtros={"estudiante_id": e}))),
+        ("desglose (agregado)", False, lambda s: estadisticas.desglose(s, "curso")),
+        ("reconciliar (agregado)", False, lambda s: estadisticas.reconciliar(s)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Base ya poblada; por defecto se genera una temporal")
+    parser.add_argument("--estudiantes", type=int, default=5000)
+    parser.add_argument("--cursos", type=int, default=200)
+    parser.add_argument("--min-filas", type=int, default=1000, help="Tablas más pequeñas no cuentan como recorrido completo")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Imprime el plan de cada sentencia")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        tmp = tempfile.mkdtemp()
+        args.database_url = f"sqlite:///{os.path.join(tmp, 'planes.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["CACHE_BACKEND"] = "ninguno"
+
+    from fastapi import HTTPException
+    from sqlalchemy import event
+    from sqlmodel import SQLModel, Session, select, func
+
+    from benchmarks.generador import generar
+    from data.models import Estudiante, Curso
+    from utils.db import engine
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        vacia = s.exec(select(Estudiante.id).limit(1)).first() is None
+    if vacia:
+        generar(engine, args.estudiantes, args.cursos)  # incluye ANALYZE
+    with Session(engine) as s:
+        ids_est = list(s.exec(select(Estudiante.id).where(Estudiante.is_deleted == False).order_by(Estudiante.id)).all())  # noqa: E712
+        ids_cur = list(s.exec(select(Curso.id).where(Curso.is_deleted == False).order_by(Curso.id)).all())  # noqa: E712
+
+    with Session(engine) as s:
+        filas = {n: s.exec(select(func.count()).select_from(t)).one() for n, t in SQLModel.metadata.tables.items()}
+    grandes = {n for n, total in filas.items() if total >= args.min_filas}
+    parciales = {
+        ix.name for t in SQLModel.metadata.tables.values() for ix in t.indexes
+        if ix.kwargs.get("sqlite_where") is not None
+    }
+    print(f"tablas con >= {args.min_filas} filas: {', '.join(sorted(grandes))}")
+    capturadas: List[Tuple[str, Any]] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capturar(_conn, _cursor, sentencia, parametros, _context, executemany):
+        if re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT)", sentencia, re.I):
+            capturadas.append((sentencia, parametros[0] if executemany else parametros))
+
+    escaneos = _escaneos_sqlite if engine.dialect.name == "sqlite" else _escaneos_postgres
+    fallos, avisos = 0, 0
+    for nombre, caliente, fn in _operaciones(ids_est, ids_cur):
+        capturadas.clear()
+        with Session(engine) as session:
+            try:
+                fn(session)
+            except HTTPException:
+                pass
+        # Los EXPLAIN no empiezan por SELECT/INSERT/...: no se capturan a sí mismos
+        sentencias = capturadas[:]
+        problemas = []
+        for sentencia, parametros in sentencias:
+            with engine.begin() as conn:
+                plan, recorridos = escaneos(conn, sentencia, parametros, parciales)
+            completas = [t for t in recorridos if t in grandes]
+            acotada = re.search(r"\bLIMIT\b", sentencia, re.I) and "<orden>" not in recorridos
+            if completas and not acotada:
+                problemas.append((sentencia, plan, completas))
+            if args.verbose:
+                print(f"  {' '.join(sentencia.split())[:160]}")
+                for linea in plan:
+                    print(f"      {linea}")
+
+        if not problemas:
+            estado = "ok"
+        elif caliente:
+            estado, fallos = "FULL SCAN", fallos + 1
+        else:
+            estado, avisos = "scan (fría)", avisos + 1
+        print(f"{nombre:<45} {len(sentencias):>3} sentencias  {estado}")
+        if problemas and (caliente or args.verbose):
+            for sentencia, plan, completas in problemas:
+                print(f"    recorre {', '.join(sorted(set(completas)))}: {' '.join(sentencia.split())[:200]}")
+                for linea in plan:
+                    print(f"      {linea}")
+
+    print(f"{fallos} consultas calientes con recorrido completo, {avisos} frías")
+    if fallos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
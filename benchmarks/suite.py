@@ -0,0 +1,582 @@
+"""Suite de benchmarks reproducible: todos los endpoints de main.py y las operaciones de operations_db.
+
+Genera (o reutiliza) una base sintética con benchmarks.generador, ejecuta cada escenario y
+escribe un JSON con throughput y p50/p95/p99 por escenario, más metadatos (commit, versiones,
+parámetros) para comparar entre commits.
+
+Uso:
+  python -m benchmarks.suite ejecutar --estudiantes 20000 --cursos 500 --salida base.json
+  python -m benchmarks.suite ejecutar --filtro "GET /estudiantes" --salida parcial.json
+  python -m benchmarks.suite comparar base.json nuevo.json --umbral 0.2
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# RESULTADOS
+
+def percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    i = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[i]
+
+def resumir(tiempos: List[float], errores: int, segundos: float, tipo: str) -> Dict[str, Any]:
+    ordenados = sorted(t * 1000 for t in tiempos)
+    return {
+        "tipo": tipo,
+        "iteraciones": len(tiempos),
+        "errores": errores,
+        "ops_s": round(len(tiempos) / segundos, 1) if segundos else 0.0,
+        "media_ms": round(sum(ordenados) / len(ordenados), 3) if ordenados else 0.0,
+        "p50_ms": round(percentil(ordenados, 50), 3),
+        "p95_ms": round(percentil(ordenados, 95), 3),
+        "p99_ms": round(percentil(ordenados, 99), 3),
+    }
+
+def _commit() -> Optional[str]:
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ESCENARIOS
+
+@dataclass
+class Escenario:
+    nombre: str
+    paso: Callable[[random.Random], bool]   # True si la operación terminó como se esperaba
+    tipo: str = "http"                      # http | ops | concurrencia
+    peso: float = 1.0                       # fracción de --iteraciones (operaciones costosas < 1)
+    cubre: Tuple[str, ...] = field(default_factory=tuple)   # "METODO /ruta" de main.py
+
+
+def _escenarios(cliente, engine, n_est: int, n_cur: int, hilos: int) -> List[Escenario]:
+    from sqlmodel import Session, select
+    from data.models import Curso
+    from operations import operations_db as ops, archivo, cambios, estadisticas, horarios
+    from operations.busqueda import buscar
+
+    est = lambda r: r.randint(1, n_est)  # noqa: E731
+    cur = lambda r: r.randint(1, n_cur)  # noqa: E731
+    nuevos_est: List[int] = []
+    nuevos_cur: List[int] = []
+    secuencia = iter(range(10**9))
+    terminos = ("mar", "gonz", "ana", "lopez", "sof", "cálc", "progra", "redes")
+
+    def get(ruta: str, esperado=(200,), **params) -> bool:
+        return cliente.get(ruta, params=params).status_code in esperado
+
+    etags: Dict[str, str] = {}
+
+    def revalidar(ruta: str) -> bool:
+        # Sondeo de un cliente con caché: If-None-Match con el último ETag visto (304 mientras no cambie)
+        resp = cliente.get(ruta, headers={"If-None-Match": etags.get(ruta, '""')})
+        if resp.status_code == 200:
+            etags[ruta] = resp.headers["etag"]
+        return resp.status_code in (200, 304, 404)
+
+    def primer_lote(r) -> bool:
+        # Lo que hace /changes/stream al reanudar con ?since=: preparar + catch-up hasta el primer lote
+        # (TestClient acumula el cuerpo completo, así que un stream sin fin no se puede pedir por HTTP)
+        async def leer() -> bool:
+            ultimo = cambios.ultimo_id()
+            if not ultimo:
+                return False   # feed vacío: ningún escenario de escritura corrió antes
+            flujo = cambios.eventos(await cambios.preparar(max(0, ultimo - r.randint(1, 200))))
+            try:
+                return bool(await flujo.__anext__())
+            finally:
+                await flujo.aclose()
+        return asyncio.run(leer())
+
+    def con_sesion(fn) -> bool:
+        with Session(engine) as s:
+            fn(s)
+        return True
+
+    def crear_estudiante(r) -> bool:
+        n = next(secuencia)
+        resp = cliente.post("/estudiantes/", json={
+            "cedula": f"9{n:08d}", "nombre": f"Bench {n}", "email": f"bench{n}@uni.edu", "semestre": r.randint(1, 10),
+        })
+        if resp.status_code == 201:
+            nuevos_est.append(resp.json()["id"])
+        return resp.status_code == 201
+
+    def crear_curso(r) -> bool:
+        n = next(secuencia)
+        resp = cliente.post("/cursos/", json={
+            "codigo": f"B{n:07d}", "nombre": f"Bench {n}", "creditos": r.randint(1, 5), "horario": "Sa 08-10",
+        })
+        if resp.status_code == 201:
+            # crear_curso (sync) no devuelve el id: se recupera por código
+            buscado = cliente.get("/cursos/", params={"codigo": f"B{n:07d}"}).json()
+            nuevos_cur.extend(c["id"] for c in buscado)
+        return resp.status_code == 201
+
+    def sacar(lista: List[int]) -> Optional[int]:
+        return lista.pop() if lista else None
+
+    borrados_est: List[int] = []
+    borrados_cur: List[int] = []
+
+    def eliminar(ruta: str, origen: List[int], destino: List[int]) -> bool:
+        obj_id = sacar(origen)
+        if obj_id is None:
+            return True
+        destino.append(obj_id)
+        return cliente.delete(ruta.format(obj_id)).status_code == 200
+
+    def restaurar(ruta: str, origen: List[int]) -> bool:
+        obj_id = sacar(origen)
+        return obj_id is None or cliente.post(ruta.format(obj_id)).status_code == 200
+
+    borrados_masivos: Dict[str, List[List[int]]] = {"estudiantes": [], "cursos": []}
+
+    def eliminar_masivo(entidad: str, r, total: int) -> bool:
+        # 20 filas de la base; el escenario bulk-restore (mismo peso, justo después) las devuelve
+        ids = r.sample(range(1, total + 1), min(20, total))
+        borrados_masivos[entidad].append(ids)
+        return cliente.post(f"/{entidad}/bulk-delete", json={"ids": ids}).status_code == 200
+
+    def restaurar_masivo(entidad: str) -> bool:
+        if not borrados_masivos[entidad]:
+            return True
+        ids = borrados_masivos[entidad].pop()
+        return cliente.post(f"/{entidad}/bulk-restore", json={"ids": ids}).status_code == 200
+
+    def matricular_y_desmatricular(r) -> bool:
+        e, c = est(r), cur(r)
+        alta = cliente.post("/matriculas/", params={"estudiante_id": e, "curso_id": c, "conflictos": "ignorar"})
+        if alta.status_code == 409:
+            return True
+        baja = cliente.delete("/matriculas/", params={"estudiante_id": e, "curso_id": c})
+        return alta.status_code == 201 and baja.status_code == 200
+
+    def lote(r) -> bool:
+        pares = [{"estudiante_id": est(r), "curso_id": cur(r)} for _ in range(50)]
+        return cliente.post("/matriculas/bulk", json=pares, params={"conflictos": "marcar"}).status_code == 200
+
+    def lote_operaciones(r) -> bool:
+        # Lo que hace una acción de administración: alta de un estudiante, matrícula en tres cursos,
+        # retoque de un curso y baja de una de las matrículas, todo en una transacción
+        n = next(secuencia)
+        cursos = r.sample(range(1, n_cur + 1), min(3, n_cur))
+        ops = [{"op": "crear_estudiante", "datos": {
+            "cedula": f"6{n:08d}", "nombre": f"Lote {n}", "email": f"lote{n}@uni.edu", "semestre": r.randint(1, 10),
+        }}]
+        ops += [{"op": "matricular", "estudiante_id": "$0", "curso_id": c, "conflictos": "ignorar"} for c in cursos]
+        ops.append({"op": "actualizar_curso", "id": cursos[0], "datos": {"creditos": r.randint(1, 5)}})
+        ops.append({"op": "desmatricular", "estudiante_id": "$0", "curso_id": cursos[-1]})
+        resp = cliente.post("/batch", json=ops, params={"modo": r.choice(("atomico", "continuar"))})
+        return resp.status_code == 200 or resp.status_code == 404   # 404: un curso borrado por otro escenario
+
+    curso_lleno: List[int] = []
+
+    def lleno() -> int:
+        # Un curso de cupo 1 ya ocupado: toda solicitud nueva va a su lista de espera
+        if not curso_lleno:
+            n = next(secuencia)
+            cliente.post("/cursos/", json={"codigo": f"LLENO{n}", "nombre": f"Lleno {n}", "creditos": 1, "horario": "",
+                                           "cupo": 1})
+            with Session(engine) as s:
+                curso_lleno.append(s.exec(select(Curso.id).where(Curso.codigo == f"LLENO{n}")).one())
+            cliente.post("/matriculas/", params={"estudiante_id": 1, "curso_id": curso_lleno[0], "conflictos": "ignorar"})
+        return curso_lleno[0]
+
+    def esperar_y_salir(r) -> bool:
+        e, c = est(r), lleno()
+        alta = cliente.post("/matriculas/cola", params={"estudiante_id": e, "curso_id": c, "conflictos": "ignorar"})
+        if alta.status_code != 202:
+            return alta.status_code in (201, 404, 409)
+        return cliente.delete("/matriculas/espera", params={"estudiante_id": e, "curso_id": c}).status_code == 200
+
+    def importar(tipo: str) -> Callable[[random.Random], bool]:
+        def paso(r) -> bool:
+            base = next(secuencia) * 100
+            if tipo == "estudiantes":
+                csv = "cedula,nombre,email,semestre\n" + "".join(
+                    f"8{base + i:08d},Import {base + i},imp{base + i}@uni.edu,{r.randint(1, 10)}\n" for i in range(100)
+                )
+            else:
+                csv = "codigo,nombre,creditos,horario\n" + "".join(
+                    f"I{base + i:08d},Import {base + i},3,Do 10-12\n" for i in range(100)
+                )
+            archivo = {"archivo": (f"{tipo}.csv", io.BytesIO(csv.encode()), "text/csv")}
+            return cliente.post(f"/{tipo}/import", files=archivo).status_code == 200
+        return paso
+
+    def exportar(ruta: str, **params) -> Callable[[random.Random], bool]:
+        def paso(r) -> bool:
+            valores = {k: (v(r) if callable(v) else v) for k, v in params.items()}
+            with cliente.stream("GET", ruta, params=valores) as resp:
+                for _ in resp.iter_bytes():
+                    pass
+                return resp.status_code == 200
+        return paso
+
+    def concurrente(fn: Callable[[Any, random.Random], None]) -> Callable[[random.Random], bool]:
+        # Cada llamada del escenario lanza `hilos` operaciones simultáneas con sesiones propias
+        pool = ThreadPoolExecutor(max_workers=hilos)
+
+        def una(semilla: int) -> bool:
+            r = random.Random(semilla)
+            with Session(engine) as s:
+                try:
+                    fn(s, r)
+                    return True
+                except Exception as exc:  # noqa: BLE001 - 409 esperados se filtran abajo
+                    return getattr(exc, "status_code", 500) < 500
+
+        def paso(r) -> bool:
+            semillas = [r.randrange(1 << 30) for _ in range(hilos)]
+            return all(pool.map(una, semillas))
+        return paso
+
+    def alta_baja(s, r):
+        e, c = est(r), cur(r)
+        try:
+            ops.matricular(s, e, c, "ignorar")
+        except Exception as exc:  # noqa: BLE001
+            if getattr(exc, "status_code", None) != 409:
+                raise
+            return
+        ops.desmatricular(s, e, c)
+
+    E = Escenario
+    return [
+        # Root / salud
+        E("GET /", lambda r: get("/"), cubre=("GET /",)),
+        E("GET /health", lambda r: get("/health"), cubre=("GET /health",)),
+        E("GET /health/db", lambda r: get("/health/db"), cubre=("GET /health/db",)),
+        E("GET /cache/stats", lambda r: get("/cache/stats"), cubre=("GET /cache/stats",)),
+        E("GET /metrics", lambda r: get("/metrics"), peso=0.2, cubre=("GET /metrics",)),
+
+        # Estudiantes
+        E("POST /estudiantes/", crear_estudiante, peso=0.5, cubre=("POST /estudiantes/",)),
+        E("GET /estudiantes/", lambda r: get("/estudiantes/", limit=20, skip=r.randint(0, 200)), cubre=("GET /estudiantes/",)),
+        E("GET /estudiantes/ (semestre)", lambda r: get("/estudiantes/", limit=20, semestre=r.randint(1, 10))),
+        E("GET /estudiantes/ (nombre)", lambda r: get("/estudiantes/", limit=20, nombre=r.choice(terminos))),
+        E("GET /estudiantes/ (expand)", lambda r: get("/estudiantes/", limit=50, expand="cursos")),
+        E("GET /estudiantes/ (fields)", lambda r: get("/estudiantes/", limit=100, fields="nombre,email")),
+        E("GET /estudiantes/batch", lambda r: get(
+            "/estudiantes/batch", ids=",".join(str(est(r)) for _ in range(50)), expand="cursos",
+        ), cubre=("GET /estudiantes/batch",)),
+        E("GET /estudiantes/{id}", lambda r: get(f"/estudiantes/{est(r)}", esperado=(200, 404)),
+          cubre=("GET /estudiantes/{estudiante_id}",)),
+        E("GET /estudiantes/{id} (If-None-Match)", lambda r: revalidar(f"/estudiantes/{r.randint(1, min(n_est, 20))}")),
+        E("PATCH /estudiantes/{id}", lambda r: cliente.patch(
+            f"/estudiantes/{est(r)}", json={"semestre": r.randint(1, 10)}).status_code in (200, 404),
+          peso=0.3, cubre=("PATCH /estudiantes/{estudiante_id}",)),
+        E("DELETE /estudiantes/{id}", lambda r: eliminar("/estudiantes/{}", nuevos_est, borrados_est), peso=0.2,
+          cubre=("DELETE /estudiantes/{estudiante_id}",)),
+        E("GET /estudiantes/deleted", lambda r: get("/estudiantes/deleted"), peso=0.2, cubre=("GET /estudiantes/deleted",)),
+        E("POST /estudiantes/{id}/restore", lambda r: restaurar("/estudiantes/{}/restore", borrados_est), peso=0.2,
+          cubre=("POST /estudiantes/{estudiante_id}/restore",)),
+        E("POST /estudiantes/bulk-delete", lambda r: eliminar_masivo("estudiantes", r, n_est), peso=0.1,
+          cubre=("POST /estudiantes/bulk-delete",)),
+        E("POST /estudiantes/bulk-restore", lambda r: restaurar_masivo("estudiantes"), peso=0.1,
+          cubre=("POST /estudiantes/bulk-restore",)),
+        E("GET /estudiantes/search/", lambda r: get("/estudiantes/search/", esperado=(200, 404), nombre=r.choice(terminos)),
+          cubre=("GET /estudiantes/search/",)),
+        E("POST /estudiantes/import", importar("estudiantes"), peso=0.05, cubre=("POST /estudiantes/import",)),
+
+        # Cursos
+        E("POST /cursos/", crear_curso, peso=0.3, cubre=("POST /cursos/",)),
+        E("GET /cursos/", lambda r: get("/cursos/", limit=20, creditos=r.randint(2, 5)), cubre=("GET /cursos/",)),
+        E("GET /cursos/batch", lambda r: get("/cursos/batch", ids=",".join(str(cur(r)) for _ in range(20))),
+          cubre=("GET /cursos/batch",)),
+        E("GET /cursos/{id}", lambda r: get(f"/cursos/{cur(r)}", esperado=(200, 404)), cubre=("GET /cursos/{curso_id}",)),
+        E("GET /cursos/{id}?expand", lambda r: get(f"/cursos/{cur(r)}", esperado=(200, 404), expand="estudiantes"),
+          peso=0.2),
+        E("PATCH /cursos/{id}", lambda r: cliente.patch(
+            f"/cursos/{r.choice(nuevos_cur) if nuevos_cur else cur(r)}", json={"nombre": "Renombrado"}
+        ).status_code in (200, 404), peso=0.2, cubre=("PATCH /cursos/{curso_id}",)),
+        E("DELETE /cursos/{id}", lambda r: eliminar("/cursos/{}", nuevos_cur, borrados_cur), peso=0.1,
+          cubre=("DELETE /cursos/{curso_id}",)),
+        E("GET /cursos/deleted", lambda r: get("/cursos/deleted"), peso=0.2, cubre=("GET /cursos/deleted",)),
+        E("POST /cursos/{id}/restore", lambda r: restaurar("/cursos/{}/restore", borrados_cur), peso=0.1,
+          cubre=("POST /cursos/{curso_id}/restore",)),
+        E("POST /cursos/bulk-delete", lambda r: eliminar_masivo("cursos", r, n_cur), peso=0.05,
+          cubre=("POST /cursos/bulk-delete",)),
+        E("POST /cursos/bulk-restore", lambda r: restaurar_masivo("cursos"), peso=0.05,
+          cubre=("POST /cursos/bulk-restore",)),
+        E("GET /cursos/search/", lambda r: get("/cursos/search/", esperado=(200, 404), nombre=r.choice(terminos)),
+          cubre=("GET /cursos/search/",)),
+        E("POST /cursos/import", importar("cursos"), peso=0.05, cubre=("POST /cursos/import",)),
+
+        # Búsqueda y exportación
+        E("GET /busqueda/estudiantes", lambda r: get("/busqueda/estudiantes", q=r.choice(terminos)),
+          cubre=("GET /busqueda/estudiantes",)),
+        E("GET /busqueda/cursos", lambda r: get("/busqueda/cursos", q=r.choice(terminos)), cubre=("GET /busqueda/cursos",)),
+        E("GET /export/estudiantes", exportar("/export/estudiantes", semestre=lambda r: r.randint(1, 10)), peso=0.02,
+          cubre=("GET /export/estudiantes",)),
+        E("GET /export/cursos", exportar("/export/cursos"), peso=0.05, cubre=("GET /export/cursos",)),
+        E("GET /export/matriculas", exportar("/export/matriculas", curso_id=cur), peso=0.05,
+          cubre=("GET /export/matriculas",)),
+
+        # Matrículas y rosters
+        E("POST+DELETE /matriculas/", matricular_y_desmatricular, peso=0.5,
+          cubre=("POST /matriculas/", "DELETE /matriculas/")),
+        E("POST /matriculas/bulk (50)", lote, peso=0.1, cubre=("POST /matriculas/bulk",)),
+        E("POST /batch (6 operaciones)", lote_operaciones, peso=0.1, cubre=("POST /batch",)),
+        E("POST /matriculas/cola", lambda r: cliente.post("/matriculas/cola", params={
+            "estudiante_id": est(r), "curso_id": cur(r), "conflictos": "ignorar",
+        }).status_code in (201, 202, 404, 409), peso=0.3, cubre=("POST /matriculas/cola",)),
+        E("POST /matriculas/cola + DELETE /matriculas/espera", esperar_y_salir, peso=0.2,
+          cubre=("DELETE /matriculas/espera",)),
+        E("GET /cursos/{id}/cupo", lambda r: get(f"/cursos/{cur(r)}/cupo", esperado=(200, 404)),
+          cubre=("GET /cursos/{curso_id}/cupo",)),
+        E("GET /cursos/{id}/lista-espera", lambda r: get(f"/cursos/{lleno()}/lista-espera", esperado=(200, 404)),
+          cubre=("GET /cursos/{curso_id}/lista-espera",)),
+        E("GET /estudiantes/{id}/cursos", lambda r: get(f"/estudiantes/{est(r)}/cursos", esperado=(200, 404)),
+          cubre=("GET /estudiantes/{estudiante_id}/cursos",)),
+        E("GET /cursos/{id}/estudiantes", lambda r: get(f"/cursos/{cur(r)}/estudiantes", esperado=(200, 404)),
+          peso=0.3, cubre=("GET /cursos/{curso_id}/estudiantes",)),
+        E("GET /cursos/{id}/estudiantes (sin comprimir)", lambda r: cliente.get(
+            f"/cursos/{cur(r)}/estudiantes", headers={"Accept-Encoding": "identity"}
+        ).status_code in (200, 404), peso=0.3),
+        E("GET /cursos/{id}/estudiantes (fields)", lambda r: get(
+            f"/cursos/{cur(r)}/estudiantes", esperado=(200, 404), fields="nombre"), peso=0.3),
+        E("GET /cursos/{id}/estudiantes (If-None-Match)",
+          lambda r: revalidar(f"/cursos/{r.randint(1, min(n_cur, 5))}/estudiantes")),
+
+        # Horarios y estadísticas
+        E("GET /estudiantes/{id}/horario", lambda r: get(f"/estudiantes/{est(r)}/horario", esperado=(200, 404)),
+          cubre=("GET /estudiantes/{estudiante_id}/horario",)),
+        E("POST /estudiantes/{id}/horario/verificar", lambda r: cliente.post(
+            f"/estudiantes/{est(r)}/horario/verificar", json=[cur(r) for _ in range(6)]
+        ).status_code in (200, 404), cubre=("POST /estudiantes/{estudiante_id}/horario/verificar",)),
+        E("GET /stats/cursos", lambda r: get("/stats/cursos"), cubre=("GET /stats/cursos",)),
+        E("GET /stats/cursos/{id}", lambda r: get(f"/stats/cursos/{cur(r)}", esperado=(200, 404)),
+          cubre=("GET /stats/cursos/{curso_id}",)),
+        E("GET /stats/estudiantes/{id}", lambda r: get(f"/stats/estudiantes/{est(r)}", esperado=(200, 404)),
+          cubre=("GET /stats/estudiantes/{estudiante_id}",)),
+        E("GET /stats/semestres", lambda r: get("/stats/semestres"), cubre=("GET /stats/semestres",)),
+        E("GET /stats/desglose", lambda r: get("/stats/desglose", por=r.choice(("semestre", "creditos", "curso"))),
+          peso=0.05, cubre=("GET /stats/desglose",)),
+        E("POST /stats/reconciliar", lambda r: cliente.post("/stats/reconciliar").status_code == 200, peso=0.02,
+          cubre=("POST /stats/reconciliar",)),
+
+        # Analítica de co-matrícula (incluye los refrescos incrementales que dejan las escrituras de la suite)
+        E("GET /analytics/estado", lambda r: get("/analytics/estado"), peso=0.2, cubre=("GET /analytics/estado",)),
+        E("GET /analytics/estudiantes/{id}/companeros",
+          lambda r: get(f"/analytics/estudiantes/{est(r)}/companeros", esperado=(200, 404), k=10),
+          cubre=("GET /analytics/estudiantes/{estudiante_id}/companeros",)),
+        E("GET /analytics/cursos/{id}/solapamiento",
+          lambda r: get(f"/analytics/cursos/{cur(r)}/solapamiento", esperado=(200, 404)),
+          cubre=("GET /analytics/cursos/{curso_id}/solapamiento",)),
+        E("GET /analytics/cursos/solapamiento", lambda r: get("/analytics/cursos/solapamiento", limit=20),
+          cubre=("GET /analytics/cursos/solapamiento",)),
+        E("GET /analytics/cursos/solapamiento/matriz",
+          lambda r: get("/analytics/cursos/solapamiento/matriz", ids=",".join(str(cur(r)) for _ in range(20))),
+          cubre=("GET /analytics/cursos/solapamiento/matriz",)),
+
+        # Feed de cambios (el stream con suscriptores concurrentes: benchmarks.bench_cambios)
+        E("GET /changes", lambda r: get("/changes", since=r.randint(0, 1000), limit=100), cubre=("GET /changes",)),
+        E("GET /changes (entidad)", lambda r: get("/changes", since=r.randint(0, 1000), limit=100, entidad="matricula")),
+        E("GET /changes/stream (reanudar)", primer_lote, tipo="ops", peso=0.2, cubre=("GET /changes/stream",)),
+        # Archiva lo que los escenarios DELETE dejaron; los de restore lo traen de vuelta desde el archivo
+        E("archivo.archivar (dias=0)", lambda r: bool(archivo.archivar(engine, dias=0, lote=100)), tipo="ops", peso=0.05),
+
+        # operations_db directamente (sin HTTP ni serialización)
+        E("ops.listar_estudiantes (semestre)", lambda r: con_sesion(
+            lambda s: ops.listar_estudiantes(s, 0, 20, semestre=r.randint(1, 10))), tipo="ops"),
+        E("ops.listar_estudiantes (nombre)", lambda r: con_sesion(
+            lambda s: ops.listar_estudiantes(s, 0, 20, nombre=r.choice(terminos))), tipo="ops"),
+        E("ops.listar_estudiantes (cursor)", lambda r: con_sesion(
+            lambda s: ops.listar_estudiantes(s, 0, 20, cursor=ops.codificar_cursor("id", None, est(r)))), tipo="ops"),
+        E("ops.listar_cursos (creditos)", lambda r: con_sesion(
+            lambda s: ops.listar_cursos(s, 0, 20, creditos=r.randint(2, 5))), tipo="ops"),
+        E("ops.obtener_estudiante", lambda r: con_sesion(lambda s: ops.obtener_estudiante(s, est(r))), tipo="ops"),
+        E("ops.cursos_de_estudiante", lambda r: con_sesion(lambda s: ops.cursos_de_estudiante(s, est(r))), tipo="ops"),
+        E("ops.estudiantes_de_curso", lambda r: con_sesion(lambda s: ops.estudiantes_de_curso(s, cur(r))), tipo="ops",
+          peso=0.3),
+        E("ops.buscar estudiantes", lambda r: con_sesion(lambda s: buscar(s, "estudiantes", r.choice(terminos))),
+          tipo="ops"),
+        E("ops.conflictos_matricula", lambda r: con_sesion(
+            lambda s: horarios.conflictos_matricula(s, est(r), cur(r))), tipo="ops"),
+        E("ops.estadistica_estudiante", lambda r: con_sesion(
+            lambda s: estadisticas.estadistica_estudiante(s, est(r))), tipo="ops"),
+
+        # Concurrencia: matricular + desmatricular con `hilos` sesiones simultáneas
+        E(f"concurrencia matricular/desmatricular x{hilos}", concurrente(alta_baja), tipo="concurrencia", peso=0.2),
+    ]
+
+
+# EJECUCIÓN
+
+def ejecutar(args) -> Dict[str, Any]:
+    tmp = None
+    if args.database_url:
+        url = args.database_url
+    else:
+        tmp = tempfile.mkdtemp(prefix="bench_suite_")
+        url = f"sqlite:///{os.path.join(tmp, 'suite.db')}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("CACHE_BACKEND", args.cache)
+    os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, select, func
+    from benchmarks.generador import generar
+    from data.models import Estudiante, Curso
+    from utils.migraciones import migrar
+    import main as app_main
+
+    engine = app_main.engine
+    migrar(engine)
+    with Session(engine) as s:
+        vacia = s.exec(select(func.count()).select_from(Estudiante)).one() == 0
+    t0 = time.perf_counter()
+    if vacia:
+        print(f"generando {args.estudiantes} estudiantes / {args.cursos} cursos (semilla {args.semilla})...", file=sys.stderr)
+        generar(engine, args.estudiantes, args.cursos, semilla=args.semilla)
+    generacion_s = time.perf_counter() - t0
+    with Session(engine) as s:
+        n_est = s.exec(select(func.max(Estudiante.id))).one()
+        n_cur = s.exec(select(func.max(Curso.id))).one()
+
+    filtro = re.compile(args.filtro) if args.filtro else None
+    resultados: Dict[str, Any] = {}
+    cubiertas = set()
+    with TestClient(app_main.app) as cliente:
+        escenarios = _escenarios(cliente, engine, n_est, n_cur, args.hilos)
+        for esc in escenarios:
+            cubiertas.update(esc.cubre)
+            if filtro and not filtro.search(esc.nombre):
+                continue
+            rnd = random.Random(f"{args.semilla}:{esc.nombre}")
+            iteraciones = max(3, int(args.iteraciones * esc.peso))
+            for _ in range(min(args.calentamiento, iteraciones)):
+                esc.paso(rnd)
+            tiempos, errores = [], 0
+            inicio = time.perf_counter()
+            for _ in range(iteraciones):
+                t = time.perf_counter()
+                ok = esc.paso(rnd)
+                tiempos.append(time.perf_counter() - t)
+                errores += 0 if ok else 1
+            total = time.perf_counter() - inicio
+            if esc.tipo == "concurrencia":
+                # Cada paso son `hilos` operaciones en paralelo
+                resumen = resumir(tiempos, errores, total, esc.tipo)
+                resumen["ops_s"] = round(iteraciones * args.hilos / total, 1)
+            else:
+                resumen = resumir(tiempos, errores, total, esc.tipo)
+            resultados[esc.nombre] = resumen
+            print(f"{esc.nombre:<48} {resumen['ops_s']:>9.1f} ops/s  p50 {resumen['p50_ms']:>8.2f}  "
+                  f"p95 {resumen['p95_ms']:>8.2f}  p99 {resumen['p99_ms']:>8.2f} ms"
+                  + (f"  errores {errores}" if errores else ""), file=sys.stderr)
+
+    rutas = {
+        f"{m} {r.path}" for r in app_main.app.routes
+        if getattr(r, "include_in_schema", False) for m in getattr(r, "methods", ())
+    }
+    sin_cubrir = sorted(rutas - cubiertas)
+    if sin_cubrir:
+        print(f"AVISO: endpoints sin escenario: {sin_cubrir}", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": app_main.engine.dialect.name,
+            "db_modo": os.getenv("DB_MODO", "sync"),
+            "cache": os.environ["CACHE_BACKEND"],
+            "estudiantes": n_est,
+            "cursos": n_cur,
+            "semilla": args.semilla,
+            "iteraciones": args.iteraciones,
+            "hilos": args.hilos,
+            "generacion_s": round(generacion_s, 2),
+            "sin_cubrir": sin_cubrir,
+        },
+        "escenarios": resultados,
+    }
+
+
+# COMPARACIÓN ENTRE COMMITS
+
+def comparar(base: Dict[str, Any], actual: Dict[str, Any], metrica: str, umbral: float, minimo_ms: float) -> int:
+    print(f"base {base['meta'].get('commit')} -> actual {actual['meta'].get('commit')} ({metrica})")
+    regresiones = 0
+    for nombre, res in actual["escenarios"].items():
+        previo = base["escenarios"].get(nombre)
+        if previo is None:
+            print(f"  {nombre:<48} nuevo")
+            continue
+        antes, ahora = previo[metrica], res[metrica]
+        cambio = (ahora - antes) / antes if antes else 0.0
+        peor = cambio > umbral and ahora - antes > minimo_ms
+        regresiones += peor
+        marca = "REGRESIÓN" if peor else ""
+        print(f"  {nombre:<48} {antes:>9.2f} -> {ahora:>9.2f}  {cambio:+7.1%}  {marca}")
+    print(f"{regresiones} regresiones (umbral {umbral:.0%}, mínimo {minimo_ms} ms)")
+    return 1 if regresiones else 0
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    ej = sub.add_parser("ejecutar", help="Ejecuta la suite y escribe el JSON de resultados")
+    ej.add_argument("--database-url", help="Base existente (si está vacía se genera); por defecto una temporal")
+    ej.add_argument("--estudiantes", type=int, default=10_000)
+    ej.add_argument("--cursos", type=int, default=300)
+    ej.add_argument("--semilla", type=int, default=42)
+    ej.add_argument("--iteraciones", type=int, default=200, help="Iteraciones base por escenario")
+    ej.add_argument("--calentamiento", type=int, default=5)
+    ej.add_argument("--hilos", type=int, default=8, help="Sesiones simultáneas en el escenario de concurrencia")
+    ej.add_argument("--cache", default="memoria", choices=("memoria", "compartido", "ninguno"))
+    ej.add_argument("--filtro", help="Regex sobre el nombre de los escenarios a ejecutar")
+    ej.add_argument("--salida", help="Archivo JSON de resultados (por defecto stdout)")
+
+    cmp_ = sub.add_parser("comparar", help="Compara dos JSON y falla si hay regresiones")
+    cmp_.add_argument("base")
+    cmp_.add_argument("actual")
+    cmp_.add_argument("--metrica", default="p95_ms", choices=("p50_ms", "p95_ms", "p99_ms", "media_ms"))
+    cmp_.add_argument("--umbral", type=float, default=0.2, help="Empeoramiento relativo tolerado")
+    cmp_.add_argument("--minimo-ms", type=float, default=0.5, help="Ignora diferencias absolutas menores")
+
+    args = parser.parse_args(argv)
+    if args.comando == "comparar":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.actual, encoding="utf-8") as f:
+            actual = json.load(f)
+        sys.exit(comparar(base, actual, args.metrica, args.umbral, args.minimo_ms))
+
+    resultado = ejecutar(args)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+    os._exit(0)  # los hilos del escenario de concurrencia no bloquean la salida
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,58 @@
+from datetime import datetime, timezone
 from typing import Optional, List
+from sqlalchemy import Index, text
+from sqlalchemy.orm import declared_attr
 from sqlmodel import SQLModel, Field, Relationship
 
 
+# Índices parciales por estado de borrado: las listas siempre filtran is_deleted, así el índice
+# solo contiene las filas que la consulta puede devolver
+def _parcial(nombre: str, *columnas: str, eliminados: bool = False) -> Index:
+    valor = "true" if eliminados else "false"
+    return Index(
+        nombre, *columnas,
+        sqlite_where=text(f"is_deleted = {int(eliminados)}"),
+        postgresql_where=text(f"is_deleted = {valor}"),
+    )
+
+def ahora() -> datetime:
+    # UTC sin zona: SQLite no guarda el offset
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class TableBase(SQLModel):
     id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
     is_deleted: bool = Field(default=False, exclude=True)
+    # version sube en cada UPDATE del ORM (version_id_col: el UPDATE lleva WHERE version = <leída>);
+    # version_matriculas en cada (des)matrícula, para el ETag de las listas sin invalidar el de la fila
+    version: int = Field(default=1, exclude=True)
+    version_matriculas: int = Field(default=1, exclude=True)
+    actualizado_en: Optional[datetime] = Field(
+        default=None, exclude=True, sa_column_kwargs={"default": ahora, "onupdate": ahora},
+    )
+    # Cuándo se hizo el borrado lógico: pasada la retención la fila se mueve a la tabla de archivo
+    eliminado_en: Optional[datetime] = Field(default=None, exclude=True)
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.__table__.c.version}
 
     class Config:
         extra = "forbid"
         validate_assignment = True
 
 class Matricula(SQLModel, table=True):
+    # La PK (estudiante_id, curso_id) no sirve para buscar por curso: índice inverso
+    __table_args__ = (Index("ix_matricula_curso_estudiante", "curso_id", "estudiante_id"),)
     estudiante_id: Optional[int] = Field(default=None, foreign_key="estudiante.id", primary_key=True)
     curso_id: Optional[int] = Field(default=None, foreign_key="curso.id", primary_key=True)
 
 class Estudiante(TableBase, table=True):
     __tablename__ = "estudiante"
+    __table_args__ = (
+        _parcial("ix_estudiante_activos_semestre", "semestre", "id"),
+        _parcial("ix_estudiante_activos_nombre", "nombre", "id"),
+        _parcial("ix_estudiante_eliminados", "id", eliminados=True),
+    )
     cedula: str = Field(index=True, unique=True, min_length=5, max_length=20, description="Documento único")
     nombre: str = Field(min_length=1, max_length=100)
     email: str = Field(min_length=5, max_length=120)
@@ -24,10 +61,129 @@ class Estudiante(TableBase, table=True):
 
 class Curso(TableBase, table=True):
     __tablename__ = "curso"
+    __table_args__ = (
+        _parcial("ix_curso_activos_creditos", "creditos", "id"),
+        _parcial("ix_curso_activos_nombre", "nombre", "id"),
+        _parcial("ix_curso_eliminados", "id", eliminados=True),
+    )
     codigo: str = Field(index=True, unique=True, min_length=2, max_length=15, description="Código único")
     nombre: str = Field(min_length=1, max_length=100)
     creditos: int = Field(default=1, ge=1, le=10)
     horario: str = Field(default="", max_length=50, description="Ej: 'Lu 08-10'")
+    cupo: Optional[int] = Field(default=None, ge=1, description="Plazas; None = sin límite")
     estudiantes: List[Estudiante] = Relationship(back_populates="cursos", link_model=Matricula)
 
-__all__ = ["Estudiante", "Curso", "Matricula", "TableBase"]
+# ESTADÍSTICAS (contadores mantenidos por operations_db en la misma transacción)
+
+class EstadisticaCurso(SQLModel, table=True):
+    __tablename__ = "estadistica_curso"
+    curso_id: int = Field(foreign_key="curso.id", primary_key=True)
+    inscritos: int = Field(default=0, index=True, description="Matrículas de estudiantes activos")
+
+class EstadisticaEstudiante(SQLModel, table=True):
+    __tablename__ = "estadistica_estudiante"
+    estudiante_id: int = Field(foreign_key="estudiante.id", primary_key=True)
+    cursos: int = Field(default=0, description="Cursos activos matriculados")
+    creditos: int = Field(default=0, description="Suma de créditos de esos cursos")
+
+class EstadisticaSemestre(SQLModel, table=True):
+    __tablename__ = "estadistica_semestre"
+    semestre: int = Field(primary_key=True)
+    estudiantes: int = Field(default=0, description="Estudiantes activos en el semestre")
+
+# HORARIOS (Curso.horario parseado; ocupación semanal por estudiante como máscara de bits)
+
+class FranjaHorario(SQLModel, table=True):
+    __tablename__ = "franja_horario"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    curso_id: int = Field(foreign_key="curso.id", index=True)
+    dia: int = Field(ge=0, le=6, description="0 = lunes")
+    inicio: int = Field(ge=0, le=1440, description="Minutos desde medianoche")
+    fin: int = Field(ge=0, le=1440)
+
+class OcupacionEstudiante(SQLModel, table=True):
+    __tablename__ = "ocupacion_estudiante"
+    estudiante_id: int = Field(foreign_key="estudiante.id", primary_key=True)
+    mascara: str = Field(default="", description="Bloques ocupados por sus cursos activos (hex)")
+
+# LISTA DE ESPERA (solicitudes a cursos sin cupo; el id autoincremental da el orden de llegada)
+
+class ListaEspera(SQLModel, table=True):
+    __tablename__ = "lista_espera"
+    __table_args__ = (
+        Index("ix_lista_espera_curso", "curso_id", "id"),
+        Index("ux_lista_espera_estudiante_curso", "estudiante_id", "curso_id", unique=True),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    estudiante_id: int = Field(foreign_key="estudiante.id")
+    curso_id: int = Field(foreign_key="curso.id")
+    conflictos: str = Field(default="marcar", max_length=10, description="Política de horario al promover")
+    creado_en: datetime = Field(default_factory=ahora)
+
+# CAMBIOS (registro append-only escrito en la misma transacción que cada escritura; el id es el offset del feed)
+
+class Cambio(SQLModel, table=True):
+    __tablename__ = "cambio"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entidad: str = Field(max_length=20, description="estudiante | curso | matricula")
+    operacion: str = Field(max_length=20, description="crear | actualizar | eliminar | restaurar | matricular | desmatricular")
+    entidad_id: int = Field(description="En matrículas, el estudiante")
+    relacionado_id: Optional[int] = Field(default=None, description="En matrículas, el curso")
+    creado_en: datetime = Field(default_factory=ahora, index=True)
+
+# En PostgreSQL las escrituras dejan aquí sus cambios sin bloquearse entre sí; cambios.secuenciar los pasa a
+# `cambio` (y les da offset) después del commit, en una sola transacción a la vez
+
+class CambioPendiente(SQLModel, table=True):
+    __tablename__ = "cambio_pendiente"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entidad: str = Field(max_length=20)
+    operacion: str = Field(max_length=20)
+    entidad_id: int
+    relacionado_id: Optional[int] = None
+    creado_en: datetime = Field(default_factory=ahora)
+
+# ARCHIVO (filas eliminadas hace más de ARCHIVO_RETENCION_DIAS, fuera de las tablas calientes)
+# Mismas columnas que la tabla de origen, el mismo id (sin autoincremento) y sin restricciones de unicidad:
+# la cédula o el código pueden haberse reutilizado. Una matrícula vive aquí si alguno de sus lados está archivado.
+
+class EstudianteArchivo(SQLModel, table=True):
+    __tablename__ = "estudiante_archivo"
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    cedula: str = Field(index=True, max_length=20)
+    nombre: str = Field(max_length=100)
+    email: str = Field(max_length=120)
+    semestre: int
+    version: int
+    version_matriculas: int
+    actualizado_en: Optional[datetime] = None
+    eliminado_en: Optional[datetime] = None
+    archivado_en: datetime = Field(default_factory=ahora)
+
+class CursoArchivo(SQLModel, table=True):
+    __tablename__ = "curso_archivo"
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    codigo: str = Field(index=True, max_length=15)
+    nombre: str = Field(max_length=100)
+    creditos: int
+    horario: str = Field(default="", max_length=50)
+    cupo: Optional[int] = None
+    version: int
+    version_matriculas: int
+    actualizado_en: Optional[datetime] = None
+    eliminado_en: Optional[datetime] = None
+    archivado_en: datetime = Field(default_factory=ahora)
+
+class MatriculaArchivo(SQLModel, table=True):
+    __tablename__ = "matricula_archivo"
+    __table_args__ = (Index("ix_matricula_archivo_curso", "curso_id", "estudiante_id"),)
+    estudiante_id: int = Field(primary_key=True)
+    curso_id: int = Field(primary_key=True)
+    archivado_en: datetime = Field(default_factory=ahora)
+
+__all__ = [
+    "Estudiante", "Curso", "Matricula", "TableBase",
+    "EstadisticaCurso", "EstadisticaEstudiante", "EstadisticaSemestre",
+    "FranjaHorario", "OcupacionEstudiante", "ListaEspera", "Cambio", "CambioPendiente",
+    "EstudianteArchivo", "CursoArchivo", "MatriculaArchivo",
+]
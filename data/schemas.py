@@ -1,5 +1,8 @@
-from typing import Optional, List
-from pydantic import BaseModel, EmailStr, Field
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, EmailStr, Field, field_validator
+
+from utils import horario as horarios
 
 # ESTUDIANTE
 class EstudianteBase(BaseModel):
@@ -25,21 +28,133 @@ class CursoBase(BaseModel):
     codigo: str = Field(min_length=2, max_length=15)
     nombre: str = Field(min_length=1, max_length=100)
     creditos: int = Field(ge=1, le=10)
-    horario: Optional[str] = Field(default="", max_length=50)
+    horario: Optional[str] = Field(default="", max_length=50, description="Ej: 'Lu 08-10', 'Lu/Mi 08:30-10:00; Vi 14-16'")
+    cupo: Optional[int] = Field(default=None, ge=1, description="Plazas; vacío = sin límite")
 
 class CursoCreate(CursoBase):
-    pass
+    @field_validator("horario")
+    @classmethod
+    def horario_valido(cls, v):
+        return horarios.validar(v) if v else v
 
 class CursoUpdate(BaseModel):
     codigo: Optional[str] = Field(default=None, min_length=2, max_length=15)
     nombre: Optional[str] = Field(default=None, min_length=1, max_length=100)
     creditos: Optional[int] = Field(default=None, ge=1, le=10)
     horario: Optional[str] = Field(default=None, max_length=50)
+    cupo: Optional[int] = Field(default=None, ge=1, description="null quita el límite")
+
+    @field_validator("horario")
+    @classmethod
+    def horario_valido(cls, v):
+        return horarios.validar(v) if v else v
 
 class CursoRead(CursoBase):
     id: int
 
+# EXPANSIÓN (?expand=cursos / ?expand=estudiantes)
+class EstudianteExpandido(EstudianteRead):
+    cursos: Optional[List[CursoRead]] = None
+
+class CursoExpandido(CursoRead):
+    estudiantes: Optional[List[EstudianteRead]] = None
+
+# BORRADO / RESTAURACIÓN MASIVOS (al menos un filtro; se combinan con AND)
+class EstudianteFiltro(BaseModel):
+    ids: Optional[List[int]] = Field(default=None, min_length=1)
+    semestre: Optional[int] = Field(default=None, ge=1, le=10)
+    nombre: Optional[str] = Field(default=None, min_length=1, description="Contiene (sin distinguir mayúsculas)")
+
+class CursoFiltro(BaseModel):
+    ids: Optional[List[int]] = Field(default=None, min_length=1)
+    codigo: Optional[str] = Field(default=None, min_length=2, max_length=15)
+    nombre: Optional[str] = Field(default=None, min_length=1, description="Contiene (sin distinguir mayúsculas)")
+    creditos: Optional[int] = Field(default=None, ge=1, le=10)
+
+class CambioMasivoRead(BaseModel):
+    afectados: int
+    desarchivados: Optional[int] = Field(default=None, description="Restauración: filas traídas del archivo")
+    conflictos: Optional[List[int]] = Field(default=None, description="Archivadas cuya cédula/código ya está en uso")
+
 # MATRÍCULA
 class MatriculaIn(BaseModel):
     estudiante_id: int
     curso_id: int
+
+class MatriculaResultado(MatriculaIn):
+    estado: str = Field(description="creada, duplicada, *_no_encontrado, conflicto_horario, sin_cupo, "
+                                    "creditos_excedidos o lista_espera")
+    conflicto_horario: Optional[bool] = Field(default=None, description="Solo en las filas cuyo horario se comprobó")
+    posicion: Optional[int] = Field(default=None, description="Lugar en la lista de espera")
+
+class MatriculaLoteRead(BaseModel):
+    total: int
+    creadas: int
+    rechazadas: int
+    resultados: List[MatriculaResultado]
+
+# CUPO Y LISTA DE ESPERA
+class CupoRead(BaseModel):
+    curso_id: int
+    cupo: Optional[int] = Field(description="null = sin límite")
+    inscritos: int
+    libres: Optional[int] = None
+    en_espera: int
+
+class EsperaRead(BaseModel):
+    estudiante_id: int
+    posicion: int
+    creado_en: datetime
+
+# LOTE DE OPERACIONES (POST /batch)
+class OperacionLote(BaseModel):
+    op: Literal[
+        "crear_estudiante", "actualizar_estudiante", "eliminar_estudiante", "restaurar_estudiante",
+        "crear_curso", "actualizar_curso", "eliminar_curso", "restaurar_curso",
+        "matricular", "desmatricular",
+    ]
+    id: Optional[Union[int, str]] = Field(default=None, description="Estudiante o curso; '$N' = id creado por la operación N")
+    estudiante_id: Optional[Union[int, str]] = None
+    curso_id: Optional[Union[int, str]] = None
+    datos: Optional[Dict[str, Any]] = Field(default=None, description="Cuerpo de crear_* / actualizar_*")
+    version: Optional[int] = Field(default=None, description="Como If-Match en actualizar_*: 412 si la versión cambió")
+    conflictos: str = Field(default="marcar", pattern="^(rechazar|marcar|ignorar)$")
+
+class ResultadoOperacion(BaseModel):
+    indice: int
+    op: str
+    status: int
+    resultado: Optional[Any] = None
+    error: Optional[Any] = None
+    revertida: Optional[bool] = Field(default=None, description="Modo atomico: se ejecutó pero el lote se deshizo")
+
+class LoteRead(BaseModel):
+    modo: str
+    confirmado: bool
+    ok: int
+    fallidas: int
+    resultados: List[ResultadoOperacion]
+
+# HORARIO
+class VerificacionCurso(BaseModel):
+    curso_id: int
+    conflictos_con: List[int]
+
+class VerificacionHorarioRead(BaseModel):
+    estudiante_id: int
+    compatible: bool
+    resultados: List[VerificacionCurso]
+
+# CAMBIOS (feed)
+class CambioRead(BaseModel):
+    id: int
+    entidad: str
+    operacion: str
+    entidad_id: int
+    relacionado_id: Optional[int] = None
+    creado_en: datetime
+
+class CambiosRead(BaseModel):
+    cambios: List[CambioRead]
+    ultimo: int = Field(description="Offset para la siguiente consulta (?since=)")
+    hay_mas: bool
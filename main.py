@@ -1,38 +1,65 @@
+import asyncio
+import io
+import os
 from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlmodel import SQLModel, Session, create_engine
+from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from sqlalchemy.orm import configure_mappers
+from sqlmodel import Session
 
 # MODELOS y SCHEMAS (Pydantic)
 from data.models import Estudiante, Curso
 from data.schemas import (
     EstudianteCreate, EstudianteUpdate, EstudianteRead,
     CursoCreate, CursoUpdate, CursoRead,
+    EstudianteExpandido, CursoExpandido,
+    EstudianteFiltro, CursoFiltro, CambioMasivoRead,
+    MatriculaIn, MatriculaResultado, MatriculaLoteRead, VerificacionHorarioRead, CambiosRead,
+    CupoRead, EsperaRead, OperacionLote, LoteRead,
 )
 
 # OPERACIONES
 from operations.operations_db import (
     # ESTUDIANTES
-    crear_estudiante, listar_estudiantes, listar_estudiantes_eliminados, restaurar_estudiante,
+    crear_estudiante, listar_estudiantes, listar_estudiantes_filas, listar_estudiantes_eliminados, restaurar_estudiante,
     buscar_estudiante_por_nombre, obtener_estudiante, actualizar_estudiante, eliminar_estudiante,
+    cambiar_estado_estudiantes,
 
     # CURSOS
-    crear_curso, listar_cursos, listar_cursos_eliminados, restaurar_curso,
+    crear_curso_leido, listar_cursos, listar_cursos_filas, listar_cursos_eliminados, restaurar_curso,
     buscar_curso_por_nombre, obtener_curso, actualizar_curso, eliminar_curso,
+    cambiar_estado_cursos,
 
     # MATRÍCULAS
-    matricular, desmatricular, cursos_de_estudiante, estudiantes_de_curso
-)
+    matricular, matricular_lote, desmatricular, cursos_de_estudiante, estudiantes_de_curso,
 
-# CONFIGURACIÓN BASE DE DATOS
-DATABASE_URL = "sqlite:///database_universidad.db"
-engine = create_engine(DATABASE_URL, echo=False)
+    # PAGINACIÓN Y PROYECCIÓN (fields=)
+    siguiente_cursor, parsear_campos, a_dicts, filas_cursos_de_estudiante, filas_estudiantes_de_curso,
 
-def crear_db():
-    SQLModel.metadata.create_all(engine)
+    # EXPANSIÓN Y LOTES
+    expandir, parsear_ids, obtener_lote,
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+    # LECTURAS CACHEADAS
+    obtener_estudiante_cacheado, obtener_curso_cacheado,
+    cursos_de_estudiante_cacheado, estudiantes_de_curso_cacheado,
+
+    # VERSIONES (ETag)
+    version_recurso,
+)
+from utils.cache import cache
+from utils import condicional
+from utils.condicional import etiqueta
+from utils import metricas
+from utils import respuestas
+from operations.busqueda import buscar
+from operations import analitica, cambios, cupos, estadisticas, horarios, lotes
+from operations.archivo import archivador, gauges as gauges_archivo
+
+# CONFIGURACIÓN BASE DE DATOS (primario: utils/db.py; réplicas de lectura: utils/replicas.py)
+from utils.db import engine, async_engine, get_session, get_async_session, estadisticas_pool, DB_MODO
+from utils import replicas
+from utils.replicas import enrutador, engine_lectura, get_read_session, get_async_read_session
+from utils import migraciones
 
 # FASTAPI
 app = FastAPI(
@@ -41,9 +68,63 @@ app = FastAPI(
     version="1.0.0",
 )
 
+app.add_middleware(replicas.LecturaPrimarioMiddleware)
+app.add_middleware(metricas.MetricasMiddleware)
+
+def _gauges_pool():
+    engines = [("sync", engine)] + ([("async", async_engine.sync_engine)] if async_engine is not None else [])
+    engines += [(r.nombre, r.engine) for r in enrutador.replicas]
+    datos = {}
+    for nombre, eng in engines:
+        stats = estadisticas_pool(eng)
+        for clave in ("size", "checked_out", "timeouts"):
+            if clave in stats:
+                datos[(("engine", nombre), ("estado", clave))] = stats[clave]
+    return datos
+
+def _gauges_cache():
+    stats = cache.stats()
+    return {(("tipo", k),): v for k, v in stats.items() if k in ("hits", "misses", "evictions", "descartadas", "items")}
+
+metricas.registrar_gauge("db_pool", "Estado del pool de conexiones", _gauges_pool)
+metricas.registrar_gauge("cache_operaciones", "Contadores de la caché de lectura", _gauges_cache)
+metricas.registrar_gauge("cambios_feed", "Difusor del feed de cambios de este proceso", cambios.gauges)
+metricas.registrar_gauge("archivo_filas", "Filas movidas al archivo por la tarea de este proceso", gauges_archivo)
+metricas.registrar_gauge("analitica_matriz", "Matriz de co-matrícula de este proceso", analitica.gauges)
+metricas.registrar_gauge("replicas_lectura", "Salud, atraso y lecturas de cada réplica", replicas.gauges)
+metricas.registrar_gauge("cola_matriculas", "Solicitudes y micro-lotes de la cola de matrícula de este proceso", cupos.gauges)
+
+# ARRANQUE
+
+# Opcional: adelanta al arranque lo que si no pagaría la primera petición de cada worker (configurar los
+# mappers del ORM, compilar el listado de estudiantes y la inicialización perezosa de email_validator).
+# Conviene cuando el worker arranca antes de recibir tráfico; en frío puro solo mueve el coste.
+CALENTAR_AL_ARRANCAR = os.getenv("CALENTAR_AL_ARRANCAR", "false").lower() in ("1", "true", "yes", "si")
+
+def _calentar():
+    configure_mappers()
+    with Session(engine) as session:
+        for est in listar_estudiantes(session, 0, 1):
+            EstudianteRead.model_validate(est, from_attributes=True)
+
 @app.on_event("startup")
 def on_startup():
-    crear_db()
+    # Solo comprueba la versión del esquema (una consulta); las migraciones se aplican con
+    # `python -m utils.migraciones migrate` antes de arrancar (o aquí mismo con MIGRAR_AL_ARRANCAR=true,
+    # solo en desarrollo con un proceso)
+    migraciones.verificar(engine)
+    if CALENTAR_AL_ARRANCAR:
+        _calentar()
+    archivador.iniciar(engine)   # solo con ARCHIVO_INTERVALO_S > 0
+    enrutador.iniciar()          # solo con DATABASE_REPLICA_URLS
+    cupos.cola.iniciar(engine)   # cola de POST /matriculas/cola y promoción de la lista de espera
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await cambios.difusor.detener()
+    await archivador.detener()
+    await enrutador.detener()
+    await cupos.cola.detener()
 
 # ROOT / HEALTH
 @app.get("/", tags=["Root"])
@@ -51,13 +132,30 @@ def root():
     return {
         "message": "Bienvenido al Sistema de Gestión Universitaria",
         "docs": "/docs",
-        "endpoints": ["/estudiantes", "/cursos", "/matriculas"],
+        "endpoints": ["/estudiantes", "/cursos", "/matriculas", "/stats"],
     }
 
 @app.get("/health", tags=["Root"])
 def health():
     return {"status": "ok"}
 
+@app.get("/health/db", tags=["Root"])
+def health_db():
+    datos = {"sync": estadisticas_pool(engine)}
+    if async_engine is not None:
+        datos["async"] = estadisticas_pool(async_engine.sync_engine)
+    if enrutador.replicas:
+        datos["replicas"] = enrutador.estado()
+    return datos
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Root"])
+def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/cache/stats", tags=["Root"])
+def estadisticas_cache():
+    return cache.stats()
+
 # ESTUDIANTES
 
 @app.post("/estudiantes/", response_model=EstudianteRead, status_code=201, tags=["Estudiantes"])
@@ -68,38 +166,119 @@ def crear_nuevo_estudiante(obj: EstudianteCreate, session: Session = Depends(get
     return est
 
 
-@app.get("/estudiantes/", response_model=List[EstudianteRead], tags=["Estudiantes"])
+@app.get("/estudiantes/", response_model=List[EstudianteExpandido], response_model_exclude_none=True, tags=["Estudiantes"])
 def listar_todos_los_estudiantes(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = Query(10, le=100),
     include_deleted: bool = Query(False, description="Incluir eliminados lógicamente"),
     semestre: Optional[int] = Query(None, ge=1, le=10),
     nombre: Optional[str] = None,
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor; tiene prioridad sobre skip"),
+    order_by: str = Query("id", pattern="^(id|nombre|cedula|semestre)$"),
+    expand: Optional[str] = Query(None, pattern="^cursos$", description="Incluye los cursos de cada estudiante"),
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+    session: Session = Depends(get_read_session)
+):
+    if not expand:
+        # Camino rápido: solo las columnas pedidas, sin objetos del ORM ni revalidación del response_model
+        campos = parsear_campos(Estudiante, fields)
+        filas = listar_estudiantes_filas(session, campos, skip, limit, include_deleted, semestre, nombre, cursor, order_by)
+        siguiente = siguiente_cursor(filas, limit, order_by)
+        if siguiente:
+            response.headers["X-Next-Cursor"] = siguiente
+        return respuestas.json_rapido(request, response, a_dicts(filas, campos, sin_nulos=True))
+    if fields:
+        raise HTTPException(status_code=400, detail="fields no se puede combinar con expand")
+    items = listar_estudiantes(session, skip, limit, include_deleted, semestre, nombre, cursor, order_by, expand)
+    siguiente = siguiente_cursor(items, limit, order_by)
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    return expandir(items, expand)
+
+@app.post("/estudiantes/import", tags=["Estudiantes"])
+def importar_estudiantes(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    modo: str = Query("skip", pattern="^(skip|upsert)$"),
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    session: Session = Depends(get_session),
 ):
-    return listar_estudiantes(session, skip, limit, include_deleted, semestre, nombre)
+    from operations.importacion import importar, formato_desde_nombre  # solo lo usan los endpoints de importación
+    lineas = io.TextIOWrapper(archivo.file, encoding="utf-8", newline="")
+    return importar(session, "estudiantes", lineas, formato or formato_desde_nombre(archivo.filename), modo, chunk_size)
 
 @app.get("/estudiantes/deleted", response_model=List[EstudianteRead], tags=["Estudiantes"])
-def listar_estudiantes_borrados(session: Session = Depends(get_session)):
+def listar_estudiantes_borrados(session: Session = Depends(get_read_session)):
     return listar_estudiantes_eliminados(session)
 
+@app.get("/estudiantes/batch", response_model=List[EstudianteExpandido], response_model_exclude_none=True, tags=["Estudiantes"])
+def obtener_estudiantes_lote(
+    response: Response,
+    ids: str = Query(..., description="Ids separados por comas, p. ej. 1,2,3"),
+    expand: Optional[str] = Query(None, pattern="^cursos$"),
+    session: Session = Depends(get_read_session),
+):
+    items, faltantes = obtener_lote(session, Estudiante, parsear_ids(ids), expand)
+    if faltantes:
+        response.headers["X-Ids-No-Encontrados"] = ",".join(map(str, faltantes))
+    return expandir(items, expand)
+
 @app.post("/estudiantes/{estudiante_id}/restore", tags=["Estudiantes"])
 def restaurar_estudiante_por_id(estudiante_id: int, session: Session = Depends(get_session)):
     if restaurar_estudiante(session, estudiante_id):
         return {"message": "Estudiante restaurado correctamente (200)"}
     raise HTTPException(status_code=404, detail="Estudiante no encontrado para restaurar")
 
+# Por filtro (un UPDATE para todo el conjunto); bulk-restore también trae las filas archivadas
+@app.post("/estudiantes/bulk-delete", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Estudiantes"])
+def eliminar_estudiantes_por_filtro(filtro: EstudianteFiltro, session: Session = Depends(get_session)):
+    return cambiar_estado_estudiantes(session, True, filtro.model_dump())
+
+@app.post("/estudiantes/bulk-restore", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Estudiantes"])
+def restaurar_estudiantes_por_filtro(filtro: EstudianteFiltro, session: Session = Depends(get_session)):
+    return cambiar_estado_estudiantes(session, False, filtro.model_dump())
+
 @app.get("/estudiantes/search/", response_model=List[EstudianteRead], tags=["Estudiantes"])
-def buscar_estudiante(nombre: str = Query(..., min_length=1), session: Session = Depends(get_session)):
+def buscar_estudiante(nombre: str = Query(..., min_length=1), session: Session = Depends(get_read_session)):
     return buscar_estudiante_por_nombre(session, nombre)
 
-@app.get("/estudiantes/{estudiante_id}", response_model=EstudianteRead, tags=["Estudiantes"])
-def obtener_estudiante_por_id(estudiante_id: int, session: Session = Depends(get_session)):
-    return obtener_estudiante(session, estudiante_id)
+@app.get("/estudiantes/{estudiante_id}", response_model=EstudianteExpandido, response_model_exclude_none=True, tags=["Estudiantes"])
+def obtener_estudiante_por_id(
+    estudiante_id: int,
+    request: Request,
+    response: Response,
+    expand: Optional[str] = Query(None, pattern="^cursos$"),
+    session: Session = Depends(get_read_session),
+):
+    # If-None-Match vigente: 304 con una consulta de versión, sin tocar caché ni relaciones
+    token, modificado = version_recurso(session, Estudiante, estudiante_id, relacionados=bool(expand))
+    no_modificado = condicional.responder(request, response, etiqueta("estudiante", estudiante_id, token), modificado)
+    if no_modificado:
+        return no_modificado
+    est = obtener_estudiante_cacheado(session, estudiante_id)
+    if expand:
+        return {**est, "cursos": cursos_de_estudiante_cacheado(session, estudiante_id)}
+    return est
 
 @app.patch("/estudiantes/{estudiante_id}", response_model=EstudianteRead, tags=["Estudiantes"])
-def actualizar_datos_estudiante(estudiante_id: int, obj: EstudianteUpdate, session: Session = Depends(get_session)):
-    return actualizar_estudiante(session, estudiante_id, obj)
+def actualizar_datos_estudiante(
+    estudiante_id: int,
+    obj: EstudianteUpdate,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_session),
+):
+    # If-Match: 412 si el ETag no es el actual; el UPDATE se condiciona a la versión leída
+    version_esperada = None
+    if condicional.trae_if_match(request):
+        token, _ = version_recurso(session, Estudiante, estudiante_id)
+        condicional.exigir_if_match(request, etiqueta("estudiante", estudiante_id, token))
+        version_esperada = int(token)
+    est = actualizar_estudiante(session, estudiante_id, obj, version_esperada)
+    response.headers.update(condicional.cabeceras(etiqueta("estudiante", estudiante_id, est.version), est.actualizado_en))
+    return est
 
 @app.delete("/estudiantes/{estudiante_id}", tags=["Estudiantes"])
 def eliminar_estudiante_por_id(estudiante_id: int, session: Session = Depends(get_session)):
@@ -111,43 +290,120 @@ def eliminar_estudiante_por_id(estudiante_id: int, session: Session = Depends(ge
 
 @app.post("/cursos/", response_model=CursoRead, status_code=201, tags=["Cursos"])
 def crear_nuevo_curso(obj: CursoCreate, session: Session = Depends(get_session)):
-    crear_curso(session, obj)
-    cursos = buscar_curso_por_nombre(session, obj.nombre)
-    return cursos[-1] if cursos else {"message": "Curso creado (201)"}
+    return crear_curso_leido(session, obj)
 
-@app.get("/cursos/", response_model=List[CursoRead], tags=["Cursos"])
+@app.get("/cursos/", response_model=List[CursoExpandido], response_model_exclude_none=True, tags=["Cursos"])
 def listar_todos_los_cursos(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = Query(10, le=100),
     include_deleted: bool = Query(False, description="Incluir eliminados lógicamente"),
     creditos: Optional[int] = None,
     codigo: Optional[str] = None,
     nombre: Optional[str] = None,
-    session: Session = Depends(get_session)
+    cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor; tiene prioridad sobre skip"),
+    order_by: str = Query("id", pattern="^(id|codigo|nombre|creditos)$"),
+    expand: Optional[str] = Query(None, pattern="^estudiantes$", description="Incluye los estudiantes de cada curso"),
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+    session: Session = Depends(get_read_session)
+):
+    if not expand:
+        campos = parsear_campos(Curso, fields)
+        filas = listar_cursos_filas(session, campos, skip, limit, include_deleted, creditos, codigo, nombre, cursor, order_by)
+        siguiente = siguiente_cursor(filas, limit, order_by)
+        if siguiente:
+            response.headers["X-Next-Cursor"] = siguiente
+        return respuestas.json_rapido(request, response, a_dicts(filas, campos, sin_nulos=True))
+    if fields:
+        raise HTTPException(status_code=400, detail="fields no se puede combinar con expand")
+    items = listar_cursos(session, skip, limit, include_deleted, creditos, codigo, nombre, cursor, order_by, expand)
+    siguiente = siguiente_cursor(items, limit, order_by)
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    return expandir(items, expand)
+
+@app.post("/cursos/import", tags=["Cursos"])
+def importar_cursos(
+    archivo: UploadFile = File(...),
+    formato: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    modo: str = Query("skip", pattern="^(skip|upsert)$"),
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    session: Session = Depends(get_session),
 ):
-    return listar_cursos(session, skip, limit, include_deleted, creditos, codigo, nombre)
+    from operations.importacion import importar, formato_desde_nombre  # solo lo usan los endpoints de importación
+    lineas = io.TextIOWrapper(archivo.file, encoding="utf-8", newline="")
+    return importar(session, "cursos", lineas, formato or formato_desde_nombre(archivo.filename), modo, chunk_size)
 
 @app.get("/cursos/deleted", response_model=List[CursoRead], tags=["Cursos"])
-def listar_cursos_borrados(session: Session = Depends(get_session)):
+def listar_cursos_borrados(session: Session = Depends(get_read_session)):
     return listar_cursos_eliminados(session)
 
+@app.get("/cursos/batch", response_model=List[CursoExpandido], response_model_exclude_none=True, tags=["Cursos"])
+def obtener_cursos_lote(
+    response: Response,
+    ids: str = Query(..., description="Ids separados por comas, p. ej. 1,2,3"),
+    expand: Optional[str] = Query(None, pattern="^estudiantes$"),
+    session: Session = Depends(get_read_session),
+):
+    items, faltantes = obtener_lote(session, Curso, parsear_ids(ids), expand)
+    if faltantes:
+        response.headers["X-Ids-No-Encontrados"] = ",".join(map(str, faltantes))
+    return expandir(items, expand)
+
 @app.post("/cursos/{curso_id}/restore", tags=["Cursos"])
 def restaurar_curso_por_id(curso_id: int, session: Session = Depends(get_session)):
     if restaurar_curso(session, curso_id):
         return {"message": "Curso restaurado correctamente (200)"}
     raise HTTPException(status_code=404, detail="Curso no encontrado para restaurar")
 
+@app.post("/cursos/bulk-delete", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Cursos"])
+def eliminar_cursos_por_filtro(filtro: CursoFiltro, session: Session = Depends(get_session)):
+    return cambiar_estado_cursos(session, True, filtro.model_dump())
+
+@app.post("/cursos/bulk-restore", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Cursos"])
+def restaurar_cursos_por_filtro(filtro: CursoFiltro, session: Session = Depends(get_session)):
+    return cambiar_estado_cursos(session, False, filtro.model_dump())
+
 @app.get("/cursos/search/", response_model=List[CursoRead], tags=["Cursos"])
-def buscar_curso(nombre: str = Query(..., min_length=1), session: Session = Depends(get_session)):
+def buscar_curso(nombre: str = Query(..., min_length=1), session: Session = Depends(get_read_session)):
     return buscar_curso_por_nombre(session, nombre)
 
-@app.get("/cursos/{curso_id}", response_model=CursoRead, tags=["Cursos"])
-def obtener_curso_por_id(curso_id: int, session: Session = Depends(get_session)):
-    return obtener_curso(session, curso_id)
+@app.get("/cursos/{curso_id}", response_model=CursoExpandido, response_model_exclude_none=True, tags=["Cursos"])
+def obtener_curso_por_id(
+    curso_id: int,
+    request: Request,
+    response: Response,
+    expand: Optional[str] = Query(None, pattern="^estudiantes$"),
+    session: Session = Depends(get_read_session),
+):
+    # If-None-Match vigente: 304 con una consulta de versión, sin tocar caché ni relaciones
+    token, modificado = version_recurso(session, Curso, curso_id, relacionados=bool(expand))
+    no_modificado = condicional.responder(request, response, etiqueta("curso", curso_id, token), modificado)
+    if no_modificado:
+        return no_modificado
+    cur = obtener_curso_cacheado(session, curso_id)
+    if expand:
+        return {**cur, "estudiantes": estudiantes_de_curso_cacheado(session, curso_id)}
+    return cur
 
 @app.patch("/cursos/{curso_id}", response_model=CursoRead, tags=["Cursos"])
-def actualizar_datos_curso(curso_id: int, obj: CursoUpdate, session: Session = Depends(get_session)):
-    return actualizar_curso(session, curso_id, obj)
+def actualizar_datos_curso(
+    curso_id: int,
+    obj: CursoUpdate,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_session),
+):
+    # If-Match: 412 si el ETag no es el actual; el UPDATE se condiciona a la versión leída
+    version_esperada = None
+    if condicional.trae_if_match(request):
+        token, _ = version_recurso(session, Curso, curso_id)
+        condicional.exigir_if_match(request, etiqueta("curso", curso_id, token))
+        version_esperada = int(token)
+    cur = actualizar_curso(session, curso_id, obj, version_esperada)
+    response.headers.update(condicional.cabeceras(etiqueta("curso", curso_id, cur.version), cur.actualizado_en))
+    return cur
 
 @app.delete("/cursos/{curso_id}", tags=["Cursos"])
 def eliminar_curso_por_id(curso_id: int, session: Session = Depends(get_session)):
@@ -155,20 +411,324 @@ def eliminar_curso_por_id(curso_id: int, session: Session = Depends(get_session)
         return {"message": "Curso eliminado lógicamente (200)"}
     raise HTTPException(status_code=404, detail="Curso no encontrado")
 
+# BÚSQUEDA (índice FTS5 en SQLite, pg_trgm en PostgreSQL)
+
+@app.get("/busqueda/estudiantes", response_model=List[EstudianteRead], tags=["Búsqueda"])
+def buscar_estudiantes_indexado(
+    q: str = Query(..., min_length=1, description="Prefijos sobre nombre o email, sin distinguir acentos"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    session: Session = Depends(get_read_session),
+):
+    return buscar(session, "estudiantes", q, limit, skip)
+
+@app.get("/busqueda/cursos", response_model=List[CursoRead], tags=["Búsqueda"])
+def buscar_cursos_indexado(
+    q: str = Query(..., min_length=1, description="Prefijos sobre código o nombre, sin distinguir acentos"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, le=100),
+    session: Session = Depends(get_read_session),
+):
+    return buscar(session, "cursos", q, limit, skip)
+
+# EXPORTACIÓN (streaming CSV / NDJSON, opcionalmente gzip)
+
+def _respuesta_exportacion(request: Request, tipo: str, formato: str, comprimir: bool, filtros: dict) -> StreamingResponse:
+    from operations.exportacion import exportar, FORMATOS as FORMATOS_EXPORTACION  # import perezoso: uso ocasional
+    headers = {"Content-Disposition": f'attachment; filename="{tipo}.{formato}"'}
+    if comprimir:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        exportar(engine_lectura(request), tipo, formato, comprimir, filtros),
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers=headers,
+    )
+
+@app.get("/export/estudiantes", tags=["Exportación"])
+def exportar_estudiantes(
+    request: Request,
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    include_deleted: bool = False,
+    semestre: Optional[int] = Query(None, ge=1, le=10),
+    nombre: Optional[str] = None,
+):
+    filtros = {"include_deleted": include_deleted, "semestre": semestre, "nombre": nombre}
+    return _respuesta_exportacion(request, "estudiantes", formato, gzip, filtros)
+
+@app.get("/export/cursos", tags=["Exportación"])
+def exportar_cursos(
+    request: Request,
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    include_deleted: bool = False,
+    creditos: Optional[int] = None,
+    codigo: Optional[str] = None,
+    nombre: Optional[str] = None,
+):
+    filtros = {"include_deleted": include_deleted, "creditos": creditos, "codigo": codigo, "nombre": nombre}
+    return _respuesta_exportacion(request, "cursos", formato, gzip, filtros)
+
+@app.get("/export/matriculas", tags=["Exportación"])
+def exportar_matriculas(
+    request: Request,
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    modo: str = Query("roster", pattern="^(roster|ids)$", description="roster une estudiante y curso; ids solo los pares"),
+    curso_id: Optional[int] = None,
+    estudiante_id: Optional[int] = None,
+):
+    filtros = {"modo": modo, "curso_id": curso_id, "estudiante_id": estudiante_id}
+    return _respuesta_exportacion(request, "matriculas", formato, gzip, filtros)
+
 # MATRÍCULAS (N:M)
 
 @app.post("/matriculas/", tags=["Matrículas"], status_code=201)
-def crear_matricula(estudiante_id: int, curso_id: int, session: Session = Depends(get_session)):
-    return matricular(session, estudiante_id, curso_id)
+def crear_matricula(
+    estudiante_id: int,
+    curso_id: int,
+    conflictos: str = Query("marcar", pattern="^(rechazar|marcar|ignorar)$", description="Choques de horario"),
+    session: Session = Depends(get_session),
+):
+    return matricular(session, estudiante_id, curso_id, conflictos)
+
+@app.post("/matriculas/bulk", response_model=MatriculaLoteRead, response_model_exclude_none=True, tags=["Matrículas"])
+def crear_matriculas_lote(
+    pares: List[MatriculaIn],
+    chunk_size: int = Query(500, ge=1, le=5000),
+    conflictos: str = Query("marcar", pattern="^(rechazar|marcar|ignorar)$", description="Choques de horario"),
+    lista_espera: bool = Query(False, description="Sin cupo: a la lista de espera del curso"),
+    session: Session = Depends(get_session),
+):
+    pares = [(p.estudiante_id, p.curso_id) for p in pares]
+    return matricular_lote(session, pares, chunk_size, conflictos, lista_espera=lista_espera)
+
+@app.post("/matriculas/cola", response_model=MatriculaResultado, response_model_exclude_none=True, tags=["Matrículas"])
+async def encolar_matricula(
+    estudiante_id: int,
+    curso_id: int,
+    response: Response,
+    conflictos: str = Query("marcar", pattern="^(rechazar|marcar|ignorar)$", description="Choques de horario"),
+):
+    # Se agrupa con las solicitudes de los próximos COLA_ESPERA_MS: 201 matriculado, 202 en lista de espera
+    resultado = await cupos.cola.solicitar(engine, estudiante_id, curso_id, conflictos)
+    response.status_code = cupos.ESTADOS_HTTP[resultado["estado"]]
+    return resultado
 
 @app.delete("/matriculas/", tags=["Matrículas"])
 def eliminar_matricula(estudiante_id: int, curso_id: int, session: Session = Depends(get_session)):
     return desmatricular(session, estudiante_id, curso_id)
 
+@app.delete("/matriculas/espera", tags=["Matrículas"])
+def salir_lista_espera(estudiante_id: int, curso_id: int, session: Session = Depends(get_session)):
+    return cupos.salir_de_espera(session, estudiante_id, curso_id)
+
+@app.get("/cursos/{curso_id}/cupo", response_model=CupoRead, tags=["Matrículas"])
+def obtener_cupo_curso(curso_id: int, session: Session = Depends(get_read_session)):
+    return cupos.estado_cupo(session, curso_id)
+
+@app.get("/cursos/{curso_id}/lista-espera", response_model=List[EsperaRead], tags=["Matrículas"])
+def obtener_lista_espera(
+    curso_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    session: Session = Depends(get_read_session),
+):
+    return cupos.lista_de_espera(session, curso_id, skip, limit)
+
 @app.get("/estudiantes/{estudiante_id}/cursos", response_model=List[CursoRead], tags=["Matrículas"])
-def obtener_cursos_estudiante(estudiante_id: int, session: Session = Depends(get_session)):
-    return cursos_de_estudiante(session, estudiante_id)
+def obtener_cursos_estudiante(
+    estudiante_id: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+    session: Session = Depends(get_read_session),
+):
+    campos = parsear_campos(Curso, fields)
+    token, modificado = version_recurso(session, Estudiante, estudiante_id, relacionados=True)
+    etag = etiqueta("estudiante", estudiante_id, "cursos", token, "+".join(campos) if fields else None)
+    no_modificado = condicional.responder(request, response, etag, modificado)
+    if no_modificado:
+        return no_modificado
+    if fields:
+        filas = filas_cursos_de_estudiante(session, estudiante_id, campos)
+    else:
+        filas = cursos_de_estudiante_cacheado(session, estudiante_id)
+    return respuestas.json_rapido(request, response, filas)
 
 @app.get("/cursos/{curso_id}/estudiantes", response_model=List[EstudianteRead], tags=["Matrículas"])
-def obtener_estudiantes_curso(curso_id: int, session: Session = Depends(get_session)):
-    return estudiantes_de_curso(session, curso_id)
+def obtener_estudiantes_curso(
+    curso_id: int,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+    session: Session = Depends(get_read_session),
+):
+    campos = parsear_campos(Estudiante, fields)
+    token, modificado = version_recurso(session, Curso, curso_id, relacionados=True)
+    etag = etiqueta("curso", curso_id, "estudiantes", token, "+".join(campos) if fields else None)
+    no_modificado = condicional.responder(request, response, etag, modificado)
+    if no_modificado:
+        return no_modificado
+    if fields:
+        filas = filas_estudiantes_de_curso(session, curso_id, campos)
+    else:
+        filas = estudiantes_de_curso_cacheado(session, curso_id)
+    return respuestas.json_rapido(request, response, filas)
+
+# LOTE DE OPERACIONES (una sesión y una transacción; en modo continuar, un SAVEPOINT por operación)
+
+@app.post("/batch", response_model=LoteRead, response_model_exclude_none=True, tags=["Lotes"])
+def ejecutar_lote_operaciones(
+    operaciones: List[OperacionLote],
+    response: Response,
+    modo: str = Query("atomico", pattern="^(atomico|continuar)$", description="atomico: todo o nada"),
+    session: Session = Depends(get_session),
+):
+    cuerpo = lotes.ejecutar_lote(session, operaciones, modo)
+    response.status_code = cuerpo.pop("status")
+    return cuerpo
+
+# HORARIOS
+
+@app.get("/estudiantes/{estudiante_id}/horario", tags=["Horarios"])
+def obtener_horario_estudiante(estudiante_id: int, session: Session = Depends(get_read_session)):
+    return horarios.horario_estudiante(session, estudiante_id)
+
+@app.post("/estudiantes/{estudiante_id}/horario/verificar", response_model=VerificacionHorarioRead, tags=["Horarios"])
+def verificar_horario(estudiante_id: int, curso_ids: List[int], session: Session = Depends(get_session)):
+    return horarios.verificar(session, estudiante_id, curso_ids)
+
+# ESTADÍSTICAS (contadores mantenidos en cada escritura)
+
+@app.get("/stats/cursos", tags=["Estadísticas"])
+def estadisticas_cursos_top(limit: int = Query(10, ge=1, le=100), session: Session = Depends(get_read_session)):
+    return estadisticas.cursos_mas_inscritos(session, limit)
+
+@app.get("/stats/cursos/{curso_id}", tags=["Estadísticas"])
+def estadisticas_curso(curso_id: int, session: Session = Depends(get_read_session)):
+    return estadisticas.estadistica_curso(session, curso_id)
+
+@app.get("/stats/estudiantes/{estudiante_id}", tags=["Estadísticas"])
+def estadisticas_estudiante(estudiante_id: int, session: Session = Depends(get_read_session)):
+    return estadisticas.estadistica_estudiante(session, estudiante_id)
+
+@app.get("/stats/semestres", tags=["Estadísticas"])
+def estadisticas_semestres(session: Session = Depends(get_read_session)):
+    return estadisticas.distribucion_semestres(session)
+
+@app.get("/stats/desglose", tags=["Estadísticas"])
+def estadisticas_desglose(
+    por: str = Query(..., pattern="^(semestre|creditos|curso)$", description="GROUP BY sobre las tablas base"),
+    session: Session = Depends(get_read_session),
+):
+    return estadisticas.desglose(session, por)
+
+@app.post("/stats/reconciliar", tags=["Estadísticas"])
+def estadisticas_reconciliar(session: Session = Depends(get_session)):
+    return estadisticas.reconciliar(session)
+
+# ANALÍTICA (co-matrícula sobre una matriz dispersa estudiantes x cursos, refrescada desde el feed de cambios)
+
+@app.get("/analytics/estado", tags=["Analítica"])
+def analitica_estado(session: Session = Depends(get_read_session)):
+    return analitica.estado(session)
+
+@app.get("/analytics/estudiantes/{estudiante_id}/companeros", tags=["Analítica"])
+def analitica_companeros(
+    estudiante_id: int,
+    k: int = Query(10, ge=1, le=100),
+    min_compartidos: int = Query(1, ge=1, description="Cursos en común mínimos para entrar en el top"),
+    session: Session = Depends(get_read_session),
+):
+    return analitica.companeros(session, estudiante_id, k, min_compartidos)
+
+@app.get("/analytics/cursos/solapamiento", tags=["Analítica"])
+def analitica_pares_cursos(
+    limit: int = Query(20, ge=1, le=500),
+    min_compartidos: int = Query(1, ge=1),
+    session: Session = Depends(get_read_session),
+):
+    return analitica.pares_solapados(session, limit, min_compartidos)
+
+@app.get("/analytics/cursos/solapamiento/matriz", tags=["Analítica"])
+def analitica_matriz_cursos(
+    ids: str = Query(..., description="Cursos separados por comas; en la diagonal, sus inscritos"),
+    session: Session = Depends(get_read_session),
+):
+    return analitica.matriz_solapamiento(session, parsear_ids(ids))
+
+@app.get("/analytics/cursos/{curso_id}/solapamiento", tags=["Analítica"])
+def analitica_solapamiento_curso(
+    curso_id: int,
+    k: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_read_session),
+):
+    return analitica.solapamiento_curso(session, curso_id, k)
+
+# CAMBIOS (feed append-only: catch-up por HTTP y streams SSE / WebSocket reanudables por offset)
+
+@app.get("/changes", response_model=CambiosRead, tags=["Cambios"])
+def listar_cambios(
+    since: int = Query(0, ge=0, description="Último offset recibido (0 = desde el principio)"),
+    limit: int = Query(100, ge=1, le=1000),
+    entidad: Optional[str] = Query(None, description="estudiante, curso, matricula (separadas por comas)"),
+    session: Session = Depends(get_session),
+):
+    return cambios.listar(session, since, limit, cambios.parsear_entidades(entidad))
+
+@app.get("/changes/stream", tags=["Cambios"])
+async def stream_cambios(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Offset desde el que reanudar; sin él, solo lo nuevo"),
+    entidad: Optional[str] = Query(None, description="estudiante, curso, matricula (separadas por comas)"),
+):
+    # Server-Sent Events: `id:` es el offset, así que EventSource reanuda solo con Last-Event-ID
+    ultimo_visto = request.headers.get("last-event-id")
+    if ultimo_visto and ultimo_visto.isdigit():
+        since = int(ultimo_visto)
+    sub = await cambios.preparar(since, cambios.parsear_entidades(entidad))
+
+    async def sse():
+        yield f"retry: 2000\n: offset {sub.posicion}\n\n"
+        async for lote in cambios.eventos(sub):
+            yield "".join(e.sse for e in lote) if lote else ": ping\n\n"
+
+    return StreamingResponse(
+        sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/changes/ws")
+async def websocket_cambios(websocket: WebSocket, since: Optional[int] = None, entidad: Optional[str] = None):
+    # Un mensaje por lote: arreglo JSON de cambios en orden de offset
+    try:
+        sub = await cambios.preparar(since, cambios.parsear_entidades(entidad))
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == 503 else 1008, reason=str(e.detail))
+        return
+    await websocket.accept()
+    flujo = cambios.eventos(sub)
+
+    async def enviar():
+        async for lote in flujo:
+            if lote:
+                await websocket.send_text("[" + ",".join(e.json for e in lote) + "]")
+
+    async def esperar_cierre():
+        # Se lee en paralelo para enterarse del cierre sin esperar al próximo envío
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tareas = {asyncio.create_task(enviar()), asyncio.create_task(esperar_cierre())}
+    try:
+        await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)  # desconexión del cliente
+        await flujo.aclose()
+
+# MODO ASYNC
+if DB_MODO == "async":
+    from rutas_async import crear_router, instalar
+    instalar(app, crear_router(get_async_session, get_async_read_session))
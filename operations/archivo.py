@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, literal, update, select as sa_select
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from data.models import (
+    Estudiante, Curso, Matricula,
+    EstudianteArchivo, CursoArchivo, MatriculaArchivo,
+    EstadisticaCurso, EstadisticaEstudiante, FranjaHorario, ListaEspera, OcupacionEstudiante,
+    ahora,
+)
+from operations import cambios, estadisticas, horarios
+
+log = logging.getLogger("universidad.archivo")
+
+# Las filas con borrado lógico más antiguas que ARCHIVO_RETENCION_DIAS se mueven, con sus matrículas, a las
+# tablas *_archivo en lotes cortos (una transacción por lote), así las tablas calientes y sus índices solo
+# crecen con lo que está vivo. Para la API el archivo es transparente: /deleted lista ambas tablas y
+# restaurar trae la fila de vuelta. Una matrícula está en la tabla caliente solo si sus dos lados lo están.
+
+# CONFIGURACIÓN
+ARCHIVO_RETENCION_DIAS = int(os.getenv("ARCHIVO_RETENCION_DIAS", 30))
+ARCHIVO_LOTE = int(os.getenv("ARCHIVO_LOTE", 500))                  # filas por transacción
+ARCHIVO_INTERVALO_S = float(os.getenv("ARCHIVO_INTERVALO_S", 0))    # 0: sin tarea en el proceso (usar la CLI)
+
+ARCHIVOS = {Estudiante: EstudianteArchivo, Curso: CursoArchivo}
+FILTROS = {Estudiante: ("ids", "semestre", "nombre"), Curso: ("ids", "codigo", "nombre", "creditos")}
+_LADO = {Estudiante: "estudiante_id", Curso: "curso_id"}
+_OTRO = {Estudiante: Curso, Curso: Estudiante}
+_UNICA = {Estudiante: "cedula", Curso: "codigo"}
+_ENTIDAD = {Estudiante: "estudiante", Curso: "curso"}
+_DEPENDIENTES = {
+    Estudiante: (EstadisticaEstudiante, OcupacionEstudiante, ListaEspera),
+    Curso: (EstadisticaCurso, FranjaHorario, ListaEspera),
+}
+_CONFLICTO = {
+    Estudiante: "La cédula del estudiante archivado ya pertenece a otro estudiante",
+    Curso: "El código del curso archivado ya pertenece a otro curso",
+}
+
+
+# HELPERS
+
+def _columnas(modelo) -> List[str]:
+    # Columnas comunes a la tabla caliente y a la de archivo
+    return [c.name for c in ARCHIVOS[modelo].__table__.columns if c.name != "archivado_en"]
+
+def _trozos(ids: List[int], n: int = 500):
+    for i in range(0, len(ids), n):
+        yield ids[i:i + n]
+
+def condiciones(modelo, filtros: Dict[str, Any]) -> List[Any]:
+    # modelo: la tabla caliente o la de archivo (mismas columnas)
+    conds = []
+    for campo, valor in filtros.items():
+        if valor is None:
+            continue
+        if campo == "ids":
+            conds.append(modelo.id.in_(valor))
+        elif campo == "nombre":
+            conds.append(modelo.nombre.ilike(f"%{valor}%"))
+        else:
+            conds.append(getattr(modelo, campo) == valor)
+    if not conds:
+        raise HTTPException(status_code=400, detail="Indique al menos un filtro")
+    return conds
+
+
+# ARCHIVAR (tarea por lotes)
+
+def _archivar_lote(session: Session, modelo, corte, lote: int) -> Tuple[int, int]:
+    archivo = ARCHIVOS[modelo]
+    tabla = modelo.__table__
+    lado = getattr(Matricula, _LADO[modelo])
+    otro = _OTRO[modelo].__table__
+    # La fila de mayor id no se archiva: SQLite (rowid sin AUTOINCREMENT) volvería a asignar su id
+    ultimo = session.execute(sa_select(func.max(tabla.c.id))).scalar() or 0
+    archivables = (tabla.c.is_deleted == True, tabla.c.eliminado_en < corte, tabla.c.id < ultimo)  # noqa: E712
+    ids = session.execute(
+        sa_select(tabla.c.id).where(*archivables).order_by(tabla.c.id).limit(lote).with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        return 0, 0
+    marca = ahora()
+    columnas = _columnas(modelo)
+    # La condición se vuelve a evaluar al copiar: una fila restaurada entre la lectura y aquí se queda
+    session.execute(insert(archivo.__table__).from_select(
+        [*columnas, "archivado_en"],
+        sa_select(*(tabla.c[c] for c in columnas), literal(marca, archivo.__table__.c.archivado_en.type))
+        .where(tabla.c.id.in_(ids), *archivables),
+    ))
+    ids = session.execute(sa_select(archivo.id).where(archivo.id.in_(ids))).scalars().all()
+    matriculas = session.execute(insert(MatriculaArchivo.__table__).from_select(
+        ["estudiante_id", "curso_id", "archivado_en"],
+        sa_select(Matricula.estudiante_id, Matricula.curso_id, literal(marca, MatriculaArchivo.__table__.c.archivado_en.type))
+        .where(lado.in_(ids)),
+    )).rowcount
+    # Los rosters del otro lado no cambian (solo listan activos), pero la suma de versiones de su ETag
+    # baja: version_matriculas sube para que el token no se repita
+    session.execute(
+        update(otro)
+        .where(otro.c.id.in_(sa_select(getattr(Matricula, _LADO[_OTRO[modelo]])).where(lado.in_(ids))))
+        .values(version_matriculas=otro.c.version_matriculas + 1)
+    )
+    session.execute(delete(Matricula.__table__).where(lado.in_(ids)))
+    for dependiente in _DEPENDIENTES[modelo]:
+        session.execute(delete(dependiente.__table__).where(getattr(dependiente, _LADO[modelo]).in_(ids)))
+    session.execute(delete(tabla).where(tabla.c.id.in_(ids)))
+    return len(ids), matriculas
+
+def archivar(engine: Engine, dias: int = ARCHIVO_RETENCION_DIAS, lote: int = ARCHIVO_LOTE) -> Dict[str, int]:
+    corte = ahora() - timedelta(days=dias)
+    resultado = {"estudiantes": 0, "cursos": 0, "matriculas": 0, "lotes": 0}
+    for modelo, clave in ((Estudiante, "estudiantes"), (Curso, "cursos")):
+        while True:
+            with Session(engine) as session:
+                filas, matriculas = _archivar_lote(session, modelo, corte, lote)
+                session.commit()
+            resultado[clave] += filas
+            resultado["matriculas"] += matriculas
+            resultado["lotes"] += bool(filas)
+            if filas < lote:
+                break
+    return resultado
+
+
+# LECTURA Y RESTAURACIÓN (transparentes para la API)
+
+def archivados(session: Session, modelo) -> List[Any]:
+    archivo = ARCHIVOS[modelo]
+    return session.exec(select(archivo).order_by(archivo.id)).all()
+
+def desarchivar(session: Session, modelo, conds: List[Any]) -> Tuple[List[int], List[int]]:
+    # Devuelve (ids que vuelven a la tabla caliente, todavía eliminados; ids cuya cédula/código ya está en uso).
+    # Sin commit: quien llama completa la restauración en la misma transacción.
+    archivo = ARCHIVOS[modelo]
+    unica, unica_archivo = getattr(modelo, _UNICA[modelo]), getattr(archivo, _UNICA[modelo])
+    filas = session.execute(sa_select(archivo.id, unica_archivo).where(*conds).order_by(archivo.id)).all()
+    if not filas:
+        return [], []
+    ocupadas = set()
+    for trozo in _trozos([v for _, v in filas]):
+        ocupadas.update(session.execute(sa_select(unica).where(unica.in_(trozo))).scalars())
+    ids, conflictos = [], []
+    for fila_id, valor in filas:
+        (conflictos if valor in ocupadas else ids).append(fila_id)
+        ocupadas.add(valor)
+
+    columnas = _columnas(modelo)
+    lado = getattr(MatriculaArchivo, _LADO[modelo])
+    otro_lado = getattr(MatriculaArchivo, _LADO[_OTRO[modelo]])
+    for trozo in _trozos(ids):
+        session.execute(insert(modelo.__table__).from_select(
+            [*columnas, "is_deleted"],
+            sa_select(*(getattr(archivo, c) for c in columnas), literal(True)).where(archivo.id.in_(trozo)),
+        ))
+        vuelven = (lado.in_(trozo), otro_lado.in_(sa_select(_OTRO[modelo].__table__.c.id)))
+        session.execute(insert(Matricula.__table__).from_select(
+            ["estudiante_id", "curso_id"],
+            sa_select(MatriculaArchivo.estudiante_id, MatriculaArchivo.curso_id).where(*vuelven),
+        ))
+        session.execute(delete(MatriculaArchivo.__table__).where(*vuelven))
+        session.execute(delete(archivo.__table__).where(archivo.id.in_(trozo)))
+    if ids:
+        estadisticas.al_desarchivar(session, modelo, ids)
+        horarios.al_desarchivar(session, modelo, ids)
+    return ids, conflictos
+
+def recuperar(session: Session, modelo, obj_id: int):
+    # restaurar_* de una fila que ya no está en la tabla caliente: None si tampoco está archivada
+    ids, conflictos = desarchivar(session, modelo, [ARCHIVOS[modelo].id == obj_id])
+    if conflictos:
+        raise HTTPException(status_code=409, detail=_CONFLICTO[modelo])
+    return session.get(modelo, obj_id) if ids else None
+
+
+# BORRADO Y RESTAURACIÓN MASIVOS (un UPDATE por conjunto; sin commit, como los hooks)
+
+def cambiar_estado_masivo(session: Session, modelo, borrar: bool, filtros: Dict[str, Any]) -> Tuple[Dict[str, Any], List[int]]:
+    conds = condiciones(modelo, filtros)
+    resultado: Dict[str, Any] = {}
+    if not borrar:
+        desarchivados, conflictos = desarchivar(session, modelo, condiciones(ARCHIVOS[modelo], filtros))
+        resultado.update(desarchivados=len(desarchivados), conflictos=conflictos)
+    tabla = modelo.__table__
+    extra = tabla.c.semestre if modelo is Estudiante else tabla.c.creditos
+    donde = (tabla.c.is_deleted == (not borrar), *conds)
+    valores = {"is_deleted": borrar, "eliminado_en": ahora() if borrar else None, "version": tabla.c.version + 1}
+    if session.get_bind().dialect.update_returning:
+        filas = session.execute(update(tabla).where(*donde).values(**valores).returning(tabla.c.id, extra)).all()
+    else:
+        filas = session.execute(sa_select(tabla.c.id, extra).where(*donde).with_for_update()).all()
+        for trozo in _trozos([f[0] for f in filas]):
+            session.execute(update(tabla).where(tabla.c.id.in_(trozo)).values(**valores))
+    filas = [tuple(f) for f in filas]
+    ids = [f[0] for f in filas]
+    if modelo is Estudiante:
+        estadisticas.al_cambiar_estado_estudiantes(session, filas, activo=not borrar)
+    else:
+        estadisticas.al_cambiar_estado_cursos(session, filas, activo=not borrar)
+        horarios.al_cambiar_estado_cursos(session, ids)
+    cambios.al_escribir(session, _ENTIDAD[modelo], "eliminar" if borrar else "restaurar", ids)
+    resultado["afectados"] = len(ids)
+    return resultado, ids
+
+
+# TAREA PERIÓDICA (opcional, en el proceso de la API)
+
+class Archivador:
+    def __init__(self):
+        self.totales = {"estudiantes": 0, "cursos": 0, "matriculas": 0, "corridas": 0, "errores": 0}
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self, engine: Engine) -> None:
+        if ARCHIVO_INTERVALO_S > 0 and self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._ciclo(engine))
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _ciclo(self, engine: Engine) -> None:
+        while True:
+            await asyncio.sleep(ARCHIVO_INTERVALO_S)
+            try:
+                resultado = await asyncio.to_thread(archivar, engine)
+            except Exception:
+                self.totales["errores"] += 1
+                log.exception("Error al archivar; se reintenta en el próximo ciclo")
+                continue
+            self.totales["corridas"] += 1
+            for clave in ("estudiantes", "cursos", "matriculas"):
+                self.totales[clave] += resultado[clave]
+            if resultado["lotes"]:
+                log.info("archivados %s", resultado)
+
+archivador = Archivador()
+
+def gauges() -> Dict[Tuple[Tuple[str, str], ...], float]:
+    return {(("tipo", k),): v for k, v in archivador.totales.items()}
+
+
+# CLI (python -m operations.archivo archivar --dias 30)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Mueve al archivo las filas eliminadas hace más de --dias")
+    parser.add_argument("comando", choices=("archivar",))
+    parser.add_argument("--dias", type=int, default=ARCHIVO_RETENCION_DIAS)
+    parser.add_argument("--lote", type=int, default=ARCHIVO_LOTE)
+    parser.add_argument("--database-url", help="Por defecto DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from utils.db import crear_engine
+    from utils.migraciones import verificar
+    engine = crear_engine(args.database_url)
+    verificar(engine)
+    print(json.dumps(archivar(engine, args.dias, args.lote), indent=2))
+
+
+if __name__ == "__main__":
+    main()
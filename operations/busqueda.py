@@ -0,0 +1,199 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, column, func, literal_column, or_, table, text, true
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from data.models import Estudiante, Curso
+
+# tipo -> (modelo, tabla, columnas indexadas, pesos bm25)
+INDICES = {
+    "estudiantes": (Estudiante, "estudiante", ("nombre", "email"), (2.0, 1.0)),
+    "cursos": (Curso, "curso", ("codigo", "nombre"), (2.0, 1.0)),
+}
+
+
+# CREACIÓN DE ÍNDICES
+
+# SQLite: dos tablas FTS5 por tabla, mantenidas por los mismos triggers.
+# {tabla}_fts (unicode61 sin acentos): términos por prefijo y ranking bm25 de /busqueda.
+# {tabla}_trgm (trigram): subcadenas para los filtros nombre=/codigo= (LIKE '%q%' resuelto por el índice).
+TOKENIZADORES = {
+    "fts": "tokenize='unicode61 remove_diacritics 2', prefix='2 3'",
+    "trgm": "tokenize='trigram case_sensitive 0'",
+}
+
+def _sqlite_fts(conn, tabla: str, columnas, sufijo_fts: str, reconstruir: bool = False) -> None:
+    # Solo se indexan las filas activas: la consulta ordena y pagina directamente sobre el índice, sin
+    # que las eliminadas ocupen puestos de la página
+    fts = f"{tabla}_{sufijo_fts}"
+    existe = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": fts}
+    ).first()
+    cols = ", ".join(columnas)
+    nuevos = ", ".join(f"new.{c}" for c in columnas)
+    viejos = ", ".join(f"old.{c}" for c in columnas)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{tabla}', content_rowid='id', "
+        f"{TOKENIZADORES[sufijo_fts]})"
+    ))
+    # Triggers: el índice se mantiene sincronizado con cualquier escritura (ORM, lote, importación, borrado
+    # masivo o archivo); eliminar y restaurar sacan y devuelven la fila
+    for sufijo in ("ai", "ad", "au"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {fts}_{sufijo}"))
+    alta = f"INSERT INTO {fts}(rowid, {cols}) SELECT new.id, {nuevos} WHERE new.is_deleted = 0;"
+    baja = f"INSERT INTO {fts}({fts}, rowid, {cols}) SELECT 'delete', old.id, {viejos} WHERE old.is_deleted = 0;"
+    conn.execute(text(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {tabla} BEGIN {alta} END"))
+    conn.execute(text(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {tabla} BEGIN {baja} END"))
+    conn.execute(text(f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols}, is_deleted ON {tabla} BEGIN {baja} {alta} END"))
+    if existe and not reconstruir:
+        return
+    # 'rebuild' indexaría también las eliminadas
+    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')"))
+    conn.execute(text(f"INSERT INTO {fts}(rowid, {cols}) SELECT id, {cols} FROM {tabla} WHERE is_deleted = 0"))
+
+def _postgres_trgm(conn, tabla: str, columnas) -> None:
+    # Índices GIN pg_trgm sobre f_unaccent(lower(col)), la misma expresión que usa la consulta, solo con
+    # las filas activas. unaccent() no es IMMUTABLE (depende del diccionario por defecto) y no puede ir en
+    # un índice: f_unaccent fija el diccionario.
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+    conn.exec_driver_sql(
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+        "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+    )
+    for c in columnas:
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_{tabla}_{c}_trgm"))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{tabla}_{c}_busqueda ON {tabla} "
+            f"USING gin (f_unaccent(lower({c})) gin_trgm_ops) WHERE is_deleted = false"
+        ))
+
+def crear_indices_busqueda(engine: Engine, reconstruir: bool = False) -> None:
+    with engine.begin() as conn:
+        for _, tabla, columnas, _ in INDICES.values():
+            if engine.dialect.name == "sqlite":
+                for sufijo_fts in TOKENIZADORES:
+                    _sqlite_fts(conn, tabla, columnas, sufijo_fts, reconstruir)
+            elif engine.dialect.name == "postgresql":
+                _postgres_trgm(conn, tabla, columnas)
+
+
+# CONSULTA
+
+def normalizar(texto: str) -> str:
+    sin_acentos = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(ch for ch in sin_acentos if not unicodedata.combining(ch))
+    return sin_acentos.lower()
+
+def _consulta_fts(q: str) -> Optional[str]:
+    # Cada término se busca como prefijo: "mar gon" -> "mar"* AND "gon"*
+    terminos = re.findall(r"\w+", normalizar(q))
+    if not terminos:
+        return None
+    return " ".join(f'"{t}"*' for t in terminos)
+
+def _buscar_sqlite(session: Session, modelo, tabla: str, pesos, q: str, limit: int, skip: int):
+    consulta = _consulta_fts(q)
+    if consulta is None:
+        return []
+    fts = f"{tabla}_fts"
+    # El índice solo tiene filas activas: se ordena por relevancia sobre todas las coincidencias y luego
+    # se corta la página
+    ids = session.execute(
+        text(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH :q "
+            f"ORDER BY bm25({fts}, {', '.join(str(p) for p in pesos)}), rowid LIMIT :limit OFFSET :skip"
+        ),
+        {"q": consulta, "limit": limit, "skip": skip},
+    ).scalars().all()
+    if not ids:
+        return []
+    por_id = {o.id: o for o in session.exec(select(modelo).where(modelo.id.in_(ids))).all()}
+    return [por_id[i] for i in ids if i in por_id]
+
+def _buscar_postgres(session: Session, modelo, columnas, pesos, q: str, limit: int, skip: int):
+    # Como en SQLite, cada término busca palabras que empiezan por él (sin acentos ni mayúsculas) en alguna
+    # columna: \m es el inicio de palabra y los índices trigram de _postgres_trgm resuelven la expresión
+    # regular. Orden: similitud ponderada con la consulta completa.
+    normalizada = normalizar(q)
+    terminos = re.findall(r"\w+", normalizada)
+    if not terminos:
+        return []
+    cols = [func.f_unaccent(func.lower(getattr(modelo, c))) for c in columnas]
+    filtros = [or_(*(c.op("~")(r"\m" + t) for c in cols)) for t in terminos]
+    relevancia = func.greatest(*(func.similarity(c, normalizada) * p for c, p in zip(cols, pesos)))
+    stmt = (
+        select(modelo)
+        .where(*filtros, modelo.is_deleted == False)  # noqa: E712
+        .order_by(relevancia.desc(), modelo.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    return session.exec(stmt).all()
+
+def _buscar_generico(session: Session, modelo, columnas, q: str, limit: int, skip: int):
+    # Otros motores: sin índice ni ranking
+    cols = [getattr(modelo, c) for c in columnas]
+    stmt = (
+        select(modelo)
+        .where(or_(*(c.ilike(f"%{q}%") for c in cols)), modelo.is_deleted == False)  # noqa: E712
+        .order_by(modelo.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    return session.exec(stmt).all()
+
+def buscar(session: Session, tipo: str, q: str, limit: int = 10, skip: int = 0) -> List:
+    if tipo not in INDICES:
+        raise HTTPException(status_code=400, detail=f"Tipo de búsqueda no soportado: {tipo}")
+    modelo, tabla, columnas, pesos = INDICES[tipo]
+    try:
+        if session.bind.dialect.name == "sqlite":
+            return _buscar_sqlite(session, modelo, tabla, pesos, q, limit, skip)
+        if session.bind.dialect.name == "postgresql":
+            return _buscar_postgres(session, modelo, columnas, pesos, q, limit, skip)
+        return _buscar_generico(session, modelo, columnas, q, limit, skip)
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al buscar {tipo}. Error: {str(e)}")
+
+
+# FILTROS DE LISTADO (nombre=, codigo= de GET /estudiantes/ y /cursos/, sus exportaciones y /search/)
+# Misma semántica que ilike('%q%') en todos los motores (y que los filtros de archivo.condiciones): subcadena
+# sin distinguir mayúsculas. El índice trigram solo preselecciona candidatas entre las filas activas y el
+# ilike de la propia columna decide, así que el resultado no depende del motor ni del tokenizador.
+
+def _tipo(modelo) -> str:
+    return next(tipo for tipo, (m, *_) in INDICES.items() if m is modelo)
+
+def filtro(dialecto: Optional[str], modelo, columna: str, q: str, include_deleted: bool = False):
+    _, tabla, columnas, _ = INDICES[_tipo(modelo)]
+    if columna not in columnas:
+        raise ValueError(f"{tabla}.{columna} no está indexada para búsqueda")
+    col = getattr(modelo, columna)
+    patron = f"%{q}%"
+    exacta = col.ilike(patron)
+    if dialecto == "sqlite" and (len(q) < 3 or re.search(r"[%_]", q)):
+        # Un tramo de menos de 3 caracteres (q corto o con comodines % _) no forma un trigrama, y el LIKE de
+        # FTS5 además descarta coincidencias con caracteres multibyte ('%ré%'): se recorre la tabla
+        candidatas = true()
+    elif dialecto == "sqlite":
+        trgm = f"{tabla}_trgm"
+        candidatas = modelo.id.in_(
+            select(column("rowid")).select_from(table(trgm)).where(literal_column(f"{trgm}.{columna}").like(patron))
+        )
+    elif dialecto == "postgresql":
+        # Mismo LIKE sobre f_unaccent(lower(col)), la expresión de los índices parciales de _postgres_trgm
+        candidatas = func.f_unaccent(func.lower(col)).like(func.f_unaccent(func.lower(patron)))
+    else:
+        return exacta
+    condicion = and_(modelo.is_deleted == False, candidatas, exacta)  # noqa: E712
+    if include_deleted:
+        # El índice solo tiene filas activas; las eliminadas (pocas, índice parcial) se filtran aparte
+        condicion = or_(condicion, and_(modelo.is_deleted == True, exacta))  # noqa: E712
+    return condicion
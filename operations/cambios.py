@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import timedelta
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, event, func, insert, text, select as sa_select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session as SesionORM
+from sqlmodel import Session, select
+
+from data.models import Cambio, CambioPendiente, ahora
+
+log = logging.getLogger("universidad.cambios")
+
+# Feed de cambios: cada operación de escritura agrega filas a `cambio` antes de su commit (hooks al_*, como
+# estadisticas y horarios), así que el feed nunca anuncia algo que se revirtió. El id de la fila es el offset.
+# Un difusor por proceso lee la tabla cuando un commit local lo despierta (o cada CAMBIOS_INTERVALO_S, para
+# ver lo escrito por otros workers) y reparte cada lote, serializado una sola vez, a las colas acotadas de
+# los suscriptores. Un suscriptor lento que llena su cola sale del reparto en vivo y se pone al día leyendo
+# la tabla desde su último offset: no frena al resto ni acumula memoria.
+#
+# Orden de los offsets: un lector que ya vio el id N no puede ver aparecer después uno menor. En SQLite los
+# escritores ya van de a uno y el id se asigna al registrar. En PostgreSQL los ids de una secuencia se confirman
+# fuera de orden, así que cada escritura deja sus filas en `cambio_pendiente` (sin bloqueo entre escritores) y
+# secuenciar() las pasa a `cambio` ya confirmadas: el advisory lock solo lo toman los lectores que secuencian,
+# una transacción corta a la vez, y los offsets se confirman en el orden en que se asignan.
+
+# CONFIGURACIÓN
+CAMBIOS_COLA = int(os.getenv("CAMBIOS_COLA", 64))                    # lotes pendientes por suscriptor
+CAMBIOS_LOTE = int(os.getenv("CAMBIOS_LOTE", 500))                   # filas por lectura de la tabla
+CAMBIOS_INTERVALO_S = float(os.getenv("CAMBIOS_INTERVALO_S", 1.0))   # sondeo (escrituras de otros procesos)
+CAMBIOS_PING_S = float(os.getenv("CAMBIOS_PING_S", 15.0))            # latido de los streams sin cambios
+CAMBIOS_MAX_SUSCRIPTORES = int(os.getenv("CAMBIOS_MAX_SUSCRIPTORES", 1000))
+CAMBIOS_RETENCION_DIAS = int(os.getenv("CAMBIOS_RETENCION_DIAS", 7))
+
+ENTIDADES = ("estudiante", "curso", "matricula")
+_CLAVE_ORDEN = zlib.crc32(b"universidad.cambios")
+
+
+# REGISTRO (hooks al_*: se llaman antes del commit de cada operación de escritura)
+
+def _registrar(session: Session, filas: List[Dict]) -> None:
+    if not filas:
+        return
+    modelo = CambioPendiente if session.get_bind().dialect.name == "postgresql" else Cambio
+    creado_en = ahora()
+    session.execute(insert(modelo), [{**f, "creado_en": creado_en} for f in filas])
+    session.info["cambios_pendientes"] = True
+
+def al_escribir(session: Session, entidad: str, operacion: str, ids: Iterable[int]) -> None:
+    _registrar(session, [{"entidad": entidad, "operacion": operacion, "entidad_id": i} for i in ids])
+
+def al_cambiar_matriculas(session: Session, operacion: str, pares: Iterable[Tuple[int, int]]) -> None:
+    _registrar(session, [
+        {"entidad": "matricula", "operacion": operacion, "entidad_id": e, "relacionado_id": c} for e, c in pares
+    ])
+
+@event.listens_for(SesionORM, "after_commit")
+def _tras_commit(session) -> None:
+    if session.info.pop("cambios_pendientes", False):
+        difusor.despertar()
+
+@event.listens_for(SesionORM, "after_rollback")
+def _tras_rollback(session) -> None:
+    session.info.pop("cambios_pendientes", None)
+
+
+# SECUENCIACIÓN (PostgreSQL: antes de cada lectura del feed)
+
+_MOVER = text("""
+    WITH movidas AS (
+        DELETE FROM cambio_pendiente RETURNING id, entidad, operacion, entidad_id, relacionado_id, creado_en
+    )
+    INSERT INTO cambio (entidad, operacion, entidad_id, relacionado_id, creado_en)
+    SELECT entidad, operacion, entidad_id, relacionado_id, creado_en FROM movidas ORDER BY id
+""")
+
+def secuenciar(engine: Optional[Engine] = None) -> int:
+    # Da offset a los cambios pendientes ya confirmados. El DELETE solo ve filas confirmadas y el lock se
+    # suelta en el commit, así que cada secuenciación confirma ids mayores que todas las anteriores. Dos
+    # escrituras sobre la misma fila se ordenan por su bloqueo de fila: la segunda registra después.
+    engine = engine or _engine()
+    if engine.dialect.name != "postgresql":
+        return 0
+    with engine.begin() as conn:
+        if conn.execute(sa_select(CambioPendiente.id).limit(1)).first() is None:
+            return 0
+        conn.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": _CLAVE_ORDEN})
+        return conn.execute(_MOVER).rowcount
+
+
+# LECTURA
+
+class Evento(NamedTuple):
+    id: int
+    entidad: str
+    json: str   # serializado una vez por el difusor y compartido por todos los suscriptores
+
+    @property
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: cambio\ndata: {self.json}\n\n"
+
+def _engine() -> Engine:
+    from utils.db import engine
+    return engine
+
+def _a_evento(fila) -> Evento:
+    datos = {
+        "id": fila.id, "entidad": fila.entidad, "operacion": fila.operacion, "entidad_id": fila.entidad_id,
+        "relacionado_id": fila.relacionado_id, "creado_en": fila.creado_en.isoformat(),
+    }
+    return Evento(fila.id, fila.entidad, json.dumps(datos, separators=(",", ":")))
+
+def leer(desde: int, limite: int = CAMBIOS_LOTE, hasta: Optional[int] = None) -> List[Evento]:
+    if hasta is None:
+        secuenciar()
+    q = sa_select(Cambio.__table__).where(Cambio.id > desde).order_by(Cambio.id).limit(limite)
+    if hasta is not None:
+        q = q.where(Cambio.id <= hasta)
+    with _engine().connect() as conn:
+        return [_a_evento(f) for f in conn.execute(q)]
+
+def ultimo_id() -> int:
+    secuenciar()
+    with _engine().connect() as conn:
+        return conn.execute(sa_select(func.max(Cambio.id))).scalar() or 0
+
+def _verificar_offset(conn_o_sesion, desde: int) -> None:
+    # 410 si las filas posteriores a `desde` ya se purgaron: el cliente debe recargar y reanudar desde `ultimo`
+    primero = conn_o_sesion.execute(sa_select(func.min(Cambio.id))).scalar()
+    if primero is not None and desde + 1 < primero:
+        raise HTTPException(status_code=410, detail=f"El offset {desde} ya fue purgado; el más antiguo es {primero}")
+
+def parsear_entidades(entidad: Optional[str]) -> Optional[Set[str]]:
+    if not entidad:
+        return None
+    entidades = {e.strip() for e in entidad.split(",") if e.strip()}
+    invalidas = entidades - set(ENTIDADES)
+    if invalidas:
+        raise HTTPException(status_code=400, detail=f"Entidades no soportadas: {sorted(invalidas)} (use {ENTIDADES})")
+    return entidades
+
+def listar(session: Session, desde: int, limite: int = 100, entidades: Optional[Set[str]] = None) -> Dict:
+    # Catch-up por HTTP: mismo orden y offsets que el stream
+    try:
+        secuenciar(session.get_bind())
+        _verificar_offset(session, desde)
+        q = select(Cambio).where(Cambio.id > desde).order_by(Cambio.id).limit(limite + 1)
+        if entidades:
+            q = q.where(Cambio.entidad.in_(entidades))
+        filas = session.exec(q).all()
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+        return {"cambios": filas, "ultimo": filas[-1].id if filas else desde, "hay_mas": hay_mas}
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al leer los cambios. Error: {str(e)}")
+
+
+# DIFUSIÓN (una tarea por proceso y event loop)
+
+class Suscripcion:
+    def __init__(self, posicion: int, entidades: Optional[Set[str]]):
+        self.posicion = posicion            # último offset entregado
+        self.entidades = entidades
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=CAMBIOS_COLA)
+        self.en_vivo = False
+
+    def entregar(self, eventos: List[Evento]) -> List[Evento]:
+        eventos = [e for e in eventos if e.id > self.posicion]
+        if eventos:
+            self.posicion = eventos[-1].id
+        if self.entidades is not None:
+            eventos = [e for e in eventos if e.entidad in self.entidades]
+        return eventos
+
+class Difusor:
+    def __init__(self):
+        self.suscriptores: Set[Suscripcion] = set()
+        self.ultimo = 0          # último offset leído de la tabla
+        self.atrasos = 0         # suscriptores que llenaron su cola y pasaron a leer la tabla
+        self.lotes = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._despertar: Optional[asyncio.Event] = None
+        self._listo: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+    def despertar(self) -> None:
+        # Desde cualquier hilo (after_commit corre en el threadpool de los endpoints sync)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._despertar.set)
+
+    async def iniciar(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._tarea is None or self._loop is not loop or self._tarea.done():
+            self._loop = loop
+            self._despertar = asyncio.Event()
+            self._listo = asyncio.Event()
+            self.suscriptores = set()
+            self._tarea = loop.create_task(self._difundir())
+        await self._listo.wait()
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        self._loop = None
+
+    def agregar(self, sub: Suscripcion) -> int:
+        # Sin await en medio: todo lo posterior a `ultimo` llegará por la cola; lo anterior lo lee el suscriptor
+        sub.en_vivo = True
+        self.suscriptores.add(sub)
+        return self.ultimo
+
+    def quitar(self, sub: Suscripcion) -> None:
+        self.suscriptores.discard(sub)
+
+    def lleno(self) -> bool:
+        return len(self.suscriptores) >= CAMBIOS_MAX_SUSCRIPTORES
+
+    def _repartir(self, eventos: List[Evento]) -> None:
+        lote = tuple(eventos)
+        for sub in list(self.suscriptores):
+            try:
+                sub.cola.put_nowait(lote)
+            except asyncio.QueueFull:
+                self.suscriptores.discard(sub)
+                sub.en_vivo = False
+                self.atrasos += 1
+        self.lotes += 1
+
+    async def _difundir(self) -> None:
+        self.ultimo = await asyncio.to_thread(ultimo_id)
+        self._listo.set()
+        while True:
+            try:
+                await asyncio.wait_for(self._despertar.wait(), CAMBIOS_INTERVALO_S)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+            try:
+                if not self.suscriptores:
+                    # Nadie escucha: solo se avanza el offset (si entra alguien mientras tanto, se lee normal)
+                    ultimo = await asyncio.to_thread(ultimo_id)
+                    if not self.suscriptores:
+                        self.ultimo = ultimo
+                    continue
+                while True:
+                    eventos = await asyncio.to_thread(leer, self.ultimo)
+                    if not eventos:
+                        break
+                    self.ultimo = eventos[-1].id
+                    self._repartir(eventos)
+                    if len(eventos) < CAMBIOS_LOTE:
+                        break
+            except SQLAlchemyError:
+                log.exception("Error leyendo la tabla de cambios; se reintenta en %.1fs", CAMBIOS_INTERVALO_S)
+
+    def estado(self) -> Dict[str, int]:
+        return {
+            "suscriptores": len(self.suscriptores), "atrasos": self.atrasos,
+            "lotes": self.lotes, "ultimo": self.ultimo,
+        }
+
+difusor = Difusor()
+
+def gauges() -> Dict[Tuple[Tuple[str, str], ...], float]:
+    return {(("estado", k),): v for k, v in difusor.estado().items()}
+
+async def preparar(desde: Optional[int], entidades: Optional[Set[str]] = None) -> Suscripcion:
+    # Se llama antes de abrir el stream para poder responder 503/410 con un código HTTP normal
+    await difusor.iniciar()
+    if difusor.lleno():
+        raise HTTPException(status_code=503, detail="Demasiados suscriptores al feed de cambios")
+    if desde is None:
+        desde = difusor.ultimo
+    else:
+        def verificar():
+            with _engine().connect() as conn:
+                _verificar_offset(conn, desde)
+        await asyncio.to_thread(verificar)
+    return Suscripcion(desde, entidades)
+
+async def eventos(sub: Suscripcion) -> AsyncIterator[List[Evento]]:
+    # Lotes en orden de offset, sin huecos ni repetidos; una lista vacía es un latido (CAMBIOS_PING_S sin cambios)
+    try:
+        while True:
+            if not sub.en_vivo:
+                while not sub.cola.empty():
+                    sub.cola.get_nowait()   # lo que quedó en la cola lo cubre la lectura de la tabla
+                while True:
+                    lote = await asyncio.to_thread(leer, sub.posicion)
+                    entregar = sub.entregar(lote)
+                    if entregar:
+                        yield entregar
+                    if len(lote) < CAMBIOS_LOTE:
+                        break
+                hasta = difusor.agregar(sub)
+                while sub.posicion < hasta:
+                    lote = await asyncio.to_thread(leer, sub.posicion, CAMBIOS_LOTE, hasta)
+                    if not lote:
+                        break
+                    entregar = sub.entregar(lote)
+                    if entregar:
+                        yield entregar
+                continue
+            try:
+                lotes = [await asyncio.wait_for(sub.cola.get(), CAMBIOS_PING_S)]
+            except asyncio.TimeoutError:
+                yield []
+                continue
+            while not sub.cola.empty():
+                lotes.append(sub.cola.get_nowait())
+            entregar = sub.entregar([e for lote in lotes for e in lote])
+            if entregar:
+                yield entregar
+    finally:
+        difusor.quitar(sub)
+
+
+# RETENCIÓN
+
+def purgar(engine: Engine, dias: int = CAMBIOS_RETENCION_DIAS) -> int:
+    # Conserva siempre la última fila para que el offset de los clientes al día siga siendo válido
+    secuenciar(engine)
+    with engine.begin() as conn:
+        ultimo = conn.execute(sa_select(func.max(Cambio.id))).scalar() or 0
+        resultado = conn.execute(
+            delete(Cambio).where(Cambio.creado_en < ahora() - timedelta(days=dias), Cambio.id < ultimo)
+        )
+    return resultado.rowcount
+
+
+# CLI (python -m operations.cambios purgar --dias 7)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del feed de cambios")
+    parser.add_argument("comando", choices=("purgar",))
+    parser.add_argument("--dias", type=int, default=CAMBIOS_RETENCION_DIAS)
+    parser.add_argument("--database-url", help="Por defecto DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from utils.db import crear_engine
+    from utils.migraciones import verificar
+    engine = crear_engine(args.database_url)
+    verificar(engine)
+    print(f"{purgar(engine, args.dias)} cambios purgados (más antiguos que {args.dias} días)")
+
+
+if __name__ == "__main__":
+    main()
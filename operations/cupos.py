@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, exists, func, insert, or_, tuple_, select as sa_select
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from data.models import Curso, EstadisticaCurso, EstadisticaEstudiante, ListaEspera
+from operations import estadisticas, horarios
+from utils.db import abrir_transaccion
+
+log = logging.getLogger("universidad.cupos")
+
+# Límites de matrícula:
+#   Curso.cupo              -> plazas del curso (NULL = sin límite), contra EstadisticaCurso.inscritos
+#   MATRICULA_MAX_CREDITOS  -> créditos por estudiante (0 = sin límite), contra EstadisticaEstudiante.creditos
+# Los contadores ya se mantienen en cada escritura (estadisticas.py): comprobar un límite no cuesta un COUNT.
+# Dos caminos, ninguno puede sobrevender:
+#   - matrícula individual (POST /matriculas/): el incremento lleva la condición en la misma sentencia
+#     (INSERT .. ON CONFLICT DO UPDATE .. WHERE inscritos < cupo); si no cambia ninguna fila, no hay plaza.
+#   - lotes (POST /matriculas/bulk y la cola): se bloquean los contadores de los cursos y estudiantes del lote
+#     (BEGIN IMMEDIATE en SQLite, SELECT .. FOR UPDATE en PostgreSQL), se reparten las plazas en orden y se
+#     suman de una vez.
+# La cola (POST /matriculas/cola) junta las solicitudes que llegan durante COLA_ESPERA_MS y las procesa como un
+# lote: un curso muy pedido pasa de cientos de transacciones peleando por la misma fila a una por micro-lote,
+# y la respuesta llega al confirmarse ese lote. Sin plaza, la solicitud queda en la lista de espera con su
+# posición; las plazas que se liberan se ofrecen en orden de llegada (promover, cada COLA_PROMOCION_S).
+# Mientras un curso tiene lista de espera, las solicitudes nuevas van detrás aunque quede una plaza libre.
+
+# CONFIGURACIÓN
+MATRICULA_MAX_CREDITOS = int(os.getenv("MATRICULA_MAX_CREDITOS", 0))
+COLA_ESPERA_MS = float(os.getenv("COLA_ESPERA_MS", 5))
+COLA_LOTE_MAX = int(os.getenv("COLA_LOTE_MAX", 500))
+COLA_PROMOCION_S = float(os.getenv("COLA_PROMOCION_S", 2))
+
+MENSAJES = {
+    "sin_cupo": "El curso no tiene cupo",
+    "creditos_excedidos": f"Supera el máximo de {MATRICULA_MAX_CREDITOS} créditos por estudiante",
+}
+
+# Código HTTP de cada estado de matricular_lote (respuesta de la cola)
+ESTADOS_HTTP = {
+    "creada": 201,
+    "lista_espera": 202,
+    "estudiante_no_encontrado": 404,
+    "curso_no_encontrado": 404,
+    "duplicada": 409,
+    "conflicto_horario": 409,
+    "creditos_excedidos": 409,
+    "sin_cupo": 409,
+}
+
+
+def _trozos(ids: List[Any], n: int = 500):
+    for i in range(0, len(ids), n):
+        yield ids[i:i + n]
+
+def _hay_espera(curso_id: int):
+    return exists().where(ListaEspera.curso_id == curso_id)
+
+
+# MATRÍCULA INDIVIDUAL (incremento condicionado)
+
+def sin_plaza(session: Session, estudiante_id: int, curso: Curso) -> Optional[str]:
+    # Lectura previa, sin bloquear: un curso lleno responde 409 sin abrir una transacción de escritura (la
+    # mayoría de las peticiones cuando un curso se agota). Solo descarta; quien decide es reservar()
+    tope = MATRICULA_MAX_CREDITOS
+    if tope:
+        creditos = session.execute(
+            sa_select(EstadisticaEstudiante.creditos).where(EstadisticaEstudiante.estudiante_id == estudiante_id)
+        ).scalar() or 0
+        if creditos + curso.creditos > tope:
+            return "creditos_excedidos"
+    if curso.cupo is not None:
+        lleno = session.execute(sa_select(
+            exists().where(EstadisticaCurso.curso_id == curso.id, EstadisticaCurso.inscritos >= curso.cupo)
+            | _hay_espera(curso.id)
+        )).scalar()
+        if lleno:
+            return "sin_cupo"
+    return None
+
+def reservar(session: Session, estudiante_id: int, curso: Curso) -> Optional[str]:
+    # Sustituye a estadisticas.al_matricular en matricular(): los mismos incrementos, cada uno con su límite.
+    # Devuelve el motivo si no cabe ("creditos_excedidos" o "sin_cupo"); quien llama deshace la transacción
+    tope = MATRICULA_MAX_CREDITOS
+    fila = {"estudiante_id": estudiante_id, "cursos": 1, "creditos": curso.creditos}
+    if tope:
+        if curso.creditos > tope or not estadisticas.sumar_si(
+            session, EstadisticaEstudiante, fila, EstadisticaEstudiante.creditos + curso.creditos <= tope,
+        ):
+            return "creditos_excedidos"
+    else:
+        estadisticas.sumar_si(session, EstadisticaEstudiante, fila)
+    fila = {"curso_id": curso.id, "inscritos": 1}
+    if curso.cupo is None:
+        estadisticas.sumar_si(session, EstadisticaCurso, fila)
+    elif not estadisticas.sumar_si(
+        session, EstadisticaCurso, fila, (EstadisticaCurso.inscritos < curso.cupo) & ~_hay_espera(curso.id),
+    ):
+        return "sin_cupo"
+    return None
+
+
+# LOTES (bloqueo y reparto)
+
+def bloquear(session: Session, est_ids, cur_ids) -> None:
+    # Antes de leer los contadores: hasta el commit nadie más suma a ellos. En PostgreSQL solo las filas que
+    # tienen límite (cursos con cupo; estudiantes si hay tope de créditos), en orden de id
+    dialecto = session.get_bind().dialect.name
+    if dialecto == "sqlite":
+        abrir_transaccion(session)
+        return
+    con_cupo = []
+    for trozo in _trozos(sorted(cur_ids)):
+        con_cupo += session.execute(
+            sa_select(Curso.id).where(Curso.id.in_(trozo), Curso.cupo.is_not(None))
+        ).scalars().all()
+    for modelo, clave, ids in (
+        (EstadisticaCurso, "curso_id", con_cupo),
+        (EstadisticaEstudiante, "estudiante_id", sorted(est_ids) if MATRICULA_MAX_CREDITOS else []),
+    ):
+        columna = getattr(modelo, clave)
+        for trozo in _trozos(ids):
+            if dialecto == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as upsert
+                session.execute(upsert(modelo).on_conflict_do_nothing(), [{clave: i} for i in trozo])
+            session.execute(sa_select(columna).where(columna.in_(trozo)).order_by(columna).with_for_update()).all()
+
+def repartir(session: Session, pares: List[Tuple[int, int]], desde_espera: bool = False) -> Dict[Tuple[int, int], str]:
+    # Con los contadores bloqueados: los pares que no caben y por qué, en orden (créditos y luego plazas)
+    tope = MATRICULA_MAX_CREDITOS
+    cursos: Dict[int, Tuple[Optional[int], int]] = {}
+    for trozo in _trozos(list({c for _, c in pares})):
+        cursos.update((i, (cupo, cr)) for i, cupo, cr in session.execute(
+            sa_select(Curso.id, Curso.cupo, Curso.creditos).where(Curso.id.in_(trozo))
+        ).all())
+    limitados = [c for c, (cupo, _) in cursos.items() if cupo is not None]
+    if not limitados and not tope:
+        return {}
+    inscritos: Dict[int, int] = {}
+    con_espera = set()
+    for trozo in _trozos(limitados):
+        inscritos.update(session.execute(
+            sa_select(EstadisticaCurso.curso_id, EstadisticaCurso.inscritos).where(EstadisticaCurso.curso_id.in_(trozo))
+        ).all())
+        if not desde_espera:
+            con_espera.update(session.execute(
+                sa_select(ListaEspera.curso_id).where(ListaEspera.curso_id.in_(trozo)).distinct()
+            ).scalars())
+    creditos: Dict[int, int] = {}
+    if tope:
+        for trozo in _trozos(list({e for e, _ in pares})):
+            creditos.update(session.execute(
+                sa_select(EstadisticaEstudiante.estudiante_id, EstadisticaEstudiante.creditos)
+                .where(EstadisticaEstudiante.estudiante_id.in_(trozo))
+            ).all())
+
+    fuera: Dict[Tuple[int, int], str] = {}
+    for e, c in pares:
+        cupo, cr = cursos[c]
+        if tope and creditos.get(e, 0) + cr > tope:
+            fuera[(e, c)] = "creditos_excedidos"
+        elif cupo is not None and (c in con_espera or inscritos.get(c, 0) >= cupo):
+            fuera[(e, c)] = "sin_cupo"
+        else:
+            creditos[e] = creditos.get(e, 0) + cr
+            inscritos[c] = inscritos.get(c, 0) + 1
+    return fuera
+
+
+# LISTA DE ESPERA
+
+def poner_en_espera(session: Session, pares: List[Tuple[int, int]], conflictos: str) -> Dict[Tuple[int, int], int]:
+    # Sin commit. Devuelve la posición de cada par; uno que ya estaba en la lista conserva su lugar
+    if not pares:
+        return {}
+    ya = set()
+    for trozo in _trozos(pares):
+        ya.update(tuple(f) for f in session.execute(
+            sa_select(ListaEspera.estudiante_id, ListaEspera.curso_id)
+            .where(tuple_(ListaEspera.estudiante_id, ListaEspera.curso_id).in_(trozo))
+        ).all())
+    nuevos = [{"estudiante_id": e, "curso_id": c, "conflictos": conflictos} for e, c in dict.fromkeys(pares) if (e, c) not in ya]
+    if nuevos:
+        session.execute(insert(ListaEspera), nuevos)
+    posiciones = {}
+    for curso_id in {c for _, c in pares}:
+        orden = session.execute(
+            sa_select(ListaEspera.estudiante_id).where(ListaEspera.curso_id == curso_id).order_by(ListaEspera.id)
+        ).scalars()
+        posiciones.update(((e, curso_id), i) for i, e in enumerate(orden, 1))
+    return {p: posiciones[p] for p in pares}
+
+def quitar_de_espera(session: Session, pares: List[Tuple[int, int]]) -> int:
+    quitados = 0
+    for trozo in _trozos(pares):
+        quitados += session.execute(
+            delete(ListaEspera).where(tuple_(ListaEspera.estudiante_id, ListaEspera.curso_id).in_(trozo))
+        ).rowcount
+    return quitados
+
+def salir_de_espera(session: Session, estudiante_id: int, curso_id: int) -> Dict[str, Any]:
+    if not quitar_de_espera(session, [(estudiante_id, curso_id)]):
+        raise HTTPException(status_code=404, detail="El estudiante no está en la lista de espera del curso")
+    session.commit()
+    return {"message": "Solicitud retirada de la lista de espera"}
+
+def _curso_activo(session: Session, curso_id: int) -> Curso:
+    cur = session.get(Curso, curso_id)
+    if not cur or cur.is_deleted:
+        raise HTTPException(status_code=404, detail="Curso no encontrado")
+    return cur
+
+def estado_cupo(session: Session, curso_id: int) -> Dict[str, Any]:
+    cur = _curso_activo(session, curso_id)
+    fila = session.get(EstadisticaCurso, curso_id)
+    inscritos = fila.inscritos if fila else 0
+    en_espera = session.execute(
+        sa_select(func.count()).select_from(ListaEspera).where(ListaEspera.curso_id == curso_id)
+    ).scalar_one()
+    return {
+        "curso_id": curso_id,
+        "cupo": cur.cupo,
+        "inscritos": inscritos,
+        "libres": None if cur.cupo is None else max(0, cur.cupo - inscritos),
+        "en_espera": en_espera,
+    }
+
+def lista_de_espera(session: Session, curso_id: int, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    _curso_activo(session, curso_id)
+    q = (
+        select(ListaEspera.estudiante_id, ListaEspera.creado_en)
+        .where(ListaEspera.curso_id == curso_id)
+        .order_by(ListaEspera.id)
+        .offset(skip)
+        .limit(limit)
+    )
+    return [
+        {"estudiante_id": e, "posicion": i, "creado_en": creado}
+        for i, (e, creado) in enumerate(session.exec(q).all(), skip + 1)
+    ]
+
+
+# PROMOCIÓN (plazas liberadas -> primeros de la lista)
+
+def promover(engine: Engine) -> int:
+    from operations.operations_db import matricular_lote
+    with Session(engine) as session:
+        inscritos = func.coalesce(EstadisticaCurso.inscritos, 0)
+        candidatos = session.execute(
+            sa_select(Curso.id, Curso.cupo, inscritos)
+            .outerjoin(EstadisticaCurso, EstadisticaCurso.curso_id == Curso.id)
+            .where(
+                Curso.id.in_(sa_select(ListaEspera.curso_id)),
+                Curso.is_deleted == False,  # noqa: E712
+                or_(Curso.cupo.is_(None), inscritos < Curso.cupo),
+            )
+        ).all()
+    promovidas = 0
+    for curso_id, cupo, ocupadas in candidatos:
+        with Session(engine) as session:
+            q = select(ListaEspera).where(ListaEspera.curso_id == curso_id).order_by(ListaEspera.id)
+            if cupo is not None:
+                q = q.limit(cupo - ocupadas)
+            grupos: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+            for entrada in session.exec(q).all():
+                grupos[entrada.conflictos].append((entrada.estudiante_id, curso_id))
+            for modo, pares in grupos.items():
+                promovidas += matricular_lote(session, pares, conflictos=modo, desde_espera=True)["creadas"]
+    return promovidas
+
+
+# COLA DE MATRÍCULA (micro-lotes en el proceso de la API)
+
+def procesar(engine: Engine, solicitudes: List[Tuple[int, int, str]]) -> List[Dict[str, Any]]:
+    # Un micro-lote en orden de llegada: una transacción por política de horario (normalmente una sola)
+    from operations.operations_db import matricular_lote
+    resultados: List[Optional[Dict[str, Any]]] = [None] * len(solicitudes)
+    grupos: Dict[str, List[int]] = defaultdict(list)
+    for i, (_, _, modo) in enumerate(solicitudes):
+        grupos[modo].append(i)
+    with Session(engine) as session:
+        for modo, indices in grupos.items():
+            pares = [solicitudes[i][:2] for i in indices]
+            for i, fila in zip(indices, matricular_lote(session, pares, conflictos=modo, lista_espera=True)["resultados"]):
+                resultados[i] = fila
+    return resultados
+
+class Solicitud(NamedTuple):
+    estudiante_id: int
+    curso_id: int
+    conflictos: str
+    futuro: asyncio.Future
+
+class ColaMatriculas:
+    def __init__(self):
+        self.totales = {"solicitudes": 0, "lotes": 0, "promovidas": 0, "errores": 0}
+        self.max_lote = 0
+        self._pendientes: List[Solicitud] = []
+        self._hay: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._engine: Optional[Engine] = None
+
+    def iniciar(self, engine: Engine) -> None:
+        if self._tarea is None:
+            self._engine = engine
+            self._hay = asyncio.Event()
+            self._tarea = asyncio.get_running_loop().create_task(self._ciclo())
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        for s in self._pendientes:
+            if not s.futuro.done():
+                s.futuro.set_exception(HTTPException(status_code=503, detail="Cola de matrícula detenida"))
+        self._pendientes = []
+
+    async def solicitar(self, engine: Engine, estudiante_id: int, curso_id: int, conflictos: str = "marcar") -> Dict[str, Any]:
+        if conflictos not in horarios.MODOS_CONFLICTO:
+            raise HTTPException(status_code=400, detail=f"conflictos debe ser uno de {horarios.MODOS_CONFLICTO}")
+        self.iniciar(engine)
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes.append(Solicitud(estudiante_id, curso_id, conflictos, futuro))
+        self.totales["solicitudes"] += 1
+        self._hay.set()
+        return await futuro
+
+    async def _ciclo(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._hay.wait(), timeout=COLA_PROMOCION_S or None)
+            except asyncio.TimeoutError:
+                await self._promover()
+                continue
+            # Ventana de agrupación: lo que llegue mientras tanto va en el mismo lote
+            await asyncio.sleep(COLA_ESPERA_MS / 1000)
+            lote, self._pendientes = self._pendientes[:COLA_LOTE_MAX], self._pendientes[COLA_LOTE_MAX:]
+            if not self._pendientes:
+                self._hay.clear()
+            if not lote:
+                continue
+            self.totales["lotes"] += 1
+            self.max_lote = max(self.max_lote, len(lote))
+            try:
+                resultados = await asyncio.to_thread(
+                    procesar, self._engine, [(s.estudiante_id, s.curso_id, s.conflictos) for s in lote]
+                )
+            except Exception as e:
+                self.totales["errores"] += 1
+                if not isinstance(e, HTTPException):
+                    log.exception("Error al procesar un lote de la cola de matrícula")
+                    e = HTTPException(status_code=500, detail=f"Error al procesar la matrícula. Error: {e}")
+                for s in lote:
+                    if not s.futuro.done():
+                        s.futuro.set_exception(e)
+                continue
+            for s, resultado in zip(lote, resultados):
+                if not s.futuro.done():
+                    s.futuro.set_result(resultado)
+
+    async def _promover(self) -> None:
+        try:
+            self.totales["promovidas"] += await asyncio.to_thread(promover, self._engine)
+        except Exception:
+            self.totales["errores"] += 1
+            log.exception("Error al promover la lista de espera; se reintenta en el próximo ciclo")
+
+    def estado(self) -> Dict[str, Any]:
+        return {**self.totales, "pendientes": len(self._pendientes), "max_lote": self.max_lote}
+
+cola = ColaMatriculas()
+
+def gauges() -> Dict[Tuple[Tuple[str, str], ...], float]:
+    return {(("tipo", k),): v for k, v in cola.estado().items()}
+
+
+# CLI (python -m operations.cupos promover)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Asigna las plazas libres a la lista de espera, en orden de llegada")
+    parser.add_argument("comando", choices=("promover",))
+    parser.add_argument("--database-url", help="Por defecto DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from utils.db import crear_engine
+    from utils.migraciones import verificar
+    engine = crear_engine(args.database_url)
+    verificar(engine)
+    print(json.dumps({"promovidas": promover(engine)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import json
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, update, insert, delete, select as sa_select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from data.models import (
+    Estudiante, Curso, Matricula,
+    EstadisticaCurso, EstadisticaEstudiante, EstadisticaSemestre,
+)
+
+# Contadores:
+#   EstadisticaCurso.inscritos       -> matrículas del curso con estudiante activo
+#   EstadisticaEstudiante.cursos     -> matrículas del estudiante en cursos activos
+#   EstadisticaEstudiante.creditos   -> suma de créditos de esos cursos
+#   EstadisticaSemestre.estudiantes  -> estudiantes activos por semestre
+# Los hooks al_* se llaman antes del commit de cada operación de escritura.
+
+_CLAVES = {
+    EstadisticaCurso: "curso_id",
+    EstadisticaEstudiante: "estudiante_id",
+    EstadisticaSemestre: "semestre",
+}
+
+
+# INCREMENTOS ATÓMICOS
+
+def _sumar(session: Session, modelo, filas: List[Dict[str, int]]) -> None:
+    # filas: [{clave: id, contador: delta, ...}]; crea la fila si no existe
+    filas = [f for f in filas if any(v for k, v in f.items() if k != _CLAVES[modelo])]
+    if not filas:
+        return
+    clave = _CLAVES[modelo]
+    contadores = [k for k in filas[0] if k != clave]
+    dialecto = session.get_bind().dialect.name
+    if dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(modelo)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[clave],
+            set_={c: getattr(modelo, c) + getattr(stmt.excluded, c) for c in contadores},
+        )
+        session.execute(stmt, filas)
+        return
+    for fila in filas:
+        valores = {c: getattr(modelo, c) + fila[c] for c in contadores}
+        res = session.execute(update(modelo).where(getattr(modelo, clave) == fila[clave]).values(**valores))
+        if res.rowcount == 0:
+            session.execute(insert(modelo).values(**fila))
+
+def sumar_si(session: Session, modelo, fila: Dict[str, int], condicion=None) -> bool:
+    # Un incremento con la condición en la misma sentencia (límites de matrícula, cupos.py): False si la fila
+    # existe y no la cumple. Sin lectura previa, dos transacciones no pueden pasar el mismo límite
+    clave = _CLAVES[modelo]
+    contadores = [k for k in fila if k != clave]
+    dialecto = session.get_bind().dialect.name
+    if dialecto in ("sqlite", "postgresql"):
+        if dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(modelo).values(**fila)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[clave],
+            set_={c: getattr(modelo, c) + getattr(stmt.excluded, c) for c in contadores},
+            where=condicion,
+        )
+        return session.execute(stmt).rowcount > 0
+    q = update(modelo).where(getattr(modelo, clave) == fila[clave])
+    if condicion is not None:
+        q = q.where(condicion)
+    if session.execute(q.values(**{c: getattr(modelo, c) + fila[c] for c in contadores})).rowcount:
+        return True
+    if session.execute(sa_select(getattr(modelo, clave)).where(getattr(modelo, clave) == fila[clave])).first():
+        return False
+    session.execute(insert(modelo).values(**fila))
+    return True
+
+def _trozos(ids: List[int], n: int = 500) -> Iterable[List[int]]:
+    # Listas IN acotadas (límite de parámetros de SQLite)
+    for i in range(0, len(ids), n):
+        yield ids[i:i + n]
+
+def _creditos(session: Session, curso_ids: Iterable[int]) -> Dict[int, int]:
+    ids = set(curso_ids)
+    if not ids:
+        return {}
+    return dict(session.exec(select(Curso.id, Curso.creditos).where(Curso.id.in_(ids))).all())
+
+
+# HOOKS DE ESCRITURA
+
+def al_crear_estudiante(session: Session, semestre: int, n: int = 1) -> None:
+    _sumar(session, EstadisticaSemestre, [{"semestre": semestre, "estudiantes": n}])
+
+def al_cambiar_semestre(session: Session, anterior: int, nuevo: int) -> None:
+    if anterior != nuevo:
+        _sumar(session, EstadisticaSemestre, [
+            {"semestre": anterior, "estudiantes": -1},
+            {"semestre": nuevo, "estudiantes": 1},
+        ])
+
+def al_matricular(session: Session, pares: Iterable[Tuple[int, int]], signo: int = 1) -> None:
+    # Pares con estudiante y curso activos
+    pares = list(pares)
+    if not pares:
+        return
+    creditos = _creditos(session, (c for _, c in pares))
+    por_curso = Counter(c for _, c in pares)
+    por_estudiante: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    for e, c in pares:
+        por_estudiante[e][0] += 1
+        por_estudiante[e][1] += creditos.get(c, 0)
+    _sumar(session, EstadisticaCurso, [{"curso_id": c, "inscritos": signo * n} for c, n in por_curso.items()])
+    _sumar(session, EstadisticaEstudiante, [
+        {"estudiante_id": e, "cursos": signo * n, "creditos": signo * cr} for e, (n, cr) in por_estudiante.items()
+    ])
+
+def al_desmatricular(session: Session, est: Estudiante, cur: Curso) -> None:
+    # Solo se descuenta lo que estaba contado según el estado de cada lado
+    if not est.is_deleted:
+        _sumar(session, EstadisticaCurso, [{"curso_id": cur.id, "inscritos": -1}])
+    if not cur.is_deleted:
+        _sumar(session, EstadisticaEstudiante, [
+            {"estudiante_id": est.id, "cursos": -1, "creditos": -cur.creditos}
+        ])
+
+def al_cambiar_estado_estudiante(session: Session, est: Estudiante, activo: bool) -> None:
+    al_cambiar_estado_estudiantes(session, [(est.id, est.semestre)], activo)
+
+def al_cambiar_estado_estudiantes(session: Session, filas: Iterable[Tuple[int, int]], activo: bool) -> None:
+    # filas: (id, semestre) de los estudiantes que cambiaron de estado
+    signo = 1 if activo else -1
+    filas = list(filas)
+    por_semestre = Counter(s for _, s in filas)
+    _sumar(session, EstadisticaSemestre, [{"semestre": s, "estudiantes": signo * n} for s, n in por_semestre.items()])
+    por_curso: Counter = Counter()
+    for trozo in _trozos([e for e, _ in filas]):
+        # Se cuenta aquí: con GROUP BY SQLite prefiere recorrer el índice por curso entero
+        por_curso.update(session.exec(select(Matricula.curso_id).where(Matricula.estudiante_id.in_(trozo))).all())
+    _sumar(session, EstadisticaCurso, [{"curso_id": c, "inscritos": signo * n} for c, n in por_curso.items()])
+
+def al_cambiar_estado_curso(session: Session, cur: Curso, activo: bool) -> None:
+    al_cambiar_estado_cursos(session, [(cur.id, cur.creditos)], activo)
+
+def al_cambiar_estado_cursos(session: Session, filas: Iterable[Tuple[int, int]], activo: bool) -> None:
+    # filas: (id, creditos) de los cursos que cambiaron de estado
+    signo = 1 if activo else -1
+    creditos = dict(filas)
+    por_estudiante: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    for trozo in _trozos(list(creditos)):
+        q = select(Matricula.estudiante_id, Matricula.curso_id).where(Matricula.curso_id.in_(trozo))
+        for e, c in session.exec(q).all():
+            por_estudiante[e][0] += 1
+            por_estudiante[e][1] += creditos[c]
+    _sumar(session, EstadisticaEstudiante, [
+        {"estudiante_id": e, "cursos": signo * n, "creditos": signo * cr} for e, (n, cr) in por_estudiante.items()
+    ])
+
+def al_desarchivar(session: Session, modelo, ids: List[int]) -> None:
+    # Las filas vuelven del archivo todavía eliminadas y sin contadores propios: se recalculan
+    # desde sus matrículas (no dependen del estado de la propia fila)
+    for trozo in _trozos(ids):
+        if modelo is Estudiante:
+            _reconciliar_tabla(session, EstadisticaEstudiante, _esperado_estudiantes(session, trozo), trozo)
+        else:
+            _reconciliar_tabla(session, EstadisticaCurso, _esperado_cursos(session, trozo), trozo)
+
+def al_cambiar_creditos(session: Session, curso_id: int, delta: int) -> None:
+    if not delta:
+        return
+    estudiantes = session.exec(select(Matricula.estudiante_id).where(Matricula.curso_id == curso_id)).all()
+    _sumar(session, EstadisticaEstudiante, [
+        {"estudiante_id": e, "cursos": 0, "creditos": delta} for e in estudiantes
+    ])
+
+def al_importar(session: Session, modelo, nuevas: List[Dict[str, Any]], cambios: List[Dict[str, Any]]) -> None:
+    # Llamar antes del UPDATE masivo: compara contra los valores aún guardados
+    ids = [c["id"] for c in cambios]
+    if modelo is Estudiante:
+        deltas = Counter(f["semestre"] for f in nuevas)
+        if ids:
+            previos = session.exec(
+                select(Estudiante.id, Estudiante.semestre)
+                .where(Estudiante.id.in_(ids), Estudiante.is_deleted == False)  # noqa: E712
+            ).all()
+            nuevos = {c["id"]: c.get("semestre") for c in cambios}
+            for est_id, semestre in previos:
+                if nuevos[est_id] is not None and nuevos[est_id] != semestre:
+                    deltas[semestre] -= 1
+                    deltas[nuevos[est_id]] += 1
+        _sumar(session, EstadisticaSemestre, [{"semestre": k, "estudiantes": v} for k, v in deltas.items()])
+    elif modelo is Curso and ids:
+        previos = session.exec(
+            select(Curso.id, Curso.creditos).where(Curso.id.in_(ids), Curso.is_deleted == False)  # noqa: E712
+        ).all()
+        nuevos = {c["id"]: c.get("creditos") for c in cambios}
+        for curso_id, creditos in previos:
+            if nuevos[curso_id] is not None:
+                al_cambiar_creditos(session, curso_id, nuevos[curso_id] - creditos)
+
+
+
+# LECTURAS O(1)
+
+def _existe_activo(session: Session, modelo, obj_id: int, detalle: str) -> None:
+    obj = session.get(modelo, obj_id)
+    if not obj or obj.is_deleted:
+        raise HTTPException(status_code=404, detail=detalle)
+
+def estadistica_curso(session: Session, curso_id: int) -> Dict[str, Any]:
+    _existe_activo(session, Curso, curso_id, "Curso no encontrado")
+    fila = session.get(EstadisticaCurso, curso_id)
+    return {"curso_id": curso_id, "inscritos": fila.inscritos if fila else 0}
+
+def estadistica_estudiante(session: Session, estudiante_id: int) -> Dict[str, Any]:
+    _existe_activo(session, Estudiante, estudiante_id, "Estudiante no encontrado")
+    fila = session.get(EstadisticaEstudiante, estudiante_id)
+    return {
+        "estudiante_id": estudiante_id,
+        "cursos": fila.cursos if fila else 0,
+        "creditos": fila.creditos if fila else 0,
+    }
+
+def cursos_mas_inscritos(session: Session, limit: int = 10) -> List[Dict[str, Any]]:
+    q = (
+        select(EstadisticaCurso.curso_id, Curso.codigo, Curso.nombre, EstadisticaCurso.inscritos)
+        .join(Curso, Curso.id == EstadisticaCurso.curso_id)
+        .where(Curso.is_deleted == False)  # noqa: E712
+        .order_by(EstadisticaCurso.inscritos.desc())
+        .limit(limit)
+    )
+    return [dict(r._mapping) for r in session.exec(q).all()]
+
+def distribucion_semestres(session: Session) -> List[Dict[str, Any]]:
+    q = select(EstadisticaSemestre).where(EstadisticaSemestre.estudiantes != 0).order_by(EstadisticaSemestre.semestre)
+    return [{"semestre": f.semestre, "estudiantes": f.estudiantes} for f in session.exec(q).all()]
+
+
+# DESGLOSES AD HOC (GROUP BY sobre las tablas base)
+
+DESGLOSES = ("semestre", "creditos", "curso")
+
+def desglose(session: Session, por: str) -> List[Dict[str, Any]]:
+    if por == "semestre":
+        columnas = (
+            Estudiante.semestre,
+            func.count(func.distinct(Matricula.estudiante_id)).label("estudiantes"),
+            func.count().label("matriculas"),
+            func.sum(Curso.creditos).label("creditos"),
+        )
+        agrupar = (Estudiante.semestre,)
+    elif por == "creditos":
+        columnas = (
+            Curso.creditos,
+            func.count(func.distinct(Matricula.curso_id)).label("cursos"),
+            func.count().label("matriculas"),
+        )
+        agrupar = (Curso.creditos,)
+    elif por == "curso":
+        columnas = (
+            Curso.id.label("curso_id"), Curso.codigo,
+            func.count().label("inscritos"),
+            func.avg(Estudiante.semestre).label("semestre_promedio"),
+        )
+        agrupar = (Curso.id, Curso.codigo)
+    else:
+        raise HTTPException(status_code=400, detail=f"por debe ser uno de {DESGLOSES}")
+    q = (
+        sa_select(*columnas)
+        .select_from(Matricula)
+        .join(Estudiante, Estudiante.id == Matricula.estudiante_id)
+        .join(Curso, Curso.id == Matricula.curso_id)
+        .where(Estudiante.is_deleted == False, Curso.is_deleted == False)  # noqa: E712
+        .group_by(*agrupar)
+        .order_by(*agrupar)
+    )
+    return [dict(r._mapping) for r in session.execute(q).all()]
+
+
+# RECONCILIACIÓN (recalcula desde cero y corrige la deriva)
+
+def _esperado_cursos(session: Session, ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+    q = (
+        select(Matricula.curso_id, func.count())
+        .join(Estudiante, Estudiante.id == Matricula.estudiante_id)
+        .where(Estudiante.is_deleted == False)  # noqa: E712
+        .group_by(Matricula.curso_id)
+    )
+    if ids is not None:
+        q = q.where(Matricula.curso_id.in_(set(ids)))
+    return {c: {"inscritos": n} for c, n in session.exec(q).all()}
+
+def _esperado_estudiantes(session: Session, ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+    q = (
+        select(Matricula.estudiante_id, func.count(), func.sum(Curso.creditos))
+        .join(Curso, Curso.id == Matricula.curso_id)
+        .where(Curso.is_deleted == False)  # noqa: E712
+        .group_by(Matricula.estudiante_id)
+    )
+    if ids is not None:
+        q = q.where(Matricula.estudiante_id.in_(set(ids)))
+    return {e: {"cursos": n, "creditos": cr or 0} for e, n, cr in session.exec(q).all()}
+
+def _esperado_semestres(session: Session) -> Dict[int, Dict[str, int]]:
+    q = (
+        select(Estudiante.semestre, func.count())
+        .where(Estudiante.is_deleted == False)  # noqa: E712
+        .group_by(Estudiante.semestre)
+    )
+    return {s: {"estudiantes": n} for s, n in session.exec(q).all()}
+
+def _reconciliar_tabla(session: Session, modelo, esperado: Dict[int, Dict[str, int]],
+                       ids: Optional[Iterable[int]] = None) -> int:
+    clave = _CLAVES[modelo]
+    q = select(modelo)
+    if ids is not None:
+        q = q.where(getattr(modelo, clave).in_(set(ids)))
+    actuales = {getattr(f, clave): f for f in session.exec(q).all()}
+    corregidas = 0
+    for k, fila in actuales.items():
+        valores = esperado.get(k)
+        if valores is None:
+            if any(getattr(fila, c) for c in type(fila).model_fields if c != clave):
+                session.execute(delete(modelo).where(getattr(modelo, clave) == k))
+                corregidas += 1
+        elif any(getattr(fila, c) != v for c, v in valores.items()):
+            session.execute(update(modelo).where(getattr(modelo, clave) == k).values(**valores))
+            corregidas += 1
+    faltantes = [{clave: k, **v} for k, v in esperado.items() if k not in actuales]
+    if faltantes:
+        session.execute(insert(modelo), faltantes)
+        corregidas += len(faltantes)
+    return corregidas
+
+def reconciliar(session: Session, estudiante_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    try:
+        if estudiante_ids is not None:
+            ids = set(estudiante_ids)
+            resultado = {"estudiantes": _reconciliar_tabla(
+                session, EstadisticaEstudiante, _esperado_estudiantes(session, ids), ids
+            )}
+        else:
+            resultado = {
+                "cursos": _reconciliar_tabla(session, EstadisticaCurso, _esperado_cursos(session)),
+                "estudiantes": _reconciliar_tabla(session, EstadisticaEstudiante, _esperado_estudiantes(session)),
+                "semestres": _reconciliar_tabla(session, EstadisticaSemestre, _esperado_semestres(session)),
+            }
+        session.commit()
+        return resultado
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al reconciliar estadísticas. Error: {str(e)}")
+
+def inicializar(engine) -> None:
+    # Con una base existente y contadores vacíos (primer arranque tras añadirlos) se calculan una vez
+    with Session(engine) as session:
+        vacios = session.exec(select(EstadisticaSemestre.semestre).limit(1)).first() is None
+        if vacios and session.exec(select(Estudiante.id).limit(1)).first() is not None:
+            reconciliar(session)
+
+
+
+# CLI (python -m operations.estadisticas)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Recalcula los contadores de estadísticas y corrige la deriva")
+    parser.add_argument("--database-url", help="Por defecto DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from utils.db import crear_engine
+    from utils.migraciones import verificar
+    engine = crear_engine(args.database_url)
+    verificar(engine)
+    with Session(engine) as session:
+        print(json.dumps(reconciliar(session), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from data.models import Estudiante, Curso, Matricula
+from operations.operations_db import consulta_estudiantes, consulta_cursos
+
+FORMATOS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+YIELD_PER = 1000
+
+
+# CONSULTAS (columnas, no entidades: sin identity map ni objetos ORM por fila)
+
+def _consulta_estudiantes(include_deleted: bool = False, semestre: Optional[int] = None,
+                          nombre: Optional[str] = None, dialecto: Optional[str] = None):
+    cols = (Estudiante.id, Estudiante.cedula, Estudiante.nombre, Estudiante.email, Estudiante.semestre)
+    q = consulta_estudiantes(include_deleted, semestre, nombre, dialecto)
+    return q.with_only_columns(*cols).order_by(Estudiante.id)
+
+def _consulta_cursos(include_deleted: bool = False, creditos: Optional[int] = None,
+                     codigo: Optional[str] = None, nombre: Optional[str] = None, dialecto: Optional[str] = None):
+    cols = (Curso.id, Curso.codigo, Curso.nombre, Curso.creditos, Curso.horario)
+    q = consulta_cursos(include_deleted, creditos, codigo, nombre, dialecto)
+    return q.with_only_columns(*cols).order_by(Curso.id)
+
+def _consulta_matriculas(modo: str = "roster", curso_id: Optional[int] = None, estudiante_id: Optional[int] = None):
+    if modo == "ids":
+        q = select(Matricula.estudiante_id, Matricula.curso_id)
+    else:
+        # Roster: una sola pasada por Matricula unida a ambos lados, solo filas activas
+        q = (
+            select(
+                Matricula.curso_id, Curso.codigo.label("curso_codigo"), Curso.nombre.label("curso_nombre"),
+                Curso.creditos, Matricula.estudiante_id, Estudiante.cedula,
+                Estudiante.nombre.label("estudiante_nombre"), Estudiante.email, Estudiante.semestre,
+            )
+            .join(Curso, Curso.id == Matricula.curso_id)
+            .join(Estudiante, Estudiante.id == Matricula.estudiante_id)
+            .where(Curso.is_deleted == False, Estudiante.is_deleted == False)  # noqa: E712
+        )
+    if curso_id is not None:
+        q = q.where(Matricula.curso_id == curso_id)
+    if estudiante_id is not None:
+        q = q.where(Matricula.estudiante_id == estudiante_id)
+    return q.order_by(Matricula.curso_id, Matricula.estudiante_id)
+
+
+# STREAMING
+
+def _filas(engine: Engine, stmt) -> Iterator[Sequence[Any]]:
+    # yield_per activa cursores de servidor (stream_results) donde el driver los soporta
+    with Session(engine) as session:
+        resultado = session.execute(stmt.execution_options(yield_per=YIELD_PER))
+        yield list(resultado.keys())
+        for particion in resultado.partitions():
+            yield from particion
+
+def _a_csv(filas: Iterator[Sequence[Any]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for n, fila in enumerate(filas):
+        writer.writerow(fila)
+        if n % YIELD_PER == 0 or buffer.tell() > 64 * 1024:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def _a_ndjson(filas: Iterator[Sequence[Any]]) -> Iterator[bytes]:
+    columnas = next(filas)
+    partes = []
+    for fila in filas:
+        partes.append(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False))
+        if len(partes) >= YIELD_PER:
+            yield ("\n".join(partes) + "\n").encode()
+            partes = []
+    if partes:
+        yield ("\n".join(partes) + "\n").encode()
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for chunk in chunks:
+        comprimido = compresor.compress(chunk)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+def exportar(engine: Engine, tipo: str, formato: str = "csv", comprimir: bool = False,
+             filtros: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    consultas = {"estudiantes": _consulta_estudiantes, "cursos": _consulta_cursos, "matriculas": _consulta_matriculas}
+    if tipo not in consultas:
+        raise HTTPException(status_code=400, detail=f"Tipo de exportación no soportado: {tipo}")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato} (use csv o ndjson)")
+    filtros = dict(filtros or {})
+    if tipo != "matriculas":
+        filtros["dialecto"] = engine.dialect.name  # nombre= y codigo= van por el índice de búsqueda
+    stmt = consultas[tipo](**filtros)
+    filas = _filas(engine, stmt)
+    chunks = _a_csv(filas) if formato == "csv" else _a_ndjson(filas)
+    return _gzip(chunks) if comprimir else chunks
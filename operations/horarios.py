@@ -0,0 +1,273 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session, select
+
+from data.models import Curso, Matricula, Estudiante, FranjaHorario, OcupacionEstudiante
+from utils import horario as horarios
+
+# La ocupación de cada estudiante (OR de las máscaras de sus cursos activos) se guarda
+# precalculada, así que comprobar un choque al matricular es un AND entre dos enteros.
+# Se actualiza con OR al matricular y se recalcula (pocos cursos por estudiante)
+# cuando una matrícula se elimina o un curso cambia de horario o de estado.
+
+MODOS_CONFLICTO = ("rechazar", "marcar", "ignorar")
+
+
+# FRANJAS Y MÁSCARAS
+
+def guardar_franjas(session: Session, curso_id: int, horario: Optional[str]) -> None:
+    session.execute(delete(FranjaHorario).where(FranjaHorario.curso_id == curso_id))
+    franjas = horarios.parsear(horario or "")
+    if franjas:
+        session.execute(insert(FranjaHorario), [{"curso_id": curso_id, **f._asdict()} for f in franjas])
+
+def mascaras_cursos(session: Session, curso_ids: Iterable[int]) -> Dict[int, int]:
+    ids = set(curso_ids)
+    if not ids:
+        return {}
+    q = select(FranjaHorario.curso_id, FranjaHorario.dia, FranjaHorario.inicio, FranjaHorario.fin).where(
+        FranjaHorario.curso_id.in_(ids)
+    )
+    por_curso: Dict[int, List[horarios.Franja]] = defaultdict(list)
+    for curso_id, dia, inicio, fin in session.exec(q).all():
+        por_curso[curso_id].append(horarios.Franja(dia, inicio, fin))
+    return {c: horarios.mascara(por_curso.get(c, ())) for c in ids}
+
+def _cursos_activos_de(session: Session, estudiante_ids: Iterable[int]) -> Dict[int, List[int]]:
+    ids = set(estudiante_ids)
+    q = (
+        select(Matricula.estudiante_id, Matricula.curso_id)
+        .join(Curso, Curso.id == Matricula.curso_id)
+        .where(Matricula.estudiante_id.in_(ids), Curso.is_deleted == False)  # noqa: E712
+    )
+    cursos: Dict[int, List[int]] = {e: [] for e in ids}
+    for e, c in session.exec(q).all():
+        cursos[e].append(c)
+    return cursos
+
+def ocupaciones(session: Session, estudiante_ids: Iterable[int]) -> Dict[int, int]:
+    ids = set(estudiante_ids)
+    if not ids:
+        return {}
+    q = select(OcupacionEstudiante.estudiante_id, OcupacionEstudiante.mascara).where(
+        OcupacionEstudiante.estudiante_id.in_(ids)
+    )
+    guardadas = {e: horarios.desde_hex(m) for e, m in session.exec(q).all()}
+    return {e: guardadas.get(e, 0) for e in ids}
+
+def _guardar_ocupaciones(session: Session, valores: Dict[int, int]) -> None:
+    if not valores:
+        return
+    existentes = set(session.exec(
+        select(OcupacionEstudiante.estudiante_id).where(OcupacionEstudiante.estudiante_id.in_(set(valores)))
+    ).all())
+    filas = [{"estudiante_id": e, "mascara": horarios.a_hex(m)} for e, m in valores.items()]
+    nuevas = [f for f in filas if f["estudiante_id"] not in existentes]
+    cambios = [f for f in filas if f["estudiante_id"] in existentes]
+    if nuevas:
+        session.execute(insert(OcupacionEstudiante), nuevas)
+    if cambios:
+        session.execute(update(OcupacionEstudiante), cambios)
+
+def recalcular_ocupacion(session: Session, estudiante_ids: Iterable[int]) -> None:
+    cursos = _cursos_activos_de(session, estudiante_ids)
+    mascaras = mascaras_cursos(session, (c for lista in cursos.values() for c in lista))
+    valores = {}
+    for e, lista in cursos.items():
+        total = 0
+        for c in lista:
+            total |= mascaras[c]
+        valores[e] = total
+    _guardar_ocupaciones(session, valores)
+
+
+# HOOKS DE ESCRITURA (antes del commit, como los de estadisticas)
+
+def al_matricular(session: Session, pares: Iterable[Tuple[int, int]]) -> None:
+    pares = list(pares)
+    if not pares:
+        return
+    mascaras = mascaras_cursos(session, (c for _, c in pares))
+    actuales = ocupaciones(session, (e for e, _ in pares))
+    for e, c in pares:
+        actuales[e] |= mascaras[c]
+    _guardar_ocupaciones(session, actuales)
+
+def al_desmatricular(session: Session, estudiante_id: int) -> None:
+    recalcular_ocupacion(session, [estudiante_id])
+
+def al_cambiar_curso(session: Session, curso_id: int, horario: Optional[str] = None, nuevo_horario: bool = False) -> None:
+    # Cambio de horario (nuevo_horario=True) o de estado del curso: se recalculan sus estudiantes
+    if nuevo_horario:
+        guardar_franjas(session, curso_id, horario)
+    estudiantes = session.exec(select(Matricula.estudiante_id).where(Matricula.curso_id == curso_id)).all()
+    if estudiantes:
+        recalcular_ocupacion(session, estudiantes)
+
+def al_cambiar_estado_cursos(session: Session, curso_ids: List[int]) -> None:
+    # Borrado o restauración masivos: una consulta por trozo de cursos y otra por trozo de estudiantes
+    estudiantes = set()
+    for i in range(0, len(curso_ids), 500):
+        estudiantes.update(session.exec(
+            select(Matricula.estudiante_id).where(Matricula.curso_id.in_(curso_ids[i:i + 500]))
+        ).all())
+    estudiantes = sorted(estudiantes)
+    for i in range(0, len(estudiantes), 500):
+        recalcular_ocupacion(session, estudiantes[i:i + 500])
+
+def al_desarchivar(session: Session, modelo, ids: List[int]) -> None:
+    # Al archivar se borran las franjas del curso y la ocupación del estudiante; se reconstruyen
+    for i in range(0, len(ids), 500):
+        trozo = ids[i:i + 500]
+        if modelo is Estudiante:
+            recalcular_ocupacion(session, trozo)
+            continue
+        for curso_id, horario in session.exec(select(Curso.id, Curso.horario).where(Curso.id.in_(trozo))).all():
+            try:
+                guardar_franjas(session, curso_id, horario)
+            except ValueError:
+                continue  # horario anterior a la validación: sin franjas, como en inicializar
+
+def al_importar_cursos(session: Session, filas: List[Dict[str, Any]]) -> None:
+    # Llamar después de insertar/actualizar el bloque: las filas nuevas ya tienen id
+    if not filas:
+        return
+    ids = dict(session.exec(select(Curso.codigo, Curso.id).where(Curso.codigo.in_([f["codigo"] for f in filas]))).all())
+    for fila in filas:
+        guardar_franjas(session, ids[fila["codigo"]], fila.get("horario"))
+    estudiantes = session.exec(
+        select(Matricula.estudiante_id).where(Matricula.curso_id.in_(list(ids.values()))).distinct()
+    ).all()
+    if estudiantes:
+        recalcular_ocupacion(session, estudiantes)
+
+
+# CONFLICTOS
+
+def _chocan_con(session: Session, estudiante_id: int, mascara: int) -> List[int]:
+    # Solo se llega aquí si ya hubo choque con la ocupación: identifica los cursos
+    cursos = _cursos_activos_de(session, [estudiante_id])[estudiante_id]
+    return sorted(c for c, m in mascaras_cursos(session, cursos).items() if m & mascara)
+
+def choque(session: Session, estudiante_id: int, curso_id: int) -> int:
+    # Una sola consulta: franjas del curso + ocupación guardada del estudiante.
+    # Devuelve la máscara del curso si choca con la ocupación, 0 si no.
+    ocupacion = select(OcupacionEstudiante.mascara).where(
+        OcupacionEstudiante.estudiante_id == estudiante_id
+    ).scalar_subquery()
+    filas = session.exec(
+        select(FranjaHorario.dia, FranjaHorario.inicio, FranjaHorario.fin, ocupacion)
+        .where(FranjaHorario.curso_id == curso_id)
+    ).all()
+    if not filas:
+        return 0
+    mascara = horarios.mascara(horarios.Franja(d, i, f) for d, i, f, _ in filas)
+    return mascara if horarios.desde_hex(filas[0][3]) & mascara else 0
+
+def conflictos_matricula(session: Session, estudiante_id: int, curso_id: int) -> List[int]:
+    mascara = choque(session, estudiante_id, curso_id)
+    if not mascara:
+        return []
+    return [c for c in _chocan_con(session, estudiante_id, mascara) if c != curso_id]
+
+def aplicar_politica(session: Session, estudiante_id: int, curso_id: int, modo: str) -> List[int]:
+    if modo not in MODOS_CONFLICTO:
+        raise HTTPException(status_code=400, detail=f"conflictos debe ser uno de {MODOS_CONFLICTO}")
+    if modo == "ignorar":
+        return []
+    choques = conflictos_matricula(session, estudiante_id, curso_id)
+    if choques and modo == "rechazar":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Choque de horario con cursos ya matriculados: {choques}",
+        )
+    return choques
+
+def filtrar_lote(session: Session, pares: List[Tuple[int, int]], rechazar: bool) -> set:
+    # Pares que chocan con la ocupación actual o con otro par anterior del mismo lote;
+    # si no se rechazan, su horario también cuenta para los pares siguientes
+    mascaras = mascaras_cursos(session, (c for _, c in pares))
+    ocupado = ocupaciones(session, (e for e, _ in pares))
+    chocan = set()
+    for e, c in pares:
+        if ocupado[e] & mascaras[c]:
+            chocan.add((e, c))
+            if rechazar:
+                continue
+        ocupado[e] |= mascaras[c]
+    return chocan
+
+def verificar(session: Session, estudiante_id: int, curso_ids: List[int]) -> Dict[str, Any]:
+    est = session.get(Estudiante, estudiante_id)
+    if not est or est.is_deleted:
+        raise HTTPException(status_code=404, detail="Estudiante no encontrado")
+    propuestos = list(dict.fromkeys(curso_ids))
+    activos = set(session.exec(
+        select(Curso.id).where(Curso.id.in_(propuestos), Curso.is_deleted == False)  # noqa: E712
+    ).all())
+    faltantes = [c for c in propuestos if c not in activos]
+    if faltantes:
+        raise HTTPException(status_code=404, detail=f"Cursos no encontrados: {faltantes}")
+
+    actuales = [c for c in _cursos_activos_de(session, [estudiante_id])[estudiante_id] if c not in activos]
+    mascaras = mascaras_cursos(session, propuestos + actuales)
+    ocupado = 0
+    for c in actuales:
+        ocupado |= mascaras[c]
+
+    resultados = []
+    for c in propuestos:
+        conflictos = []
+        if mascaras[c] & ocupado:
+            conflictos += [a for a in actuales if mascaras[a] & mascaras[c]]
+        conflictos += [o for o in propuestos if o != c and mascaras[o] & mascaras[c]]
+        resultados.append({"curso_id": c, "conflictos_con": sorted(conflictos)})
+    return {
+        "estudiante_id": estudiante_id,
+        "compatible": not any(r["conflictos_con"] for r in resultados),
+        "resultados": resultados,
+    }
+
+def horario_estudiante(session: Session, estudiante_id: int) -> List[Dict[str, Any]]:
+    est = session.get(Estudiante, estudiante_id)
+    if not est or est.is_deleted:
+        raise HTTPException(status_code=404, detail="Estudiante no encontrado")
+    cursos = _cursos_activos_de(session, [estudiante_id])[estudiante_id]
+    if not cursos:
+        return []
+    q = (
+        select(FranjaHorario.curso_id, Curso.codigo, FranjaHorario.dia, FranjaHorario.inicio, FranjaHorario.fin)
+        .join(Curso, Curso.id == FranjaHorario.curso_id)
+        .where(FranjaHorario.curso_id.in_(cursos))
+        .order_by(FranjaHorario.dia, FranjaHorario.inicio)
+    )
+    return [
+        {"curso_id": c, "codigo": codigo, "franja": horarios.a_texto(horarios.Franja(dia, inicio, fin))}
+        for c, codigo, dia, inicio, fin in session.exec(q).all()
+    ]
+
+
+# ARRANQUE
+
+def inicializar(engine) -> None:
+    # Bases creadas antes de existir franja_horario: se parsean los horarios una vez.
+    # Los textos que no siguen el formato se dejan sin franjas (no generan choques).
+    with Session(engine) as session:
+        if session.exec(select(FranjaHorario.id).limit(1)).first() is not None:
+            return
+        cursos = session.exec(select(Curso.id, Curso.horario).where(Curso.horario != "")).all()
+        con_franjas = 0
+        for curso_id, horario in cursos:
+            try:
+                guardar_franjas(session, curso_id, horario)
+                con_franjas += 1
+            except ValueError:
+                continue
+        if con_franjas:
+            estudiantes = session.exec(select(Matricula.estudiante_id).distinct()).all()
+            for i in range(0, len(estudiantes), 500):
+                recalcular_ocupacion(session, estudiantes[i:i + 500])
+        session.commit()
@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, select
+
+from data.models import Estudiante, Curso
+from data.schemas import EstudianteCreate, CursoCreate
+from operations import estadisticas, horarios
+from operations import cambios as feed  # `cambios` es el nombre local de las filas a actualizar
+from operations.operations_db import invalidar_cache_estudiantes, invalidar_cache_cursos
+
+# modelo -> (tabla, schema de validación, clave única)
+MODELOS = {
+    "estudiantes": (Estudiante, EstudianteCreate, "cedula"),
+    "cursos": (Curso, CursoCreate, "codigo"),
+}
+INVALIDAR = {Estudiante: invalidar_cache_estudiantes, Curso: invalidar_cache_cursos}
+FORMATOS = ("csv", "ndjson")
+MODOS = ("skip", "upsert")
+MAX_RECHAZOS_REPORTADOS = 1000
+
+
+# LECTURA INCREMENTAL
+
+def _filas_csv(lineas: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+    for n, fila in enumerate(csv.DictReader(lineas), start=2):
+        yield n, {k: v for k, v in fila.items() if k is not None and v not in (None, "")}
+
+def _filas_ndjson(lineas: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+    for n, linea in enumerate(lineas, start=1):
+        if not linea.strip():
+            continue
+        try:
+            yield n, json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield n, e
+
+def leer_filas(lineas: Iterable[str], formato: str) -> Iterator[Tuple[int, Any]]:
+    if formato == "csv":
+        return _filas_csv(lineas)
+    if formato == "ndjson":
+        return _filas_ndjson(lineas)
+    raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}")
+
+def formato_desde_nombre(nombre: Optional[str], defecto: str = "csv") -> str:
+    if nombre and nombre.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if nombre and nombre.lower().endswith(".csv"):
+        return "csv"
+    return defecto
+
+
+# ESCRITURA POR BLOQUES
+
+def _guardar_bloque(session: Session, modelo, clave: str, bloque: List[Dict[str, Any]], modo: str) -> Tuple[int, int, int]:
+    columna = getattr(modelo, clave)
+    claves = [fila[clave] for fila in bloque]
+    existentes = {
+        valor: (id_, version)
+        for valor, id_, version in session.exec(
+            select(columna, modelo.id, modelo.version).where(columna.in_(claves))
+        ).all()
+    }
+
+    nuevas = [fila for fila in bloque if fila[clave] not in existentes]
+    if nuevas:
+        ids_nuevos = session.execute(insert(modelo).values(nuevas).returning(modelo.id)).scalars().all()
+        feed.al_escribir(session, modelo.__tablename__, "crear", sorted(ids_nuevos))
+
+    cambios = []
+    if modo == "upsert":
+        # Con la versión leída el UPDATE por PK la incrementa y falla (StaleDataError) si otro la cambió
+        cambios = [
+            {"id": existentes[fila[clave]][0], "version": existentes[fila[clave]][1], **fila}
+            for fila in bloque if fila[clave] in existentes
+        ]
+        if modelo is Curso and cambios:
+            # Un archivo sin columna cupo no quita el cupo de los cursos que ya lo tienen
+            actuales = dict(session.exec(select(Curso.id, Curso.cupo).where(Curso.id.in_([c["id"] for c in cambios]))).all())
+            for c in cambios:
+                if c["cupo"] is None:
+                    c["cupo"] = actuales[c["id"]]
+    estadisticas.al_importar(session, modelo, nuevas, cambios)
+
+    if cambios:
+        session.execute(update(modelo), cambios)
+        feed.al_escribir(session, modelo.__tablename__, "actualizar", [c["id"] for c in cambios])
+    if modelo is Curso:
+        horarios.al_importar_cursos(session, nuevas + cambios)
+    actualizadas = len(cambios)
+    omitidas = len(bloque) - len(nuevas) - actualizadas
+    session.commit()
+    if actualizadas:
+        INVALIDAR[modelo](session, [c["id"] for c in cambios])
+    return len(nuevas), actualizadas, omitidas
+
+def importar(
+    session: Session,
+    tipo: str,
+    lineas: Iterable[str],
+    formato: str = "csv",
+    modo: str = "skip",
+    chunk_size: int = 1000,
+) -> Dict[str, Any]:
+    if tipo not in MODELOS:
+        raise HTTPException(status_code=400, detail=f"Tipo de importación no soportado: {tipo}")
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"Modo no soportado: {modo} (use skip o upsert)")
+    modelo, schema, clave = MODELOS[tipo]
+
+    reporte = {"procesadas": 0, "insertadas": 0, "actualizadas": 0, "omitidas": 0, "rechazadas": 0, "errores": []}
+
+    def rechazar(fila: int, error: str):
+        reporte["rechazadas"] += 1
+        if len(reporte["errores"]) < MAX_RECHAZOS_REPORTADOS:
+            reporte["errores"].append({"fila": fila, "error": error})
+
+    def volcar(bloque: Dict[str, Dict[str, Any]], primera: int):
+        try:
+            insertadas, actualizadas, omitidas = _guardar_bloque(session, modelo, clave, list(bloque.values()), modo)
+        except StaleDataError:
+            # Otra escritura cambió una fila del bloque entre la lectura de versiones y el UPDATE: el bloque se
+            # revierte entero y los anteriores ya están confirmados, así que se informa desde dónde reintentar
+            session.rollback()
+            raise HTTPException(status_code=409, detail=(
+                f"Otra petición modificó {tipo} del bloque que empieza en la fila {primera}; se revirtió ese "
+                f"bloque. Ya confirmadas: {reporte['insertadas']} insertadas, {reporte['actualizadas']} "
+                f"actualizadas. Reintente desde la fila {primera}."
+            ))
+        reporte["insertadas"] += insertadas
+        reporte["actualizadas"] += actualizadas
+        reporte["omitidas"] += omitidas
+
+    inicio = time.perf_counter()
+    try:
+        # El bloque se indexa por clave única: de una clave repetida en el archivo se guarda una sola fila
+        # (la primera con skip, la última con upsert) y las demás cuentan como omitidas; la que queda se
+        # cuenta al volcar, como insertada, actualizada u omitida según la base.
+        bloque: Dict[str, Dict[str, Any]] = {}
+        primera = 0
+        for n, fila in leer_filas(lineas, formato):
+            reporte["procesadas"] += 1
+            if isinstance(fila, Exception):
+                rechazar(n, f"JSON inválido: {fila}")
+                continue
+            try:
+                datos = schema(**fila).model_dump()
+            except (ValidationError, TypeError) as e:
+                rechazar(n, str(e).replace("\n", " "))
+                continue
+            if datos[clave] in bloque:
+                reporte["omitidas"] += 1
+                if modo == "skip":
+                    continue
+            if not bloque:
+                primera = n
+            bloque[datos[clave]] = datos
+            if len(bloque) >= chunk_size:
+                volcar(bloque, primera)
+                bloque = {}
+        if bloque:
+            volcar(bloque, primera)
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al importar {tipo}. Error: {str(e)}")
+
+    segundos = time.perf_counter() - inicio
+    reporte["segundos"] = round(segundos, 3)
+    reporte["filas_por_segundo"] = round(reporte["procesadas"] / segundos, 1) if segundos else None
+    return reporte
+
+
+# CLI
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Importa estudiantes o cursos desde CSV/NDJSON")
+    parser.add_argument("tipo", choices=sorted(MODELOS))
+    parser.add_argument("archivo")
+    parser.add_argument("--formato", choices=FORMATOS)
+    parser.add_argument("--modo", choices=MODOS, default="skip")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--database-url", help="Por defecto DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from utils.db import crear_engine
+    from utils.migraciones import verificar
+    engine = crear_engine(args.database_url)
+    verificar(engine)
+
+    formato = args.formato or formato_desde_nombre(args.archivo)
+    with open(args.archivo, encoding="utf-8", newline="") as f, Session(engine) as session:
+        reporte = importar(session, args.tipo, f, formato, args.modo, args.chunk_size)
+
+    errores = reporte.pop("errores")
+    print(json.dumps(reporte, indent=2))
+    for err in errores:
+        print(f"fila {err['fila']}: {err['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import re
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlmodel import Session
+
+from data.schemas import (
+    CursoCreate, CursoRead, CursoUpdate, EstudianteCreate, EstudianteRead, EstudianteUpdate, OperacionLote,
+)
+from operations import operations_db as ops
+from utils.db import abrir_transaccion
+
+# POST /batch ejecuta una lista ordenada de escrituras (crear/actualizar/eliminar/restaurar estudiantes y
+# cursos, matricular, desmatricular) con una sola sesión y una sola transacción: las funciones de
+# operations_db ven session.info["lote"] y hacen flush en vez de commit, y al final hay un único COMMIT (o
+# ROLLBACK). Las invalidaciones de caché de cada operación se guardan en session.info["lote"] y se aplican
+# después del commit.
+#
+# Modos:
+#   atomico   - todo o nada: la primera operación que falla deshace el lote entero; las siguientes no se
+#               ejecutan (424) y la respuesta lleva el código de la que falló.
+#   continuar - cada operación corre en su SAVEPOINT: la que falla se deshace sola y el lote sigue; se
+#               confirma lo demás.
+#
+# Una operación puede usar el id creado por otra anterior del mismo lote: "$N" en id / estudiante_id /
+# curso_id es el id que devolvió la operación de índice N.
+
+MODOS = ("atomico", "continuar")
+BATCH_MAX_OPERACIONES = int(os.getenv("BATCH_MAX_OPERACIONES", 1000))
+
+_REFERENCIA = re.compile(r"\$(\d+)")
+
+
+# ARGUMENTOS
+
+def _id(op: OperacionLote, campo: str, creados: Dict[int, int]) -> int:
+    valor = getattr(op, campo)
+    if valor is None:
+        raise HTTPException(status_code=422, detail=f"{op.op} necesita {campo}")
+    if isinstance(valor, int):
+        return valor
+    m = _REFERENCIA.fullmatch(valor)
+    if not m:
+        raise HTTPException(status_code=422, detail=f"{campo} debe ser un entero o una referencia '$N'")
+    indice = int(m.group(1))
+    if indice not in creados:
+        raise HTTPException(status_code=422, detail=f"{campo}: la operación {indice} no dejó un id antes que esta")
+    return creados[indice]
+
+def _datos(op: OperacionLote, esquema):
+    try:
+        return esquema.model_validate(op.datos or {})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+def _leido(esquema, obj) -> Dict[str, Any]:
+    return esquema.model_validate(obj, from_attributes=True).model_dump()
+
+
+# OPERACIONES: (session, op, creados) -> (código, resultado)
+
+def _crear_estudiante(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+    return 201, _leido(EstudianteRead, ops.crear_estudiante(session, _datos(op, EstudianteCreate)))
+
+def _actualizar_estudiante(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+    est = ops.actualizar_estudiante(session, _id(op, "id", creados), _datos(op, EstudianteUpdate), op.version)
+    return 200, _leido(EstudianteRead, est)
+
+def _crear_curso(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+    return 201, _leido(CursoRead, ops.crear_curso_leido(session, _datos(op, CursoCreate)))
+
+def _actualizar_curso(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+    cur = ops.actualizar_curso(session, _id(op, "id", creados), _datos(op, CursoUpdate), op.version)
+    return 200, _leido(CursoRead, cur)
+
+def _cambio_estado(cambiar: Callable[[Session, int], bool]):
+    def operacion(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+        obj_id = _id(op, "id", creados)
+        cambiar(session, obj_id)
+        return 200, {"id": obj_id}
+    return operacion
+
+def _matricular(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+    est_id, cur_id = _id(op, "estudiante_id", creados), _id(op, "curso_id", creados)
+    return 201, ops.matricular(session, est_id, cur_id, op.conflictos)
+
+def _desmatricular(session: Session, op: OperacionLote, creados) -> Tuple[int, Any]:
+    est_id, cur_id = _id(op, "estudiante_id", creados), _id(op, "curso_id", creados)
+    return 200, {**ops.desmatricular(session, est_id, cur_id), "estudiante_id": est_id, "curso_id": cur_id}
+
+OPERACIONES = {
+    "crear_estudiante": _crear_estudiante,
+    "actualizar_estudiante": _actualizar_estudiante,
+    "eliminar_estudiante": _cambio_estado(ops.eliminar_estudiante),
+    "restaurar_estudiante": _cambio_estado(ops.restaurar_estudiante),
+    "crear_curso": _crear_curso,
+    "actualizar_curso": _actualizar_curso,
+    "eliminar_curso": _cambio_estado(ops.eliminar_curso),
+    "restaurar_curso": _cambio_estado(ops.restaurar_curso),
+    "matricular": _matricular,
+    "desmatricular": _desmatricular,
+}
+
+
+# EJECUCIÓN
+
+def ejecutar(session: Session, operaciones: List[OperacionLote], modo: str = "atomico") -> Dict[str, Any]:
+    # Deja la transacción abierta: quien llama confirma o deshace según "confirmado" y luego llama a
+    # aplicar_pendientes (en modo async esto corre dentro de run_sync y el commit es await session.commit())
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"modo debe ser uno de {MODOS}")
+    if len(operaciones) > BATCH_MAX_OPERACIONES:
+        raise HTTPException(status_code=413, detail=f"Máximo {BATCH_MAX_OPERACIONES} operaciones por lote")
+    session.info["lote"] = []
+    abrir_transaccion(session)
+
+    resultados: List[Dict[str, Any]] = []
+    creados: Dict[int, int] = {}
+    fallida: Optional[int] = None
+    for i, op in enumerate(operaciones):
+        if fallida is not None and modo == "atomico":
+            resultados.append({"indice": i, "op": op.op, "status": 424,
+                               "error": f"No se ejecutó: falló la operación {fallida}"})
+            continue
+        try:
+            with session.begin_nested() if modo == "continuar" else nullcontext():
+                status, resultado = OPERACIONES[op.op](session, op, creados)
+        except HTTPException as e:
+            fallida = i if fallida is None else fallida
+            resultados.append({"indice": i, "op": op.op, "status": e.status_code, "error": e.detail})
+            continue
+        if op.op.startswith("crear_"):
+            creados[i] = resultado["id"]
+        resultados.append({"indice": i, "op": op.op, "status": status, "resultado": resultado})
+
+    confirmado = fallida is None or modo == "continuar"
+    if not confirmado:
+        for r in resultados[:fallida]:
+            r["revertida"] = True
+    ok = sum(1 for r in resultados if r["status"] < 400 and not r.get("revertida"))
+    return {
+        "modo": modo,
+        "confirmado": confirmado,
+        "status": 200 if confirmado else resultados[fallida]["status"],
+        "ok": ok,
+        "fallidas": len(resultados) - ok,
+        "resultados": resultados,
+    }
+
+def aplicar_pendientes(session: Session, confirmado: bool = True) -> None:
+    # Tras el COMMIT (o el ROLLBACK) del lote: la sesión vuelve al modo normal y se invalida la caché
+    pendientes = session.info.pop("lote", None) or []
+    if confirmado:
+        for invalidar, args in pendientes:
+            invalidar(*args)
+
+def ejecutar_lote(session: Session, operaciones: List[OperacionLote], modo: str = "atomico") -> Dict[str, Any]:
+    try:
+        cuerpo = ejecutar(session, operaciones, modo)
+        if cuerpo["confirmado"]:
+            session.commit()
+        else:
+            session.rollback()
+    except BaseException:
+        session.rollback()
+        aplicar_pendientes(session, False)
+        raise
+    aplicar_pendientes(session, cuerpo["confirmado"])
+    return cuerpo
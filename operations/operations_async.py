@@ -0,0 +1,66 @@
+from functools import wraps
+from typing import Any, Callable
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from operations import lotes
+from operations import operations_db as ops
+
+# Versiones async de operations_db. No hay una segunda copia de la lógica: cada función ejecuta la sync
+# sobre la sesión subyacente con AsyncSession.run_sync (mismas consultas, mismos hooks, misma caché y
+# mismos errores HTTP); la E/S sigue pasando por el driver async, así que el event loop no se bloquea.
+
+def _async(fn: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(fn)
+    async def envoltura(session: AsyncSession, *args, **kwargs):
+        return await session.run_sync(fn, *args, **kwargs)
+    return envoltura
+
+
+# ESTUDIANTES
+
+crear_estudiante = _async(ops.crear_estudiante)
+listar_estudiantes = _async(ops.listar_estudiantes)
+listar_estudiantes_filas = _async(ops.listar_estudiantes_filas)
+obtener_estudiante = _async(ops.obtener_estudiante)
+obtener_estudiante_cacheado = _async(ops.obtener_estudiante_cacheado)
+buscar_estudiante_por_nombre = _async(ops.buscar_estudiante_por_nombre)
+actualizar_estudiante = _async(ops.actualizar_estudiante)
+eliminar_estudiante = _async(ops.eliminar_estudiante)
+restaurar_estudiante = _async(ops.restaurar_estudiante)
+listar_estudiantes_eliminados = _async(ops.listar_estudiantes_eliminados)
+cambiar_estado_estudiantes = _async(ops.cambiar_estado_estudiantes)
+
+
+# CURSOS
+
+crear_curso = _async(ops.crear_curso_leido)
+listar_cursos = _async(ops.listar_cursos)
+listar_cursos_filas = _async(ops.listar_cursos_filas)
+obtener_curso = _async(ops.obtener_curso)
+obtener_curso_cacheado = _async(ops.obtener_curso_cacheado)
+buscar_curso_por_nombre = _async(ops.buscar_curso_por_nombre)
+actualizar_curso = _async(ops.actualizar_curso)
+eliminar_curso = _async(ops.eliminar_curso)
+restaurar_curso = _async(ops.restaurar_curso)
+listar_cursos_eliminados = _async(ops.listar_cursos_eliminados)
+cambiar_estado_cursos = _async(ops.cambiar_estado_cursos)
+
+
+# LOTES
+
+obtener_lote = _async(ops.obtener_lote)
+ejecutar_lote = _async(lotes.ejecutar_lote)
+
+
+# MATRÍCULAS (N:M)
+
+matricular = _async(ops.matricular)
+desmatricular = _async(ops.desmatricular)
+version_recurso = _async(ops.version_recurso)
+cursos_de_estudiante = _async(ops.cursos_de_estudiante)
+estudiantes_de_curso = _async(ops.estudiantes_de_curso)
+filas_cursos_de_estudiante = _async(ops.filas_cursos_de_estudiante)
+filas_estudiantes_de_curso = _async(ops.filas_estudiantes_de_curso)
+cursos_de_estudiante_cacheado = _async(ops.cursos_de_estudiante_cacheado)
+estudiantes_de_curso_cacheado = _async(ops.estudiantes_de_curso_cacheado)
@@ -1,13 +1,25 @@
-from typing import List, Optional, Dict, Any
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 from sqlmodel import Session, select
 from fastapi import HTTPException
+from sqlalchemy import func, insert, or_, and_, update
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
 
 from data.models import (
     Estudiante,
     Curso,
     Matricula,
+    ahora,
 )
+from data.schemas import EstudianteRead, CursoRead
+from operations import archivo, busqueda, cambios, cupos, estadisticas, horarios
+from operations.estadisticas import _trozos
+from utils.cache import cache
+from utils.db import es_replica
 
 # HELPERS
 
@@ -16,13 +28,176 @@ def _apply_active_filter(model, include_deleted: bool = False):
         return True
     return model.is_deleted == False  # noqa: E712
 
+def _dialecto(session: Session) -> str:
+    return session.get_bind().dialect.name
+
 def _handle_exception(session: Session, exc: Exception, message: str):
-    session.rollback()
+    _deshacer(session)
     raise HTTPException(status_code=500, detail=f"{message}. Error: {str(exc)}")
 
+# TRANSACCIÓN DE CADA OPERACIÓN
+# Fuera de un lote cada escritura confirma su propia transacción. Dentro de POST /batch (session.info["lote"])
+# solo hace flush: el lote confirma una vez al final (o deshace la operación fallida con su SAVEPOINT), y las
+# invalidaciones de caché esperan a ese commit (antes, otra petición podría volver a llenar la caché con
+# lo anterior).
+
+def en_lote(session: Session) -> bool:
+    return session.info.get("lote") is not None
+
+def _confirmar(session: Session) -> None:
+    if en_lote(session):
+        session.flush()
+    else:
+        session.commit()
+
+def _deshacer(session: Session) -> None:
+    # En un lote deshace quien lo abrió: el SAVEPOINT de la operación o el lote entero
+    if not en_lote(session):
+        session.rollback()
+
+def _tras_confirmar(session: Session, invalidar, *args) -> None:
+    if en_lote(session):
+        session.info["lote"].append((invalidar, args))
+    else:
+        invalidar(*args)
+
 def _created_payload(obj) -> Dict[str, Any]:
     return obj.dict(exclude={"id", "is_deleted"})
 
+def verificar_version(obj, version_esperada: Optional[int]) -> None:
+    # If-Match: se comprueba antes de tocar nada; el UPDATE además lleva WHERE version (version_id_col)
+    if version_esperada is not None and obj.version != version_esperada:
+        raise HTTPException(status_code=412, detail="El recurso cambió desde que se leyó (If-Match no coincide)")
+
+def error_version(version_esperada: Optional[int] = None) -> HTTPException:
+    # StaleDataError: otra transacción actualizó la fila entre la lectura y el UPDATE
+    if version_esperada is not None:
+        return HTTPException(status_code=412, detail="El recurso cambió desde que se leyó (If-Match no coincide)")
+    return HTTPException(status_code=409, detail="El recurso fue modificado por otra petición; reintente")
+
+# PAGINACIÓN POR CURSOR (keyset)
+
+ORDEN_ESTUDIANTES = ("id", "nombre", "cedula", "semestre")
+ORDEN_CURSOS = ("id", "codigo", "nombre", "creditos")
+
+def codificar_cursor(order_by: str, valor: Any, ultimo_id: int) -> str:
+    raw = json.dumps([order_by, valor, ultimo_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str, order_by: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        campo, valor, ultimo_id = json.loads(raw)
+        ultimo_id = int(ultimo_id)
+        # Las claves de orden son texto o números: una lista, un objeto o null no vienen de codificar_cursor
+        if isinstance(valor, bool) or not isinstance(valor, (str, int, float)):
+            raise TypeError(f"valor de cursor no escalar: {valor!r}")
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if campo != order_by:
+        raise HTTPException(status_code=400, detail="El cursor fue generado con otro order_by")
+    return valor, ultimo_id
+
+def paginar(q, model, skip: int, limit: int, cursor: Optional[str], order_by: str):
+    # Se ordena siempre por (clave, id) para que el orden sea total y el cursor estable
+    columna = getattr(model, order_by)
+    if order_by == "id":
+        q = q.order_by(model.id)
+    else:
+        q = q.order_by(columna, model.id)
+    if cursor:
+        valor, ultimo_id = _decodificar_cursor(cursor, order_by)
+        if order_by == "id":
+            q = q.where(model.id > ultimo_id)
+        else:
+            q = q.where(or_(columna > valor, and_(columna == valor, model.id > ultimo_id)))
+    else:
+        q = q.offset(skip)
+    return q.limit(limit)
+
+def siguiente_cursor(items: List[Any], limit: int, order_by: str = "id") -> Optional[str]:
+    if not items or len(items) < limit:
+        return None
+    ultimo = items[-1]
+    return codificar_cursor(order_by, getattr(ultimo, order_by), ultimo.id)
+
+# PROYECCIÓN (fields=: solo las columnas pedidas, filas como dicts sin construir objetos del ORM)
+
+CAMPOS_LECTURA = {Estudiante: tuple(EstudianteRead.model_fields), Curso: tuple(CursoRead.model_fields)}
+
+def parsear_campos(model, fields: Optional[str] = None) -> Tuple[str, ...]:
+    permitidos = CAMPOS_LECTURA[model]
+    if not fields:
+        return permitidos
+    pedidos = [c.strip() for c in fields.split(",") if c.strip()]
+    invalidos = sorted(set(pedidos) - set(permitidos))
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Campos no soportados: {invalidos} (use {permitidos})")
+    # El id va siempre: identifica la fila y arma el cursor
+    return tuple(dict.fromkeys(("id", *pedidos)))
+
+def proyectar(q, model, campos: Tuple[str, ...], order_by: str = "id"):
+    # La columna del order_by se lee aunque no se pida (siguiente_cursor la necesita) y a_dicts la descarta
+    columnas = campos if order_by in campos else (*campos, order_by)
+    return q.with_only_columns(*(getattr(model, c) for c in columnas))
+
+def a_dicts(filas, campos: Tuple[str, ...], sin_nulos: bool = False) -> List[Dict[str, Any]]:
+    if sin_nulos:
+        return [{c: v for c, v in zip(campos, fila) if v is not None} for fila in filas]
+    return [dict(zip(campos, fila)) for fila in filas]
+
+
+# CACHÉ (invalidación precisa tras cada escritura)
+
+def claves_cache_estudiantes(ids: set, cursos: Iterable[int]) -> List[str]:
+    # Los rosters de sus cursos incluyen los datos del estudiante
+    return [
+        *(f"estudiante:{i}" for i in ids),
+        *(f"estudiante:{i}:cursos" for i in ids),
+        *(f"curso:{c}:estudiantes" for c in set(cursos)),
+    ]
+
+def claves_cache_cursos(ids: set, estudiantes: Iterable[int]) -> List[str]:
+    return [
+        *(f"curso:{i}" for i in ids),
+        *(f"curso:{i}:estudiantes" for i in ids),
+        *(f"estudiante:{e}:cursos" for e in set(estudiantes)),
+    ]
+
+def invalidar_cache_estudiantes(session: Session, estudiante_ids: Iterable[int]) -> None:
+    ids = set(estudiante_ids)
+    if not ids:
+        return
+    cursos = session.exec(select(Matricula.curso_id).where(Matricula.estudiante_id.in_(ids))).all()
+    cache.delete(*claves_cache_estudiantes(ids, cursos))
+
+def invalidar_cache_cursos(session: Session, curso_ids: Iterable[int]) -> None:
+    ids = set(curso_ids)
+    if not ids:
+        return
+    estudiantes = session.exec(select(Matricula.estudiante_id).where(Matricula.curso_id.in_(ids))).all()
+    cache.delete(*claves_cache_cursos(ids, estudiantes))
+
+def invalidar_cache_matriculas(pares: Iterable[Tuple[int, int]]) -> None:
+    pares = list(pares)
+    cache.delete(
+        *{f"estudiante:{e}:cursos" for e, _ in pares},
+        *{f"curso:{c}:estudiantes" for _, c in pares},
+    )
+
+def _leer_cache(session, clave: str, cargar):
+    # Lo leído de una réplica no se guarda: podría ser anterior a la última invalidación y quedaría en la
+    # caché después de que la réplica se ponga al día (y los clientes pegados al primario lo verían).
+    # La generación se toma antes de cargar: si una escritura invalida la clave mientras tanto, set() descarta
+    # lo leído (utils/cache.py, GENERACIONES).
+    valor = cache.get(clave)
+    if valor is None:
+        generacion = cache.generacion(clave)
+        valor = cargar()
+        if not es_replica(session):
+            cache.set(clave, valor, generacion)
+    return valor
+
 
 # ESTUDIANTES (CREAR + BUSQUEDA + HISTORIAL)
 
@@ -31,16 +206,32 @@ def crear_estudiante(session: Session, obj) -> Dict[str, Any]:
         obj_db = Estudiante(**obj.dict()) if hasattr(obj, "dict") else obj
         obj_db.id = None
         session.add(obj_db)
-        session.commit()
+        session.flush()
+        estadisticas.al_crear_estudiante(session, obj_db.semestre)
+        cambios.al_escribir(session, "estudiante", "crear", [obj_db.id])
+        _confirmar(session)
         session.refresh(obj_db)
         return obj_db
     except IntegrityError:
-        session.rollback()
+        _deshacer(session)
         # 409: violación de unicidad
         raise HTTPException(status_code=409, detail="No pueden existir dos estudiantes con la misma cédula")
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al crear el estudiante")
 
+def consulta_estudiantes(
+    include_deleted: bool = False,
+    semestre: Optional[int] = None,
+    nombre: Optional[str] = None,
+    dialecto: Optional[str] = None,
+):
+    q = select(Estudiante).where(_apply_active_filter(Estudiante, include_deleted))
+    if semestre is not None:
+        q = q.where(Estudiante.semestre == semestre)
+    if nombre:
+        q = q.where(busqueda.filtro(dialecto, Estudiante, "nombre", nombre, include_deleted))
+    return q
+
 def listar_estudiantes(
     session: Session,
     skip: int = 0,
@@ -48,18 +239,41 @@ def listar_estudiantes(
     include_deleted: bool = False,
     semestre: Optional[int] = None,
     nombre: Optional[str] = None,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    expand: Optional[str] = None,
 ) -> List[Estudiante]:
+    if order_by not in ORDEN_ESTUDIANTES:
+        raise HTTPException(status_code=400, detail=f"order_by debe ser uno de {ORDEN_ESTUDIANTES}")
     try:
-        q = select(Estudiante).where(_apply_active_filter(Estudiante, include_deleted))
-        if semestre is not None:
-            q = q.where(Estudiante.semestre == semestre)
-        if nombre:
-            q = q.where(Estudiante.nombre.ilike(f"%{nombre}%"))
-        q = q.offset(skip).limit(limit)
+        q = consulta_estudiantes(include_deleted, semestre, nombre, _dialecto(session))
+        q = q.options(*opciones_expand(Estudiante, expand))
+        q = paginar(q, Estudiante, skip, limit, cursor, order_by)
         return session.exec(q).all()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al listar estudiantes")
 
+def listar_estudiantes_filas(
+    session: Session,
+    campos: Tuple[str, ...],
+    skip: int = 0,
+    limit: int = 10,
+    include_deleted: bool = False,
+    semestre: Optional[int] = None,
+    nombre: Optional[str] = None,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+) -> List[Any]:
+    # Como listar_estudiantes, pero solo con las columnas de `campos` (filas, no objetos del ORM)
+    if order_by not in ORDEN_ESTUDIANTES:
+        raise HTTPException(status_code=400, detail=f"order_by debe ser uno de {ORDEN_ESTUDIANTES}")
+    try:
+        q = consulta_estudiantes(include_deleted, semestre, nombre, _dialecto(session))
+        q = proyectar(q, Estudiante, campos, order_by)
+        return session.execute(paginar(q, Estudiante, skip, limit, cursor, order_by)).all()
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al listar estudiantes")
+
 def obtener_estudiante(session: Session, estudiante_id: int) -> Estudiante:
     try:
         obj = session.get(Estudiante, estudiante_id)
@@ -72,35 +286,45 @@ def obtener_estudiante(session: Session, estudiante_id: int) -> Estudiante:
 def buscar_estudiante_por_nombre(session: Session, nombre: str) -> List[Estudiante]:
     try:
         q = select(Estudiante).where(
-            Estudiante.nombre.ilike(f"%{nombre}%"),
+            busqueda.filtro(_dialecto(session), Estudiante, "nombre", nombre),
             Estudiante.is_deleted == False,  # noqa: E712
         )
-        resultados = session.exec(q).all()
+        resultados = session.exec(q.order_by(Estudiante.id)).all()
         if not resultados:
             raise HTTPException(status_code=404, detail=f"No se encontraron estudiantes con nombre que contenga '{nombre}'")
         return resultados
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al buscar estudiantes por nombre")
 
-def actualizar_estudiante(session: Session, estudiante_id: int, obj_update) -> Estudiante:
+def actualizar_estudiante(
+    session: Session, estudiante_id: int, obj_update, version_esperada: Optional[int] = None,
+) -> Estudiante:
     try:
         obj = session.get(Estudiante, estudiante_id)
         if not obj or obj.is_deleted:
             raise HTTPException(status_code=404, detail="Estudiante no encontrado o fue eliminado")
+        verificar_version(obj, version_esperada)
 
         data = obj_update.dict(exclude_unset=True) if hasattr(obj_update, "dict") else {}
         data.pop("id", None)
         data.pop("is_deleted", None)
 
         # Si cambian cédula, validar unicidad a nivel DB (IntegrityError capturado abajo)
+        semestre_anterior = obj.semestre
         for k, v in data.items():
             setattr(obj, k, v)
         session.add(obj)
-        session.commit()
+        estadisticas.al_cambiar_semestre(session, semestre_anterior, obj.semestre)
+        cambios.al_escribir(session, "estudiante", "actualizar", [estudiante_id])
+        _confirmar(session)
         session.refresh(obj)
+        _tras_confirmar(session, invalidar_cache_estudiantes, session, [estudiante_id])
         return obj
+    except StaleDataError:
+        _deshacer(session)
+        raise error_version(version_esperada)
     except IntegrityError:
-        session.rollback()
+        _deshacer(session)
         raise HTTPException(status_code=409, detail="No pueden existir dos estudiantes con la misma cédula")
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al actualizar estudiante")
@@ -113,33 +337,51 @@ def eliminar_estudiante(session: Session, estudiante_id: int) -> bool:
         if obj.is_deleted:
             raise HTTPException(status_code=400, detail="El estudiante ya estaba eliminado")
         obj.is_deleted = True
+        obj.eliminado_en = ahora()
         session.add(obj)
-        session.commit()
+        estadisticas.al_cambiar_estado_estudiante(session, obj, activo=False)
+        cambios.al_escribir(session, "estudiante", "eliminar", [estudiante_id])
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_estudiantes, session, [estudiante_id])
         return True
+    except StaleDataError:
+        _deshacer(session)
+        raise error_version()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al eliminar estudiante")
 
 def restaurar_estudiante(session: Session, estudiante_id: int) -> bool:
     try:
-        obj = session.get(Estudiante, estudiante_id)
+        obj = session.get(Estudiante, estudiante_id) or archivo.recuperar(session, Estudiante, estudiante_id)
         if not obj:
             raise HTTPException(status_code=404, detail="Estudiante no encontrado")
         if not obj.is_deleted:
             raise HTTPException(status_code=400, detail="El estudiante no está eliminado")
         obj.is_deleted = False
+        obj.eliminado_en = None
         session.add(obj)
-        session.commit()
+        estadisticas.al_cambiar_estado_estudiante(session, obj, activo=True)
+        cambios.al_escribir(session, "estudiante", "restaurar", [estudiante_id])
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_estudiantes, session, [estudiante_id])
         return True
+    except StaleDataError:
+        _deshacer(session)
+        raise error_version()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al restaurar el estudiante")
 
 def listar_estudiantes_eliminados(session: Session) -> List[Estudiante]:
+    # Los eliminados de la tabla caliente y los ya archivados (mismas columnas)
     try:
         q = select(Estudiante).where(Estudiante.is_deleted == True)
-        return session.exec(q).all()
+        return sorted([*session.exec(q).all(), *archivo.archivados(session, Estudiante)], key=lambda e: e.id)
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al listar estudiantes eliminados")
 
+def cambiar_estado_estudiantes(session: Session, borrar: bool, filtros: Dict[str, Any]) -> Dict[str, Any]:
+    return _cambiar_estado_masivo(session, Estudiante, borrar, filtros)
+
 
 # CURSOS
 
@@ -148,15 +390,39 @@ def crear_curso(session: Session, obj) -> Dict[str, Any]:
         obj_db = Curso(**obj.dict()) if hasattr(obj, "dict") else obj
         obj_db.id = None
         session.add(obj_db)
-        session.commit()
+        session.flush()
+        horarios.guardar_franjas(session, obj_db.id, obj_db.horario)
+        cambios.al_escribir(session, "curso", "crear", [obj_db.id])
+        _confirmar(session)
         session.refresh(obj_db)
         return _created_payload(obj_db)
     except IntegrityError:
-        session.rollback()
+        _deshacer(session)
         raise HTTPException(status_code=409, detail="No pueden existir dos cursos con el mismo código")
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al crear el curso")
 
+def crear_curso_leido(session: Session, obj) -> Curso:
+    # crear_curso no devuelve el id: el código es único
+    crear_curso(session, obj)
+    return session.exec(select(Curso).where(Curso.codigo == obj.codigo)).one()
+
+def consulta_cursos(
+    include_deleted: bool = False,
+    creditos: Optional[int] = None,
+    codigo: Optional[str] = None,
+    nombre: Optional[str] = None,
+    dialecto: Optional[str] = None,
+):
+    q = select(Curso).where(_apply_active_filter(Curso, include_deleted))
+    if creditos is not None:
+        q = q.where(Curso.creditos == creditos)
+    if codigo:
+        q = q.where(busqueda.filtro(dialecto, Curso, "codigo", codigo, include_deleted))
+    if nombre:
+        q = q.where(busqueda.filtro(dialecto, Curso, "nombre", nombre, include_deleted))
+    return q
+
 def listar_cursos(
     session: Session,
     skip: int = 0,
@@ -165,20 +431,41 @@ def listar_cursos(
     creditos: Optional[int] = None,
     codigo: Optional[str] = None,
     nombre: Optional[str] = None,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    expand: Optional[str] = None,
 ) -> List[Curso]:
+    if order_by not in ORDEN_CURSOS:
+        raise HTTPException(status_code=400, detail=f"order_by debe ser uno de {ORDEN_CURSOS}")
     try:
-        q = select(Curso).where(_apply_active_filter(Curso, include_deleted))
-        if creditos is not None:
-            q = q.where(Curso.creditos == creditos)
-        if codigo:
-            q = q.where(Curso.codigo.ilike(f"%{codigo}%"))
-        if nombre:
-            q = q.where(Curso.nombre.ilike(f"%{nombre}%"))
-        q = q.offset(skip).limit(limit)
+        q = consulta_cursos(include_deleted, creditos, codigo, nombre, _dialecto(session))
+        q = q.options(*opciones_expand(Curso, expand))
+        q = paginar(q, Curso, skip, limit, cursor, order_by)
         return session.exec(q).all()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al listar cursos")
 
+def listar_cursos_filas(
+    session: Session,
+    campos: Tuple[str, ...],
+    skip: int = 0,
+    limit: int = 10,
+    include_deleted: bool = False,
+    creditos: Optional[int] = None,
+    codigo: Optional[str] = None,
+    nombre: Optional[str] = None,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+) -> List[Any]:
+    if order_by not in ORDEN_CURSOS:
+        raise HTTPException(status_code=400, detail=f"order_by debe ser uno de {ORDEN_CURSOS}")
+    try:
+        q = consulta_cursos(include_deleted, creditos, codigo, nombre, _dialecto(session))
+        q = proyectar(q, Curso, campos, order_by)
+        return session.execute(paginar(q, Curso, skip, limit, cursor, order_by)).all()
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al listar cursos")
+
 def obtener_curso(session: Session, curso_id: int) -> Curso:
     try:
         obj = session.get(Curso, curso_id)
@@ -191,34 +478,44 @@ def obtener_curso(session: Session, curso_id: int) -> Curso:
 def buscar_curso_por_nombre(session: Session, nombre: str) -> List[Curso]:
     try:
         q = select(Curso).where(
-            Curso.nombre.ilike(f"%{nombre}%"),
+            busqueda.filtro(_dialecto(session), Curso, "nombre", nombre),
             Curso.is_deleted == False,  # noqa: E712
         )
-        resultados = session.exec(q).all()
+        resultados = session.exec(q.order_by(Curso.id)).all()
         if not resultados:
             raise HTTPException(status_code=404, detail=f"No se encontraron cursos con nombre que contenga '{nombre}'")
         return resultados
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al buscar cursos por nombre")
 
-def actualizar_curso(session: Session, curso_id: int, obj_update) -> Curso:
+def actualizar_curso(session: Session, curso_id: int, obj_update, version_esperada: Optional[int] = None) -> Curso:
     try:
         obj = session.get(Curso, curso_id)
         if not obj or obj.is_deleted:
             raise HTTPException(status_code=404, detail="Curso no encontrado o fue eliminado")
+        verificar_version(obj, version_esperada)
 
         data = obj_update.dict(exclude_unset=True) if hasattr(obj_update, "dict") else {}
         data.pop("id", None)
         data.pop("is_deleted", None)
 
+        creditos_anteriores = obj.creditos
         for k, v in data.items():
             setattr(obj, k, v)
         session.add(obj)
-        session.commit()
+        estadisticas.al_cambiar_creditos(session, curso_id, obj.creditos - creditos_anteriores)
+        if "horario" in data:
+            horarios.al_cambiar_curso(session, curso_id, obj.horario, nuevo_horario=True)
+        cambios.al_escribir(session, "curso", "actualizar", [curso_id])
+        _confirmar(session)
         session.refresh(obj)
+        _tras_confirmar(session, invalidar_cache_cursos, session, [curso_id])
         return obj
+    except StaleDataError:
+        _deshacer(session)
+        raise error_version(version_esperada)
     except IntegrityError:
-        session.rollback()
+        _deshacer(session)
         raise HTTPException(status_code=409, detail="No pueden existir dos cursos con el mismo código")
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al actualizar curso")
@@ -231,37 +528,76 @@ def eliminar_curso(session: Session, curso_id: int) -> bool:
         if obj.is_deleted:
             raise HTTPException(status_code=400, detail="El curso ya estaba eliminado")
         obj.is_deleted = True
+        obj.eliminado_en = ahora()
         session.add(obj)
-        session.commit()
+        estadisticas.al_cambiar_estado_curso(session, obj, activo=False)
+        horarios.al_cambiar_curso(session, curso_id)
+        cambios.al_escribir(session, "curso", "eliminar", [curso_id])
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_cursos, session, [curso_id])
         return True
+    except StaleDataError:
+        _deshacer(session)
+        raise error_version()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al eliminar curso")
 
 def restaurar_curso(session: Session, curso_id: int) -> bool:
     try:
-        obj = session.get(Curso, curso_id)
+        obj = session.get(Curso, curso_id) or archivo.recuperar(session, Curso, curso_id)
         if not obj:
             raise HTTPException(status_code=404, detail="Curso no encontrado")
         if not obj.is_deleted:
             raise HTTPException(status_code=400, detail="El curso no está eliminado")
         obj.is_deleted = False
+        obj.eliminado_en = None
         session.add(obj)
-        session.commit()
+        estadisticas.al_cambiar_estado_curso(session, obj, activo=True)
+        horarios.al_cambiar_curso(session, curso_id)
+        cambios.al_escribir(session, "curso", "restaurar", [curso_id])
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_cursos, session, [curso_id])
         return True
+    except StaleDataError:
+        _deshacer(session)
+        raise error_version()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al restaurar el curso")
 
 def listar_cursos_eliminados(session: Session) -> List[Curso]:
     try:
         q = select(Curso).where(Curso.is_deleted == True)  # noqa: E712
-        return session.exec(q).all()
+        return sorted([*session.exec(q).all(), *archivo.archivados(session, Curso)], key=lambda c: c.id)
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al listar cursos eliminados")
 
+def cambiar_estado_cursos(session: Session, borrar: bool, filtros: Dict[str, Any]) -> Dict[str, Any]:
+    return _cambiar_estado_masivo(session, Curso, borrar, filtros)
+
+
+# BORRADO / RESTAURACIÓN MASIVOS POR FILTRO (un UPDATE ... RETURNING; la restauración incluye el archivo)
+
+def invalidar_cache_masivo(session: Session, model, ids: List[int]) -> None:
+    invalidar = invalidar_cache_estudiantes if model is Estudiante else invalidar_cache_cursos
+    for i in range(0, len(ids), 500):
+        invalidar(session, ids[i:i + 500])
+
+def _cambiar_estado_masivo(session: Session, model, borrar: bool, filtros: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        resultado, ids = archivo.cambiar_estado_masivo(session, model, borrar, filtros)
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_masivo, session, model, ids)
+        return resultado
+    except IntegrityError:
+        _deshacer(session)
+        raise HTTPException(status_code=409, detail="Otra fila tomó la cédula o el código mientras se restauraba")
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al " + ("eliminar" if borrar else "restaurar") + " por filtro")
+
 
 # MATRÍCULAS (N:M)
 
-def matricular(session: Session, estudiante_id: int, curso_id: int) -> Dict[str, Any]:
+def matricular(session: Session, estudiante_id: int, curso_id: int, conflictos: str = "marcar") -> Dict[str, Any]:
     try:
         est = session.get(Estudiante, estudiante_id)
         cur = session.get(Curso, curso_id)
@@ -269,17 +605,48 @@ def matricular(session: Session, estudiante_id: int, curso_id: int) -> Dict[str,
             raise HTTPException(status_code=404, detail="Estudiante no encontrado")
         if not cur or cur.is_deleted:
             raise HTTPException(status_code=404, detail="Curso no encontrado")
+        motivo = cupos.sin_plaza(session, estudiante_id, cur)
+        if motivo:
+            raise HTTPException(status_code=409, detail=cupos.MENSAJES[motivo])
+        choques = horarios.aplicar_politica(session, estudiante_id, curso_id, conflictos)
 
         m = Matricula(estudiante_id=estudiante_id, curso_id=curso_id)
         session.add(m)
-        session.commit()
-        return {"message": "Matrícula creada", "estudiante_id": estudiante_id, "curso_id": curso_id}
+        session.flush()
+        _subir_version_matriculas(session, [(estudiante_id, curso_id)])
+        motivo = cupos.reservar(session, estudiante_id, cur)
+        if motivo:
+            _deshacer(session)
+            raise HTTPException(status_code=409, detail=cupos.MENSAJES[motivo])
+        horarios.al_matricular(session, [(estudiante_id, curso_id)])
+        cambios.al_cambiar_matriculas(session, "matricular", [(estudiante_id, curso_id)])
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_matriculas, [(estudiante_id, curso_id)])
+        return {
+            "message": "Matrícula creada", "estudiante_id": estudiante_id, "curso_id": curso_id,
+            "conflictos_con": choques,
+        }
     except IntegrityError:
-        session.rollback()
+        _deshacer(session)
         raise HTTPException(status_code=409, detail="El estudiante ya está matriculado en ese curso")
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al crear matrícula")
 
+def sentencias_version_matriculas(pares: List[Tuple[int, int]]) -> List[Any]:
+    # Altas y bajas cambian las listas de ambos lados: sube version_matriculas (no version, que es
+    # la de los datos de la fila y la que usa If-Match)
+    sentencias = []
+    for model, ids in ((Estudiante, {e for e, _ in pares}), (Curso, {c for _, c in pares})):
+        if ids:
+            sentencias.append(
+                update(model).where(model.id.in_(ids)).values(version_matriculas=model.version_matriculas + 1)
+            )
+    return sentencias
+
+def _subir_version_matriculas(session: Session, pares: List[Tuple[int, int]]) -> None:
+    for sentencia in sentencias_version_matriculas(pares):
+        session.exec(sentencia)
+
 def desmatricular(session: Session, estudiante_id: int, curso_id: int) -> Dict[str, Any]:
     try:
         q = select(Matricula).where(
@@ -290,23 +657,40 @@ def desmatricular(session: Session, estudiante_id: int, curso_id: int) -> Dict[s
         if not m:
             raise HTTPException(status_code=404, detail="Matrícula no encontrada")
         session.delete(m)
-        session.commit()
+        _subir_version_matriculas(session, [(estudiante_id, curso_id)])
+        est = session.get(Estudiante, estudiante_id)
+        cur = session.get(Curso, curso_id)
+        if est and cur:
+            estadisticas.al_desmatricular(session, est, cur)
+        horarios.al_desmatricular(session, estudiante_id)
+        cambios.al_cambiar_matriculas(session, "desmatricular", [(estudiante_id, curso_id)])
+        _confirmar(session)
+        _tras_confirmar(session, invalidar_cache_matriculas, [(estudiante_id, curso_id)])
         return {"message": "Matrícula eliminada"}
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al desmatricular")
 
+def consulta_cursos_de_estudiante(estudiante_id: int):
+    return (
+        select(Curso)
+        .join(Matricula, (Matricula.curso_id == Curso.id))
+        .where(Curso.is_deleted == False, Matricula.estudiante_id == estudiante_id)  # noqa: E712
+    )
+
+def consulta_estudiantes_de_curso(curso_id: int):
+    return (
+        select(Estudiante)
+        .join(Matricula, (Matricula.estudiante_id == Estudiante.id))
+        .where(Estudiante.is_deleted == False, Matricula.curso_id == curso_id)  # noqa: E712
+    )
+
 def cursos_de_estudiante(session: Session, estudiante_id: int) -> List[Curso]:
     try:
         est = session.get(Estudiante, estudiante_id)
         if not est or est.is_deleted:
             raise HTTPException(status_code=404, detail="Estudiante no encontrado")
 
-        q = (
-            select(Curso)
-            .join(Matricula, (Matricula.curso_id == Curso.id))
-            .where(Curso.is_deleted == False, Matricula.estudiante_id == estudiante_id)
-        )
-        return session.exec(q).all()
+        return session.exec(consulta_cursos_de_estudiante(estudiante_id)).all()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al consultar cursos del estudiante")
 
@@ -316,11 +700,271 @@ def estudiantes_de_curso(session: Session, curso_id: int) -> List[Estudiante]:
         if not cur or cur.is_deleted:
             raise HTTPException(status_code=404, detail="Curso no encontrado")
 
-        q = (
-            select(Estudiante)
-            .join(Matricula, (Matricula.estudiante_id == Estudiante.id))
-            .where(Estudiante.is_deleted == False, Matricula.curso_id == curso_id)
-        )
-        return session.exec(q).all()
+        return session.exec(consulta_estudiantes_de_curso(curso_id)).all()
     except SQLAlchemyError as e:
         _handle_exception(session, e, "Error al consultar estudiantes del curso")
+
+def filas_cursos_de_estudiante(
+    session: Session, estudiante_id: int, campos: Tuple[str, ...] = CAMPOS_LECTURA[Curso],
+) -> List[Dict[str, Any]]:
+    try:
+        est = session.get(Estudiante, estudiante_id)
+        if not est or est.is_deleted:
+            raise HTTPException(status_code=404, detail="Estudiante no encontrado")
+        q = proyectar(consulta_cursos_de_estudiante(estudiante_id), Curso, campos)
+        return a_dicts(session.execute(q).all(), campos)
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al consultar cursos del estudiante")
+
+def filas_estudiantes_de_curso(
+    session: Session, curso_id: int, campos: Tuple[str, ...] = CAMPOS_LECTURA[Estudiante],
+) -> List[Dict[str, Any]]:
+    try:
+        cur = session.get(Curso, curso_id)
+        if not cur or cur.is_deleted:
+            raise HTTPException(status_code=404, detail="Curso no encontrado")
+        q = proyectar(consulta_estudiantes_de_curso(curso_id), Estudiante, campos)
+        return a_dicts(session.execute(q).all(), campos)
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al consultar estudiantes del curso")
+
+
+# VERSIONES (ETag / Last-Modified con una consulta, sin cargar el objeto ni sus relaciones)
+# Fila: version. Listas N:M: version y version_matriculas de la fila más la suma de las versiones de
+# los relacionados (eliminados incluidos); todo solo crece, así que un token no se repite.
+
+RELACIONADOS = {
+    Estudiante: (Curso, Matricula.estudiante_id, Matricula.curso_id),
+    Curso: (Estudiante, Matricula.curso_id, Matricula.estudiante_id),
+}
+
+def consulta_version(model, obj_id: int, relacionados: bool = False):
+    activo = (model.id == obj_id, model.is_deleted == False)  # noqa: E712
+    if not relacionados:
+        return select(model.version, model.actualizado_en).where(*activo)
+    otro, propia, ajena = RELACIONADOS[model]
+    return (
+        select(
+            model.version, model.actualizado_en, model.version_matriculas,
+            func.coalesce(func.sum(otro.version), 0), func.max(otro.actualizado_en),
+        )
+        .select_from(model)
+        .outerjoin(Matricula, propia == model.id)
+        .outerjoin(otro, otro.id == ajena)
+        .where(*activo)
+        .group_by(model.id)
+    )
+
+def token_version(model, fila, relacionados: bool = False) -> Tuple[str, Optional[datetime]]:
+    if fila is None:
+        raise HTTPException(status_code=404, detail=f"{model.__name__} no encontrado")
+    if not relacionados:
+        return str(fila[0]), fila[1]
+    version, modificado, version_matriculas, suma, ultimo = fila
+    fechas = [f for f in (modificado, ultimo) if f is not None]
+    return f"{version}.{version_matriculas}.{suma}", max(fechas) if fechas else None
+
+def version_recurso(session: Session, model, obj_id: int, relacionados: bool = False) -> Tuple[str, Optional[datetime]]:
+    try:
+        fila = session.exec(consulta_version(model, obj_id, relacionados)).first()
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al consultar la versión")
+    return token_version(model, fila, relacionados)
+
+
+# LECTURAS CACHEADAS (devuelven dicts listos para serializar)
+
+def _a_dict(obj) -> Dict[str, Any]:
+    return obj.model_dump(exclude={"is_deleted"})
+
+def obtener_estudiante_cacheado(session: Session, estudiante_id: int) -> Dict[str, Any]:
+    return _leer_cache(session, f"estudiante:{estudiante_id}", lambda: _a_dict(obtener_estudiante(session, estudiante_id)))
+
+def obtener_curso_cacheado(session: Session, curso_id: int) -> Dict[str, Any]:
+    return _leer_cache(session, f"curso:{curso_id}", lambda: _a_dict(obtener_curso(session, curso_id)))
+
+def cursos_de_estudiante_cacheado(session: Session, estudiante_id: int) -> List[Dict[str, Any]]:
+    return _leer_cache(
+        session,
+        f"estudiante:{estudiante_id}:cursos",
+        lambda: filas_cursos_de_estudiante(session, estudiante_id),
+    )
+
+def estudiantes_de_curso_cacheado(session: Session, curso_id: int) -> List[Dict[str, Any]]:
+    return _leer_cache(
+        session,
+        f"curso:{curso_id}:estudiantes",
+        lambda: filas_estudiantes_de_curso(session, curso_id),
+    )
+
+
+# EXPANSIÓN Y LOTES (una cantidad fija de consultas por página, sin N+1)
+
+MAX_IDS_LOTE = 100
+
+def _expansiones():
+    # selectinload: una sola consulta IN (...) para todas las filas de la página
+    return {
+        Estudiante: {"cursos": selectinload(Estudiante.cursos.and_(Curso.is_deleted == False))},  # noqa: E712
+        Curso: {"estudiantes": selectinload(Curso.estudiantes.and_(Estudiante.is_deleted == False))},  # noqa: E712
+    }
+
+def opciones_expand(model, expand: Optional[str]) -> List[Any]:
+    if not expand:
+        return []
+    opciones = _expansiones()[model]
+    if expand not in opciones:
+        raise HTTPException(status_code=400, detail=f"expand debe ser uno de {tuple(opciones)}")
+    return [opciones[expand]]
+
+def expandir(items: List[Any], expand: Optional[str]) -> List[Dict[str, Any]]:
+    # Siempre dicts: si se devolviera el objeto ORM, el response_model leería la relación
+    # y dispararía una carga perezosa por fila (el N+1 que se quiere evitar)
+    if not expand:
+        return [_a_dict(obj) for obj in items]
+    return [
+        {**_a_dict(obj), expand: [_a_dict(r) for r in sorted(getattr(obj, expand), key=lambda r: r.id)]}
+        for obj in items
+    ]
+
+def parsear_ids(ids: str) -> List[int]:
+    try:
+        valores = list(dict.fromkeys(int(v) for v in ids.split(",") if v.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids debe ser una lista de enteros separados por comas")
+    if not valores:
+        raise HTTPException(status_code=400, detail="ids no puede estar vacío")
+    if len(valores) > MAX_IDS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_IDS_LOTE} ids por petición")
+    return valores
+
+def obtener_lote(session: Session, model, ids: List[int], expand: Optional[str] = None) -> Tuple[List[Any], List[int]]:
+    # Devuelve (encontrados en el orden pedido, ids no encontrados o eliminados)
+    try:
+        q = select(model).where(model.id.in_(ids), model.is_deleted == False)  # noqa: E712
+        encontrados = {obj.id: obj for obj in session.exec(q.options(*opciones_expand(model, expand))).all()}
+        return [encontrados[i] for i in ids if i in encontrados], [i for i in ids if i not in encontrados]
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al obtener el lote")
+
+def _pares_existentes(session: Session, pares: List[Tuple[int, int]]) -> set:
+    # Por trozos de estudiantes (límite de parámetros de SQLite); sus matrículas se cruzan con el lote
+    existentes = set()
+    for trozo in _trozos(sorted({e for e, _ in pares})):
+        q = select(Matricula.estudiante_id, Matricula.curso_id).where(Matricula.estudiante_id.in_(trozo))
+        existentes.update(tuple(r) for r in session.exec(q).all())
+    return existentes & set(pares)
+
+def _ids_activos(session: Session, modelo, ids) -> set:
+    activos = set()
+    for trozo in _trozos(sorted(ids)):
+        activos.update(session.exec(
+            select(modelo.id).where(modelo.id.in_(trozo), modelo.is_deleted == False)  # noqa: E712
+        ).all())
+    return activos
+
+def matricular_lote(
+    session: Session,
+    pares: Iterable[Tuple[int, int]],
+    chunk_size: int = 500,
+    conflictos: str = "marcar",
+    lista_espera: bool = False,
+    desde_espera: bool = False,
+) -> Dict[str, Any]:
+    # lista_espera: los pares sin cupo entran en la lista de espera del curso (estado "lista_espera")
+    # desde_espera: promoción (cupos.promover); los pares resueltos salen de la lista
+    if conflictos not in horarios.MODOS_CONFLICTO:
+        raise HTTPException(status_code=400, detail=f"conflictos debe ser uno de {horarios.MODOS_CONFLICTO}")
+    pares = [(int(e), int(c)) for e, c in pares]
+    try:
+        # Validación por conjuntos: una consulta por trozo de estudiantes y otra por trozo de cursos
+        est_ids = {e for e, _ in pares}
+        cur_ids = {c for _, c in pares}
+        # Cupos y créditos se leen y se suman con los contadores bloqueados hasta el commit
+        cupos.bloquear(session, est_ids, cur_ids)
+        est_activos = _ids_activos(session, Estudiante, est_ids)
+        cur_activos = _ids_activos(session, Curso, cur_ids)
+        existentes = _pares_existentes(session, pares) if pares else set()
+
+        resultados: List[Dict[str, Any]] = []
+        pendientes: List[Tuple[int, int]] = []
+        vistos = set()
+        for e, c in pares:
+            if e not in est_activos:
+                estado = "estudiante_no_encontrado"
+            elif c not in cur_activos:
+                estado = "curso_no_encontrado"
+            elif (e, c) in existentes or (e, c) in vistos:
+                estado = "duplicada"
+            else:
+                estado = "creada"
+                vistos.add((e, c))
+                pendientes.append((e, c))
+            resultados.append({"estudiante_id": e, "curso_id": c, "estado": estado})
+
+        # Choques de horario contra la ocupación guardada y entre pares del propio lote
+        if conflictos != "ignorar" and pendientes:
+            chocan = horarios.filtrar_lote(session, pendientes, conflictos == "rechazar")
+            # conflicto_horario solo en las filas comprobadas (las demás lo omiten)
+            for r in resultados:
+                if r["estado"] == "creada":
+                    r["conflicto_horario"] = (r["estudiante_id"], r["curso_id"]) in chocan
+                    if r["conflicto_horario"] and conflictos == "rechazar":
+                        r["estado"] = "conflicto_horario"
+            if conflictos == "rechazar":
+                pendientes = [p for p in pendientes if p not in chocan]
+
+        # Límites: créditos del estudiante y cupo del curso, en el orden del lote
+        fuera = cupos.repartir(session, pendientes, desde_espera) if pendientes else {}
+        if fuera:
+            espera = cupos.poner_en_espera(
+                session, [p for p, motivo in fuera.items() if motivo == "sin_cupo"], conflictos,
+            ) if lista_espera else {}
+            for r in resultados:
+                par = (r["estudiante_id"], r["curso_id"])
+                if r["estado"] == "creada" and par in fuera:
+                    if par in espera:
+                        r["estado"], r["posicion"] = "lista_espera", espera[par]
+                    else:
+                        r["estado"] = fuera[par]
+            pendientes = [p for p in pendientes if p not in fuera]
+
+        # Inserción en bloques multi-fila dentro de una única transacción
+        rechazadas = set()
+        for i in range(0, len(pendientes), chunk_size):
+            bloque = pendientes[i:i + chunk_size]
+            filas = [{"estudiante_id": e, "curso_id": c} for e, c in bloque]
+            try:
+                with session.begin_nested():
+                    session.exec(insert(Matricula).values(filas))
+            except IntegrityError:
+                # Otra petición insertó parte del bloque: se reintenta fila a fila
+                for fila in filas:
+                    try:
+                        with session.begin_nested():
+                            session.exec(insert(Matricula).values(fila))
+                    except IntegrityError:
+                        rechazadas.add((fila["estudiante_id"], fila["curso_id"]))
+        estadisticas.al_matricular(session, (p for p in pendientes if p not in rechazadas))
+        horarios.al_matricular(session, (p for p in pendientes if p not in rechazadas))
+        _subir_version_matriculas(session, [p for p in pendientes if p not in rechazadas])
+        cambios.al_cambiar_matriculas(session, "matricular", [p for p in pendientes if p not in rechazadas])
+        if desde_espera:
+            # Siguen esperando solo los que no cupieron; el resto está matriculado o ya no puede estarlo
+            cupos.quitar_de_espera(session, [p for p in pares if fuera.get(p) != "sin_cupo"])
+        _confirmar(session)
+
+        _tras_confirmar(session, invalidar_cache_matriculas, [p for p in pendientes if p not in rechazadas])
+
+        for r in resultados:
+            if r["estado"] == "creada" and (r["estudiante_id"], r["curso_id"]) in rechazadas:
+                r["estado"] = "duplicada"
+        creadas = sum(1 for r in resultados if r["estado"] == "creada")
+        return {
+            "total": len(resultados),
+            "creadas": creadas,
+            "rechazadas": len(resultados) - creadas,
+            "resultados": resultados,
+        }
+    except SQLAlchemyError as e:
+        _handle_exception(session, e, "Error al crear matrículas en lote")
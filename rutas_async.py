@@ -0,0 +1,335 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from data.schemas import (
+    EstudianteCreate, EstudianteUpdate, EstudianteRead,
+    CursoCreate, CursoUpdate, CursoRead,
+    EstudianteExpandido, CursoExpandido,
+    EstudianteFiltro, CursoFiltro, CambioMasivoRead,
+    OperacionLote, LoteRead,
+)
+from data.models import Estudiante, Curso
+from operations import operations_async as ops
+from operations.operations_db import siguiente_cursor, expandir, parsear_ids, parsear_campos, a_dicts
+from utils import condicional, respuestas
+from utils.condicional import etiqueta
+
+# Handlers async equivalentes a los de main.py. Con DB_MODO=async se instalan
+# en el lugar de sus versiones sync (misma ruta, mismo método, mismo orden).
+
+def crear_router(get_async_session, get_async_read_session) -> APIRouter:
+    router = APIRouter()
+
+    # ESTUDIANTES
+
+    @router.post("/estudiantes/", response_model=EstudianteRead, status_code=201, tags=["Estudiantes"])
+    async def crear_nuevo_estudiante(obj: EstudianteCreate, session: AsyncSession = Depends(get_async_session)):
+        return await ops.crear_estudiante(session, obj)
+
+    @router.get("/estudiantes/", response_model=List[EstudianteExpandido], response_model_exclude_none=True, tags=["Estudiantes"])
+    async def listar_todos_los_estudiantes(
+        request: Request,
+        response: Response,
+        skip: int = 0,
+        limit: int = Query(10, le=100),
+        include_deleted: bool = Query(False, description="Incluir eliminados lógicamente"),
+        semestre: Optional[int] = Query(None, ge=1, le=10),
+        nombre: Optional[str] = None,
+        cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor; tiene prioridad sobre skip"),
+        order_by: str = Query("id", pattern="^(id|nombre|cedula|semestre)$"),
+        expand: Optional[str] = Query(None, pattern="^cursos$", description="Incluye los cursos de cada estudiante"),
+        fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        if not expand:
+            campos = parsear_campos(Estudiante, fields)
+            filas = await ops.listar_estudiantes_filas(
+                session, campos, skip, limit, include_deleted, semestre, nombre, cursor, order_by,
+            )
+            siguiente = siguiente_cursor(filas, limit, order_by)
+            if siguiente:
+                response.headers["X-Next-Cursor"] = siguiente
+            return respuestas.json_rapido(request, response, a_dicts(filas, campos, sin_nulos=True))
+        if fields:
+            raise HTTPException(status_code=400, detail="fields no se puede combinar con expand")
+        items = await ops.listar_estudiantes(session, skip, limit, include_deleted, semestre, nombre, cursor, order_by, expand)
+        siguiente = siguiente_cursor(items, limit, order_by)
+        if siguiente:
+            response.headers["X-Next-Cursor"] = siguiente
+        return expandir(items, expand)
+
+    @router.get("/estudiantes/deleted", response_model=List[EstudianteRead], tags=["Estudiantes"])
+    async def listar_estudiantes_borrados(session: AsyncSession = Depends(get_async_read_session)):
+        return await ops.listar_estudiantes_eliminados(session)
+
+    @router.get("/estudiantes/batch", response_model=List[EstudianteExpandido], response_model_exclude_none=True, tags=["Estudiantes"])
+    async def obtener_estudiantes_lote(
+        response: Response,
+        ids: str = Query(..., description="Ids separados por comas, p. ej. 1,2,3"),
+        expand: Optional[str] = Query(None, pattern="^cursos$"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        items, faltantes = await ops.obtener_lote(session, Estudiante, parsear_ids(ids), expand)
+        if faltantes:
+            response.headers["X-Ids-No-Encontrados"] = ",".join(map(str, faltantes))
+        return expandir(items, expand)
+
+    @router.post("/estudiantes/{estudiante_id}/restore", tags=["Estudiantes"])
+    async def restaurar_estudiante_por_id(estudiante_id: int, session: AsyncSession = Depends(get_async_session)):
+        if await ops.restaurar_estudiante(session, estudiante_id):
+            return {"message": "Estudiante restaurado correctamente (200)"}
+        raise HTTPException(status_code=404, detail="Estudiante no encontrado para restaurar")
+
+    @router.post("/estudiantes/bulk-delete", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Estudiantes"])
+    async def eliminar_estudiantes_por_filtro(filtro: EstudianteFiltro, session: AsyncSession = Depends(get_async_session)):
+        return await ops.cambiar_estado_estudiantes(session, True, filtro.model_dump())
+
+    @router.post("/estudiantes/bulk-restore", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Estudiantes"])
+    async def restaurar_estudiantes_por_filtro(filtro: EstudianteFiltro, session: AsyncSession = Depends(get_async_session)):
+        return await ops.cambiar_estado_estudiantes(session, False, filtro.model_dump())
+
+    @router.get("/estudiantes/search/", response_model=List[EstudianteRead], tags=["Estudiantes"])
+    async def buscar_estudiante(nombre: str = Query(..., min_length=1), session: AsyncSession = Depends(get_async_read_session)):
+        return await ops.buscar_estudiante_por_nombre(session, nombre)
+
+    @router.get("/estudiantes/{estudiante_id}", response_model=EstudianteExpandido, response_model_exclude_none=True, tags=["Estudiantes"])
+    async def obtener_estudiante_por_id(
+        estudiante_id: int,
+        request: Request,
+        response: Response,
+        expand: Optional[str] = Query(None, pattern="^cursos$"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        token, modificado = await ops.version_recurso(session, Estudiante, estudiante_id, relacionados=bool(expand))
+        no_modificado = condicional.responder(request, response, etiqueta("estudiante", estudiante_id, token), modificado)
+        if no_modificado:
+            return no_modificado
+        est = await ops.obtener_estudiante_cacheado(session, estudiante_id)
+        if expand:
+            return {**est, "cursos": await ops.cursos_de_estudiante_cacheado(session, estudiante_id)}
+        return est
+
+    @router.patch("/estudiantes/{estudiante_id}", response_model=EstudianteRead, tags=["Estudiantes"])
+    async def actualizar_datos_estudiante(
+        estudiante_id: int,
+        obj: EstudianteUpdate,
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        version_esperada = None
+        if condicional.trae_if_match(request):
+            token, _ = await ops.version_recurso(session, Estudiante, estudiante_id)
+            condicional.exigir_if_match(request, etiqueta("estudiante", estudiante_id, token))
+            version_esperada = int(token)
+        est = await ops.actualizar_estudiante(session, estudiante_id, obj, version_esperada)
+        response.headers.update(condicional.cabeceras(etiqueta("estudiante", estudiante_id, est.version), est.actualizado_en))
+        return est
+
+    @router.delete("/estudiantes/{estudiante_id}", tags=["Estudiantes"])
+    async def eliminar_estudiante_por_id(estudiante_id: int, session: AsyncSession = Depends(get_async_session)):
+        if await ops.eliminar_estudiante(session, estudiante_id):
+            return {"message": "Estudiante eliminado (Historial)"}
+        raise HTTPException(status_code=404, detail="Estudiante no encontrado")
+
+    # CURSOS
+
+    @router.post("/cursos/", response_model=CursoRead, status_code=201, tags=["Cursos"])
+    async def crear_nuevo_curso(obj: CursoCreate, session: AsyncSession = Depends(get_async_session)):
+        return await ops.crear_curso(session, obj)
+
+    @router.get("/cursos/", response_model=List[CursoExpandido], response_model_exclude_none=True, tags=["Cursos"])
+    async def listar_todos_los_cursos(
+        request: Request,
+        response: Response,
+        skip: int = 0,
+        limit: int = Query(10, le=100),
+        include_deleted: bool = Query(False, description="Incluir eliminados lógicamente"),
+        creditos: Optional[int] = None,
+        codigo: Optional[str] = None,
+        nombre: Optional[str] = None,
+        cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor; tiene prioridad sobre skip"),
+        order_by: str = Query("id", pattern="^(id|codigo|nombre|creditos)$"),
+        expand: Optional[str] = Query(None, pattern="^estudiantes$", description="Incluye los estudiantes de cada curso"),
+        fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        if not expand:
+            campos = parsear_campos(Curso, fields)
+            filas = await ops.listar_cursos_filas(
+                session, campos, skip, limit, include_deleted, creditos, codigo, nombre, cursor, order_by,
+            )
+            siguiente = siguiente_cursor(filas, limit, order_by)
+            if siguiente:
+                response.headers["X-Next-Cursor"] = siguiente
+            return respuestas.json_rapido(request, response, a_dicts(filas, campos, sin_nulos=True))
+        if fields:
+            raise HTTPException(status_code=400, detail="fields no se puede combinar con expand")
+        items = await ops.listar_cursos(session, skip, limit, include_deleted, creditos, codigo, nombre, cursor, order_by, expand)
+        siguiente = siguiente_cursor(items, limit, order_by)
+        if siguiente:
+            response.headers["X-Next-Cursor"] = siguiente
+        return expandir(items, expand)
+
+    @router.get("/cursos/deleted", response_model=List[CursoRead], tags=["Cursos"])
+    async def listar_cursos_borrados(session: AsyncSession = Depends(get_async_read_session)):
+        return await ops.listar_cursos_eliminados(session)
+
+    @router.get("/cursos/batch", response_model=List[CursoExpandido], response_model_exclude_none=True, tags=["Cursos"])
+    async def obtener_cursos_lote(
+        response: Response,
+        ids: str = Query(..., description="Ids separados por comas, p. ej. 1,2,3"),
+        expand: Optional[str] = Query(None, pattern="^estudiantes$"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        items, faltantes = await ops.obtener_lote(session, Curso, parsear_ids(ids), expand)
+        if faltantes:
+            response.headers["X-Ids-No-Encontrados"] = ",".join(map(str, faltantes))
+        return expandir(items, expand)
+
+    @router.post("/cursos/{curso_id}/restore", tags=["Cursos"])
+    async def restaurar_curso_por_id(curso_id: int, session: AsyncSession = Depends(get_async_session)):
+        if await ops.restaurar_curso(session, curso_id):
+            return {"message": "Curso restaurado correctamente (200)"}
+        raise HTTPException(status_code=404, detail="Curso no encontrado para restaurar")
+
+    @router.post("/cursos/bulk-delete", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Cursos"])
+    async def eliminar_cursos_por_filtro(filtro: CursoFiltro, session: AsyncSession = Depends(get_async_session)):
+        return await ops.cambiar_estado_cursos(session, True, filtro.model_dump())
+
+    @router.post("/cursos/bulk-restore", response_model=CambioMasivoRead, response_model_exclude_none=True, tags=["Cursos"])
+    async def restaurar_cursos_por_filtro(filtro: CursoFiltro, session: AsyncSession = Depends(get_async_session)):
+        return await ops.cambiar_estado_cursos(session, False, filtro.model_dump())
+
+    @router.get("/cursos/search/", response_model=List[CursoRead], tags=["Cursos"])
+    async def buscar_curso(nombre: str = Query(..., min_length=1), session: AsyncSession = Depends(get_async_read_session)):
+        return await ops.buscar_curso_por_nombre(session, nombre)
+
+    @router.get("/cursos/{curso_id}", response_model=CursoExpandido, response_model_exclude_none=True, tags=["Cursos"])
+    async def obtener_curso_por_id(
+        curso_id: int,
+        request: Request,
+        response: Response,
+        expand: Optional[str] = Query(None, pattern="^estudiantes$"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        token, modificado = await ops.version_recurso(session, Curso, curso_id, relacionados=bool(expand))
+        no_modificado = condicional.responder(request, response, etiqueta("curso", curso_id, token), modificado)
+        if no_modificado:
+            return no_modificado
+        cur = await ops.obtener_curso_cacheado(session, curso_id)
+        if expand:
+            return {**cur, "estudiantes": await ops.estudiantes_de_curso_cacheado(session, curso_id)}
+        return cur
+
+    @router.patch("/cursos/{curso_id}", response_model=CursoRead, tags=["Cursos"])
+    async def actualizar_datos_curso(
+        curso_id: int,
+        obj: CursoUpdate,
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        version_esperada = None
+        if condicional.trae_if_match(request):
+            token, _ = await ops.version_recurso(session, Curso, curso_id)
+            condicional.exigir_if_match(request, etiqueta("curso", curso_id, token))
+            version_esperada = int(token)
+        cur = await ops.actualizar_curso(session, curso_id, obj, version_esperada)
+        response.headers.update(condicional.cabeceras(etiqueta("curso", curso_id, cur.version), cur.actualizado_en))
+        return cur
+
+    @router.delete("/cursos/{curso_id}", tags=["Cursos"])
+    async def eliminar_curso_por_id(curso_id: int, session: AsyncSession = Depends(get_async_session)):
+        if await ops.eliminar_curso(session, curso_id):
+            return {"message": "Curso eliminado lógicamente (200)"}
+        raise HTTPException(status_code=404, detail="Curso no encontrado")
+
+    # MATRÍCULAS (N:M)
+
+    @router.post("/matriculas/", tags=["Matrículas"], status_code=201)
+    async def crear_matricula(
+        estudiante_id: int,
+        curso_id: int,
+        conflictos: str = Query("marcar", pattern="^(rechazar|marcar|ignorar)$", description="Choques de horario"),
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        return await ops.matricular(session, estudiante_id, curso_id, conflictos)
+
+    @router.delete("/matriculas/", tags=["Matrículas"])
+    async def eliminar_matricula(estudiante_id: int, curso_id: int, session: AsyncSession = Depends(get_async_session)):
+        return await ops.desmatricular(session, estudiante_id, curso_id)
+
+    # LOTE DE OPERACIONES
+
+    @router.post("/batch", response_model=LoteRead, response_model_exclude_none=True, tags=["Lotes"])
+    async def ejecutar_lote_operaciones(
+        operaciones: List[OperacionLote],
+        response: Response,
+        modo: str = Query("atomico", pattern="^(atomico|continuar)$", description="atomico: todo o nada"),
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        cuerpo = await ops.ejecutar_lote(session, operaciones, modo)
+        response.status_code = cuerpo.pop("status")
+        return cuerpo
+
+    @router.get("/estudiantes/{estudiante_id}/cursos", response_model=List[CursoRead], tags=["Matrículas"])
+    async def obtener_cursos_estudiante(
+        estudiante_id: int,
+        request: Request,
+        response: Response,
+        fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        campos = parsear_campos(Curso, fields)
+        token, modificado = await ops.version_recurso(session, Estudiante, estudiante_id, relacionados=True)
+        etag = etiqueta("estudiante", estudiante_id, "cursos", token, "+".join(campos) if fields else None)
+        no_modificado = condicional.responder(request, response, etag, modificado)
+        if no_modificado:
+            return no_modificado
+        if fields:
+            filas = await ops.filas_cursos_de_estudiante(session, estudiante_id, campos)
+        else:
+            filas = await ops.cursos_de_estudiante_cacheado(session, estudiante_id)
+        return respuestas.json_rapido(request, response, filas)
+
+    @router.get("/cursos/{curso_id}/estudiantes", response_model=List[EstudianteRead], tags=["Matrículas"])
+    async def obtener_estudiantes_curso(
+        curso_id: int,
+        request: Request,
+        response: Response,
+        fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (el id va siempre)"),
+        session: AsyncSession = Depends(get_async_read_session),
+    ):
+        campos = parsear_campos(Estudiante, fields)
+        token, modificado = await ops.version_recurso(session, Curso, curso_id, relacionados=True)
+        etag = etiqueta("curso", curso_id, "estudiantes", token, "+".join(campos) if fields else None)
+        no_modificado = condicional.responder(request, response, etag, modificado)
+        if no_modificado:
+            return no_modificado
+        if fields:
+            filas = await ops.filas_estudiantes_de_curso(session, curso_id, campos)
+        else:
+            filas = await ops.estudiantes_de_curso_cacheado(session, curso_id)
+        return respuestas.json_rapido(request, response, filas)
+
+    return router
+
+
+def instalar(app: FastAPI, router: APIRouter) -> None:
+    # Reemplaza in situ cada ruta sync por su equivalente async para conservar
+    # el orden de resolución (p. ej. /estudiantes/deleted antes de /estudiantes/{id})
+    rutas = app.router.routes
+    for nueva in router.routes:
+        iguales = [
+            i for i, actual in enumerate(rutas)
+            if getattr(actual, "path", None) == nueva.path and getattr(actual, "methods", None) == nueva.methods
+        ]
+        if not iguales:
+            rutas.append(nueva)
+            continue
+        rutas[iguales[0]] = nueva
+        for i in reversed(iguales[1:]):
+            del rutas[i]
+    app.openapi_schema = None
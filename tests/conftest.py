@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Base SQLite temporal y sin caché antes de importar main: utils.db crea el engine al importarse
+_TMP = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'tests.db')}"
+os.environ["CACHE_BACKEND"] = "ninguno"
+os.environ["DB_MODO"] = "sync"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_main():
+    import main
+    from utils.migraciones import migrar
+
+    migrar(main.engine)
+    return main
+
+
+@pytest.fixture(scope="session")
+def cliente(app_main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_main.app) as c:
+        yield c
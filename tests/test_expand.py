@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+ESTUDIANTES = 60
+CURSOS = 12
+POR_ESTUDIANTE = 3
+CONSULTAS_POR_PAGINA = 2   # la página y las relaciones de todas sus filas
+
+
+@pytest.fixture(scope="module")
+def poblado(app_main, cliente):
+    from data.models import Estudiante
+    from data.schemas import CursoCreate
+    from operations.operations_db import crear_curso, matricular_lote
+
+    with Session(app_main.engine) as session:
+        session.add_all(
+            Estudiante(cedula=f"{20000 + i}", nombre=f"Estudiante {i}", email=f"e{i}@uni.edu", semestre=1 + i % 10)
+            for i in range(ESTUDIANTES)
+        )
+        session.commit()
+        for i in range(CURSOS):
+            crear_curso(session, CursoCreate(codigo=f"X{i:03d}", nombre=f"Curso {i}", creditos=3))
+        pares = [(e, 1 + (e + k) % CURSOS) for e in range(1, ESTUDIANTES + 1) for k in range(POR_ESTUDIANTE)]
+        matricular_lote(session, pares, conflictos="ignorar")
+    return cliente
+
+
+@pytest.fixture
+def sentencias(app_main):
+    contador = [0]
+
+    def contar(*_):
+        contador[0] += 1
+
+    event.listen(app_main.engine, "before_cursor_execute", contar)
+    yield contador
+    event.remove(app_main.engine, "before_cursor_execute", contar)
+
+
+@pytest.mark.parametrize("ruta, expand, relacion, por_fila", [
+    ("/estudiantes/", "cursos", "cursos", POR_ESTUDIANTE),
+    ("/cursos/", "estudiantes", "estudiantes", None),
+])
+def test_expand_ejecuta_un_numero_fijo_de_consultas(poblado, sentencias, ruta, expand, relacion, por_fila):
+    # Sin N+1: la misma cantidad de sentencias para una página chica y una grande
+    conteos = {}
+    for limit in (5, 10):
+        sentencias[0] = 0
+        resp = poblado.get(ruta, params={"limit": limit, "expand": expand})
+        assert resp.status_code == 200
+        pagina = resp.json()
+        assert len(pagina) == limit
+        assert all(relacion in fila for fila in pagina)
+        if por_fila is not None:
+            assert all(len(fila[relacion]) == por_fila for fila in pagina)
+        conteos[limit] = sentencias[0]
+    assert conteos == {5: CONSULTAS_POR_PAGINA, 10: CONSULTAS_POR_PAGINA}
@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+# CONTADORES
+
+class _Contadores:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores = {
+            "hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expiradas": 0, "invalidaciones": 0, "descartadas": 0,
+        }
+
+    def sumar(self, nombre: str, n: int = 1):
+        with self._lock:
+            self.valores[nombre] += n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            datos = dict(self.valores)
+        consultas = datos["hits"] + datos["misses"]
+        datos["hit_ratio"] = round(datos["hits"] / consultas, 4) if consultas else None
+        return datos
+
+
+# CACHÉ EN PROCESO (LRU + TTL)
+# Generaciones (igual en CacheCompartida): quien falla la lectura toma la generación de la clave antes de ir
+# a la base y la pasa a set(); si entre medias una escritura confirmó e invalidó la clave, la generación
+# cambió y el valor (quizá leído antes del commit) se descarta en lugar de quedar hasta que expire el TTL.
+
+class LRUCache:
+    def __init__(self, max_items: int = 10_000, ttl: float = 60.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()
+        # Generación de las claves invalidadas (acotado a max_items); las olvidadas toman _piso, el mayor
+        # valor descartado, así que una lectura en curso sobre ellas tampoco se guarda
+        self._generaciones: "OrderedDict[str, int]" = OrderedDict()
+        self._ultima_generacion = 0
+        self._piso = 0
+        self._lock = threading.Lock()
+        self.contadores = _Contadores()
+
+    def get(self, clave: str) -> Optional[Any]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira = entrada
+                if expira >= time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.contadores.sumar("hits")
+                    return valor
+                del self._datos[clave]
+                self.contadores.sumar("expiradas")
+        self.contadores.sumar("misses")
+        return None
+
+    def generacion(self, clave: str) -> int:
+        with self._lock:
+            return self._generaciones.get(clave, self._piso)
+
+    def set(self, clave: str, valor: Any, generacion: Optional[int] = None) -> None:
+        with self._lock:
+            if generacion is not None and self._generaciones.get(clave, self._piso) != generacion:
+                self.contadores.sumar("descartadas")
+                return
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+                self.contadores.sumar("evictions")
+        self.contadores.sumar("sets")
+
+    def delete(self, *claves: str) -> None:
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+                self._ultima_generacion += 1
+                self._generaciones[clave] = self._ultima_generacion
+                self._generaciones.move_to_end(clave)
+            while len(self._generaciones) > self.max_items:
+                _, generacion = self._generaciones.popitem(last=False)
+                self._piso = max(self._piso, generacion)
+        self.contadores.sumar("invalidaciones", len(claves))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memoria", "items": len(self._datos), "max_items": self.max_items,
+                "ttl": self.ttl, **self.contadores.snapshot()}
+
+
+# CACHÉ COMPARTIDA (interfaz para Redis/Memcached u otro almacén externo)
+
+# Almacén clave/valor de bytes compartido entre procesos
+class BackendCompartido(ABC):
+    @abstractmethod
+    def get(self, clave: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def set(self, clave: str, valor: bytes, ttl: float) -> None: ...
+
+    @abstractmethod
+    def delete(self, *claves: str) -> None: ...
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    # Generaciones (en Redis: INCR + EXPIRE, y WATCH/MULTI o un script Lua para el set condicional)
+    @abstractmethod
+    def incrementar(self, clave: str, ttl: float) -> int: ...
+
+    @abstractmethod
+    def set_si(self, clave: str, valor: bytes, ttl: float, control: str, esperado: int) -> bool:
+        # Escribe solo si el contador `control` sigue valiendo `esperado` (0 si no existe), de forma atómica
+        ...
+
+# Sustituto local de un backend compartido (desarrollo y pruebas)
+class BackendLocal(BackendCompartido):
+    def __init__(self):
+        self._datos: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave: str) -> Optional[bytes]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[1] < time.monotonic():
+                self._datos.pop(clave, None)
+                return None
+            return entrada[0]
+
+    def set(self, clave: str, valor: bytes, ttl: float) -> None:
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + ttl)
+
+    def delete(self, *claves: str) -> None:
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def incrementar(self, clave: str, ttl: float) -> int:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            actual = int(entrada[0]) if entrada is not None and entrada[1] >= time.monotonic() else 0
+            self._datos[clave] = (str(actual + 1).encode(), time.monotonic() + ttl)
+            return actual + 1
+
+    def set_si(self, clave: str, valor: bytes, ttl: float, control: str, esperado: int) -> bool:
+        with self._lock:
+            entrada = self._datos.get(control)
+            actual = int(entrada[0]) if entrada is not None and entrada[1] >= time.monotonic() else 0
+            if actual != esperado:
+                return False
+            self._datos[clave] = (valor, time.monotonic() + ttl)
+            return True
+
+class CacheCompartida:
+    def __init__(self, backend: BackendCompartido, ttl: float = 60.0, prefijo: str = "universidad:"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self.contadores = _Contadores()
+
+    def get(self, clave: str) -> Optional[Any]:
+        crudo = self.backend.get(self.prefijo + clave)
+        if crudo is None:
+            self.contadores.sumar("misses")
+            return None
+        self.contadores.sumar("hits")
+        return json.loads(crudo)
+
+    # La generación vive en el backend (compartida entre procesos) con el doble del TTL: una lectura más
+    # lenta que eso podría no ver la invalidación
+    def _control(self, clave: str) -> str:
+        return self.prefijo + "gen:" + clave
+
+    def generacion(self, clave: str) -> int:
+        return int(self.backend.get(self._control(clave)) or 0)
+
+    def set(self, clave: str, valor: Any, generacion: Optional[int] = None) -> None:
+        crudo = json.dumps(valor).encode()
+        if generacion is None:
+            self.backend.set(self.prefijo + clave, crudo, self.ttl)
+        elif not self.backend.set_si(self.prefijo + clave, crudo, self.ttl, self._control(clave), generacion):
+            self.contadores.sumar("descartadas")
+            return
+        self.contadores.sumar("sets")
+
+    def delete(self, *claves: str) -> None:
+        self.backend.delete(*(self.prefijo + c for c in claves))
+        for clave in claves:
+            self.backend.incrementar(self._control(clave), 2 * self.ttl)
+        self.contadores.sumar("invalidaciones", len(claves))
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self.backend).__name__, "ttl": self.ttl, **self.contadores.snapshot()}
+
+class CacheNula:
+    def get(self, clave: str) -> Optional[Any]:
+        return None
+
+    def generacion(self, clave: str) -> int:
+        return 0
+
+    def set(self, clave: str, valor: Any, generacion: Optional[int] = None) -> None:
+        pass
+
+    def delete(self, *claves: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "deshabilitada"}
+
+
+# CONFIGURACIÓN (CACHE_BACKEND=memoria|compartido|ninguno, CACHE_TTL, CACHE_MAX_ITEMS)
+
+def crear_cache(backend: Optional[str] = None):
+    backend = backend or os.getenv("CACHE_BACKEND", "memoria")
+    ttl = float(os.getenv("CACHE_TTL", "60"))
+    if backend == "ninguno":
+        return CacheNula()
+    if backend == "compartido":
+        return CacheCompartida(BackendLocal(), ttl=ttl)
+    return LRUCache(max_items=int(os.getenv("CACHE_MAX_ITEMS", "10000")), ttl=ttl)
+
+cache = crear_cache()
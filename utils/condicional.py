@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+
+# PETICIONES CONDICIONALES (RFC 9110)
+# El token sale de operations_db.version_recurso (una consulta de columnas, sin cargar el objeto);
+# con If-None-Match / If-Modified-Since vigentes se responde 304 sin leer la caché ni cargar el objeto.
+
+def etiqueta(*partes) -> str:
+    # ETag fuerte: "estudiante-5-3", "curso-7-estudiantes-4.12.310"
+    return '"' + "-".join(str(p) for p in partes if p is not None) + '"'
+
+def _etiquetas(valor: str) -> List[str]:
+    return [e.strip() for e in valor.split(",") if e.strip()]
+
+def _fecha_http(fecha: datetime) -> str:
+    return format_datetime(fecha.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def cabeceras(etag: str, modificado: Optional[datetime]) -> Dict[str, str]:
+    # no-cache: el cliente puede guardar la respuesta pero debe revalidarla en cada uso
+    valores = {"ETag": etag, "Cache-Control": "no-cache"}
+    if modificado is not None:
+        valores["Last-Modified"] = _fecha_http(modificado)
+    return valores
+
+def no_modificado(request: Request, etag: str, modificado: Optional[datetime]) -> bool:
+    # If-None-Match tiene prioridad; la comparación es débil (W/"x" equivale a "x")
+    si_no_coincide = request.headers.get("if-none-match")
+    if si_no_coincide is not None:
+        if si_no_coincide.strip() == "*":
+            return True
+        return etag in (e.removeprefix("W/") for e in _etiquetas(si_no_coincide))
+    desde = request.headers.get("if-modified-since")
+    if not desde or modificado is None:
+        return False
+    try:
+        fecha = parsedate_to_datetime(desde)
+    except (TypeError, ValueError):
+        return False
+    if fecha.tzinfo is None:
+        return False
+    return modificado.replace(tzinfo=timezone.utc, microsecond=0) <= fecha
+
+def responder(request: Request, response: Response, etag: str, modificado: Optional[datetime]) -> Optional[Response]:
+    # Devuelve el 304 a retornar tal cual, o None tras dejar las cabeceras en la respuesta normal
+    valores = cabeceras(etag, modificado)
+    if request.method in ("GET", "HEAD") and no_modificado(request, etag, modificado):
+        return Response(status_code=304, headers=valores)
+    response.headers.update(valores)
+    return None
+
+def trae_if_match(request: Request) -> bool:
+    return request.headers.get("if-match") is not None
+
+def exigir_if_match(request: Request, etag: str) -> None:
+    # Comparación fuerte: una etiqueta débil nunca coincide
+    valor = request.headers.get("if-match")
+    if valor is None or valor.strip() == "*":
+        return
+    if etag not in _etiquetas(valor):
+        raise HTTPException(status_code=412, detail="El recurso cambió desde que se leyó (If-Match no coincide)")
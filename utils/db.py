@@ -1,16 +1,173 @@
-from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel import create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
+from utils.metricas import instrumentar_engine
 import os
+import threading
+import time
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# CONFIGURACIÓN (variables de entorno o .env)
 
-engine = create_engine(DATABASE_URL, echo=True)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database_universidad.db")
+DB_MODO = os.getenv("DB_MODO", "sync")  # sync | async
+
+def _env_int(nombre: str, defecto: int) -> int:
+    return int(os.getenv(nombre, defecto))
+
+def _env_bool(nombre: str, defecto: bool = False) -> bool:
+    return os.getenv(nombre, str(defecto)).lower() in ("1", "true", "yes", "si")
+
+# Valores por defecto ajustados por backend; cualquiera se puede sobreescribir por entorno
+DEFAULTS = {
+    "sqlite": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_recycle": -1, "pool_pre_ping": False},
+    "postgresql": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_recycle": 1800, "pool_pre_ping": True},
+}
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -64000),      # KiB negativos = 64 MB
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 268435456),     # 256 MB
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT", 10000),   # ms
+    "temp_store": "MEMORY",
+}
+
+
+# POOL INSTRUMENTADO
+
+class PoolInstrumentado(QueuePool):
+    # QueuePool que mide cuánto espera cada checkout y cuántos agotan pool_timeout
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_stats = threading.Lock()
+        self.stats = {"checkouts": 0, "timeouts": 0, "espera_total_ms": 0.0, "espera_max_ms": 0.0}
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._lock_stats:
+                self.stats["timeouts"] += 1
+            raise
+        finally:
+            espera = (time.perf_counter() - inicio) * 1000
+            with self._lock_stats:
+                self.stats["checkouts"] += 1
+                self.stats["espera_total_ms"] += espera
+                self.stats["espera_max_ms"] = max(self.stats["espera_max_ms"], espera)
+
+    def recreate(self):
+        nuevo = super().recreate()
+        nuevo.stats = self.stats
+        return nuevo
+
+def estadisticas_pool(engine_: Engine = None) -> dict:
+    pool = (engine_ or engine).pool
+    datos = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        datos.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    stats = getattr(pool, "stats", None)
+    if stats:
+        datos.update(stats)
+        datos["espera_media_ms"] = round(stats["espera_total_ms"] / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+    return datos
+
+
+# FÁBRICA DE ENGINES
+
+def _es_sqlite_en_memoria(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def _aplicar_pragmas(dbapi_connection, _record):
+    cursor = dbapi_connection.cursor()
+    for pragma, valor in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={valor}")
+    cursor.close()
+
+def opciones_engine(url: str) -> dict:
+    url_obj = make_url(url)
+    backend = url_obj.get_backend_name()
+    opciones = {"echo": _env_bool("DB_ECHO")}
+    if backend == "sqlite":
+        opciones["connect_args"] = {"check_same_thread": False}
+        if _es_sqlite_en_memoria(url_obj):
+            return opciones
+    base = DEFAULTS.get(backend, DEFAULTS["postgresql"])
+    opciones.update({
+        "pool_size": _env_int("DB_POOL_SIZE", base["pool_size"]),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", base["max_overflow"]),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", base["pool_timeout"]),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", base["pool_recycle"]),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", base["pool_pre_ping"]),
+    })
+    return opciones
+
+def crear_engine(url: str = None) -> Engine:
+    url = url or DATABASE_URL
+    opciones = opciones_engine(url)
+    if "pool_size" in opciones:
+        opciones["poolclass"] = PoolInstrumentado
+    nuevo = create_engine(url, **opciones)
+    if nuevo.dialect.name == "sqlite":
+        event.listen(nuevo, "connect", _aplicar_pragmas)
+    instrumentar_engine(nuevo)
+    return nuevo
+
+def url_async(url: str) -> str:
+    for sync, asincrono in (("sqlite://", "sqlite+aiosqlite://"),
+                            ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+                            ("postgresql://", "postgresql+asyncpg://")):
+        if url.startswith(sync):
+            return asincrono + url[len(sync):]
+    return url
+
+def crear_async_engine(url: str = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    url = url or DATABASE_URL
+    nuevo = create_async_engine(url_async(url), **opciones_engine(url))
+    if nuevo.dialect.name == "sqlite":
+        event.listen(nuevo.sync_engine, "connect", _aplicar_pragmas)
+    instrumentar_engine(nuevo.sync_engine)
+    return nuevo
+
+
+# ENGINE Y SESIONES DE LA APLICACIÓN
+
+engine = crear_engine()
+async_engine = crear_async_engine() if DB_MODO == "async" else None
 
 def crear_db():
-    SQLModel.metadata.create_all(engine)
+    from utils.migraciones import migrar
+    migrar(engine)
+
+def es_replica(session) -> bool:
+    # Sesiones de lectura abiertas sobre una réplica (utils/replicas.py)
+    return bool(session.info.get("replica"))
+
+def abrir_transaccion(session) -> None:
+    # pysqlite no emite BEGIN hasta el primer INSERT/UPDATE: un SAVEPOINT abierto antes (begin_nested) se
+    # confirmaría solo al liberarse. BEGIN IMMEDIATE abre la transacción y toma ya el bloqueo de escritura,
+    # así un lote largo no falla a mitad con SQLITE_BUSY al pasar de lectura a escritura.
+    if session.get_bind().dialect.name == "sqlite":
+        conexion = session.connection()
+        if not getattr(conexion.connection.dbapi_connection, "in_transaction", False):
+            conexion.exec_driver_sql("BEGIN IMMEDIATE")
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    async with AsyncSession(async_engine) as session:
+        yield session
@@ -0,0 +1,76 @@
+import re
+from typing import Iterable, List, NamedTuple
+
+# Formato de Curso.horario: uno o más tramos "<días> <inicio>-<fin>" separados por ';' o ','
+#   "Lu 08-10"   "Lu/Mi 08:30-10:00"   "Ma 14-16; Ju 10-12"
+# La ocupación semanal se representa como máscara de bits: un bit por bloque de
+# RESOLUCION minutos, 7 días. Dos horarios chocan si (a & b) != 0.
+
+DIAS = ("lu", "ma", "mi", "ju", "vi", "sa", "do")
+RESOLUCION = 30
+BLOQUES_DIA = 24 * 60 // RESOLUCION
+BITS = 7 * BLOQUES_DIA
+
+_DIA = r"(?:lu|ma|mi|ju|vi|sa|do)"
+_HORA = r"\d{1,2}(?::\d{2})?"
+_TRAMO = re.compile(
+    rf"(?P<dias>{_DIA}(?:\s*[/,]\s*{_DIA})*)\s+(?P<inicio>{_HORA})\s*-\s*(?P<fin>{_HORA})",
+    re.IGNORECASE,
+)
+_SEPARADORES = re.compile(r"[\s;,]*")
+
+
+class Franja(NamedTuple):
+    dia: int      # 0 = lunes
+    inicio: int   # minutos desde medianoche
+    fin: int
+
+
+def _minutos(texto: str) -> int:
+    horas, _, minutos = texto.partition(":")
+    total = int(horas) * 60 + int(minutos or 0)
+    if int(minutos or 0) >= 60 or total > 24 * 60:
+        raise ValueError(f"Hora inválida: '{texto}'")
+    return total
+
+def parsear(horario: str) -> List[Franja]:
+    horario = (horario or "").strip()
+    franjas: List[Franja] = []
+    pos = 0
+    for m in _TRAMO.finditer(horario):
+        if not _SEPARADORES.fullmatch(horario[pos:m.start()]):
+            raise ValueError(f"Horario inválido cerca de '{horario[pos:m.start()].strip()}'")
+        pos = m.end()
+        inicio, fin = _minutos(m["inicio"]), _minutos(m["fin"])
+        if inicio >= fin:
+            raise ValueError(f"El inicio debe ser anterior al fin en '{m.group(0)}'")
+        for dia in re.split(r"\s*[/,]\s*", m["dias"].lower()):
+            franjas.append(Franja(DIAS.index(dia), inicio, fin))
+    if not _SEPARADORES.fullmatch(horario[pos:]):
+        raise ValueError(f"Horario inválido cerca de '{horario[pos:].strip()}' (ej: 'Lu 08-10', 'Lu/Mi 08:30-10:00')")
+    return franjas
+
+def validar(horario: str) -> str:
+    parsear(horario)
+    return horario
+
+
+# MÁSCARAS
+
+def mascara(franjas: Iterable[Franja]) -> int:
+    # Se redondea hacia afuera: un tramo 08:15-09:00 ocupa el bloque 08:00-08:30
+    total = 0
+    for f in franjas:
+        desde = f.dia * BLOQUES_DIA + f.inicio // RESOLUCION
+        hasta = f.dia * BLOQUES_DIA + -(-f.fin // RESOLUCION)
+        total |= ((1 << (hasta - desde)) - 1) << desde
+    return total
+
+def a_hex(valor: int) -> str:
+    return f"{valor:0{BITS // 4}x}"
+
+def desde_hex(texto: str) -> int:
+    return int(texto, 16) if texto else 0
+
+def a_texto(f: Franja) -> str:
+    return f"{DIAS[f.dia].capitalize()} {f.inicio // 60:02d}:{f.inicio % 60:02d}-{f.fin // 60:02d}:{f.fin % 60:02d}"
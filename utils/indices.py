@@ -0,0 +1,57 @@
+import sys
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Index, inspect
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel
+
+import data.models  # noqa: F401 - registra las tablas y sus __table_args__ en la metadata
+
+
+# PASO GESTIONADO DE ÍNDICES
+# create_all solo crea los índices junto con tablas nuevas; en bases existentes este paso crea los
+# índices declarados en data/models.py que falten y actualiza las estadísticas del planificador.
+
+def indices_faltantes(engine: Engine) -> List[Index]:
+    inspector = inspect(engine)
+    faltantes = []
+    for tabla in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            continue
+        existentes = {ix["name"] for ix in inspector.get_indexes(tabla.name)}
+        faltantes += [ix for ix in sorted(tabla.indexes, key=lambda i: i.name) if ix.name not in existentes]
+    return faltantes
+
+def analizar(engine: Engine, tablas: Optional[Iterable[str]] = None) -> None:
+    # Estadísticas para el planificador (sqlite_stat1 / pg_statistic)
+    with engine.begin() as conn:
+        if tablas is None:
+            conn.exec_driver_sql("ANALYZE")
+        else:
+            for tabla in sorted(set(tablas)):
+                conn.exec_driver_sql(f"ANALYZE {tabla}")
+
+def crear_indices(engine: Engine) -> List[str]:
+    faltantes = indices_faltantes(engine)
+    if not faltantes:
+        return []
+    with engine.begin() as conn:
+        for ix in faltantes:
+            ix.create(conn)
+    analizar(engine, {ix.table.name for ix in faltantes})
+    return [ix.name for ix in faltantes]
+
+
+def main():
+    from utils.db import engine
+    from utils.migraciones import verificar
+    verificar(engine)
+    creados = crear_indices(engine)
+    print(f"{len(creados)} índices creados" + (f": {', '.join(creados)}" if creados else ""))
+    if "--analyze" in sys.argv[1:]:
+        analizar(engine)
+        print("ANALYZE completo")
+
+
+if __name__ == "__main__":
+    main()
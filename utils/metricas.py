@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# CONFIGURACIÓN (variables de entorno)
+
+METRICAS = os.getenv("METRICAS", "true").lower() in ("1", "true", "yes", "si")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))          # 0 = sin log de consultas lentas
+SLOW_QUERY_PARAMS = os.getenv("SLOW_QUERY_PARAMS", "true").lower() in ("1", "true", "yes", "si")
+SLOW_QUERY_MAX_CHARS = int(os.getenv("SLOW_QUERY_MAX_CHARS", 2000))
+
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+log_lentas = logging.getLogger("universidad.sql.lenta")
+
+
+# HISTOGRAMAS Y CONTADORES (formato de exposición de Prometheus)
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valores: Tuple[str, ...], valor: float) -> None:
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for valores, (conteos, suma, total) in sorted(series.items()):
+            base = _etiquetas(self.etiquetas, valores)
+            acumulado = 0
+            for limite, n in zip(self.buckets, conteos):
+                acumulado += n
+                lineas.append(f'{self.nombre}_bucket{{{base}{"," if base else ""}le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{"," if base else ""}le="+Inf"}} {total}')
+            lineas.append(f"{self.nombre}_sum{{{base}}} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{{{base}}} {total}")
+        return lineas
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...]):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, valores: Tuple[str, ...], n: float = 1) -> None:
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + n
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for valores, n in sorted(series.items()):
+            lineas.append(f"{self.nombre}{{{_etiquetas(self.etiquetas, valores)}}} {n:g}")
+        return lineas
+
+def _etiquetas(nombres: Tuple[str, ...], valores: Tuple[str, ...]) -> str:
+    return ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores))
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+DURACION_HTTP = Histograma(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta",
+    ("method", "route", "status"), BUCKETS_SEGUNDOS,
+)
+CONSULTAS_POR_PETICION = Histograma(
+    "db_queries_per_request", "Sentencias SQL ejecutadas por petición", ("method", "route"), BUCKETS_CONSULTAS,
+)
+TIEMPO_DB_POR_PETICION = Histograma(
+    "db_time_per_request_seconds", "Tiempo en la base de datos por petición", ("method", "route"), BUCKETS_SEGUNDOS,
+)
+CONSULTAS_LENTAS = Contador(
+    "db_slow_queries_total", f"Sentencias que superan SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)", ("route",),
+)
+
+_METRICAS = [DURACION_HTTP, CONSULTAS_POR_PETICION, TIEMPO_DB_POR_PETICION, CONSULTAS_LENTAS]
+_GAUGES: List[Tuple[str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = []
+
+def registrar_gauge(nombre: str, ayuda: str, leer: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]) -> None:
+    # leer() -> {((etiqueta, valor), ...): número}; se evalúa en cada scrape de /metrics
+    _GAUGES.append((nombre, ayuda, leer))
+
+def exportar() -> str:
+    lineas: List[str] = []
+    for metrica in _METRICAS:
+        lineas += metrica.exportar()
+    for nombre, ayuda, leer in _GAUGES:
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+        for etiquetas, valor in leer().items():
+            base = ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas)
+            lineas.append(f"{nombre}{{{base}}} {valor:g}")
+    return "\n".join(lineas) + "\n"
+
+
+# ESTADO POR PETICIÓN (contextvar: lo comparten el hilo del endpoint sync y el greenlet async)
+
+class _Peticion:
+    __slots__ = ("consultas", "tiempo_db", "scope")
+
+    def __init__(self, scope):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.scope = scope
+
+    @property
+    def ruta(self) -> str:
+        # Plantilla de la ruta (/estudiantes/{estudiante_id}); FastAPI la deja en el scope al enrutar
+        ruta = self.scope.get("route")
+        return ruta.path if ruta is not None else "sin_ruta"
+
+_peticion: ContextVar[Optional[_Peticion]] = ContextVar("peticion_metricas", default=None)
+
+
+# HOOKS DE SQLALCHEMY
+
+def _antes(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+def _despues(conn, _cursor, statement, parameters, _context, executemany):
+    inicios = conn.info.get("metricas_inicio")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    estado = _peticion.get()
+    if estado is not None:
+        estado.consultas += 1
+        estado.tiempo_db += duracion
+    if SLOW_QUERY_MS and duracion * 1000 >= SLOW_QUERY_MS:
+        ruta = estado.ruta if estado is not None else "fuera_de_peticion"
+        CONSULTAS_LENTAS.sumar((ruta,))
+        texto = " ".join(statement.split())[:SLOW_QUERY_MAX_CHARS]
+        params = str(parameters)[:SLOW_QUERY_MAX_CHARS] if SLOW_QUERY_PARAMS else "<omitidos>"
+        log_lentas.warning(
+            "consulta lenta %.1f ms ruta=%s executemany=%s sql=%s params=%s",
+            duracion * 1000, ruta, executemany, texto, params,
+        )
+
+def instrumentar_engine(engine_: Engine) -> None:
+    if not METRICAS or event.contains(engine_, "after_cursor_execute", _despues):
+        return
+    event.listen(engine_, "before_cursor_execute", _antes)
+    event.listen(engine_, "after_cursor_execute", _despues)
+
+
+# MIDDLEWARE ASGI (sin BaseHTTPMiddleware: no envuelve el body ni crea tareas extra)
+
+class MetricasMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICAS:
+            await self.app(scope, receive, send)
+            return
+
+        estado = _Peticion(scope)
+        token = _peticion.set(estado)
+        inicio = time.perf_counter()
+        codigo = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                codigo[0] = mensaje["status"]
+                total_ms = (time.perf_counter() - inicio) * 1000
+                cabeceras = list(mensaje.get("headers", []))
+                cabeceras.append((b"server-timing", (
+                    f"db;dur={estado.tiempo_db * 1000:.2f};desc=\"{estado.consultas} consultas\", "
+                    f"app;dur={total_ms:.2f}"
+                ).encode()))
+                mensaje["headers"] = cabeceras
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _peticion.reset(token)
+            etiqueta = estado.ruta
+            metodo = scope["method"]
+            DURACION_HTTP.observar((metodo, etiqueta, str(codigo[0])), time.perf_counter() - inicio)
+            CONSULTAS_POR_PETICION.observar((metodo, etiqueta), estado.consultas)
+            TIEMPO_DB_POR_PETICION.observar((metodo, etiqueta), estado.tiempo_db)
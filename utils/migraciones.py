@@ -0,0 +1,221 @@
+import argparse
+import logging
+import os
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger("universidad.migraciones")
+
+# CONFIGURACIÓN
+# false (defecto): el arranque solo verifica la versión y falla si la base está atrasada; se migra una vez con
+# `python -m utils.migraciones migrate` antes de levantar los workers. Migrar en cada worker los pondría a
+# competir por las mismas migraciones, y en SQLite _bloqueo no serializa nada.
+# true: el arranque migra (opt-in para desarrollo, un solo proceso).
+MIGRAR_AL_ARRANCAR = os.getenv("MIGRAR_AL_ARRANCAR", "false").lower() in ("1", "true", "yes", "si")
+
+_metadata = MetaData()
+VERSION_ESQUEMA = Table(
+    "schema_version", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("descripcion", String(200), nullable=False),
+    Column("aplicada_en", DateTime, nullable=False),
+)
+
+
+# MIGRACIONES (solo hacia adelante)
+# La 1 crea las tablas desde data/models.py, así que en una base nueva ya nacen con el esquema actual:
+# las siguientes deben ser idempotentes (comprobar antes de alterar). Los imports van dentro de cada
+# paso para que verificar la versión al arrancar no cargue nada de esto.
+
+class Migracion(NamedTuple):
+    version: int
+    descripcion: str
+    aplicar: Callable[[Engine], None]
+
+def _esquema_base(engine: Engine) -> None:
+    from sqlmodel import SQLModel
+    import data.models  # noqa: F401
+    SQLModel.metadata.create_all(engine)
+
+def _indices(engine: Engine) -> None:
+    from utils.indices import crear_indices
+    crear_indices(engine)
+
+def _busqueda(engine: Engine) -> None:
+    from operations.busqueda import crear_indices_busqueda
+    crear_indices_busqueda(engine)
+
+def _estadisticas(engine: Engine) -> None:
+    from operations import estadisticas
+    estadisticas.inicializar(engine)
+
+def _franjas(engine: Engine) -> None:
+    from operations import horarios
+    horarios.inicializar(engine)
+
+def _versiones(engine: Engine) -> None:
+    # version / actualizado_en en TableBase (ETag, Last-Modified y control optimista en PATCH)
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for tabla in ("estudiante", "curso"):
+            columnas = {c["name"] for c in inspector.get_columns(tabla)}
+            for columna in ("version", "version_matriculas"):
+                if columna not in columnas:
+                    conn.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN {columna} INTEGER NOT NULL DEFAULT 1")
+            if "actualizado_en" not in columnas:
+                conn.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN actualizado_en TIMESTAMP")
+                conn.exec_driver_sql(f"UPDATE {tabla} SET actualizado_en = CURRENT_TIMESTAMP")
+
+def _cambios(engine: Engine) -> None:
+    from data.models import Cambio
+    Cambio.__table__.create(engine, checkfirst=True)
+
+def _archivo(engine: Engine) -> None:
+    # eliminado_en (los ya eliminados toman su última modificación) y las tablas de archivo
+    from data.models import EstudianteArchivo, CursoArchivo, MatriculaArchivo
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for tabla in ("estudiante", "curso"):
+            if "eliminado_en" not in {c["name"] for c in inspector.get_columns(tabla)}:
+                conn.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN eliminado_en TIMESTAMP")
+                conn.exec_driver_sql(f"UPDATE {tabla} SET eliminado_en = actualizado_en WHERE is_deleted")
+    for modelo in (EstudianteArchivo, CursoArchivo, MatriculaArchivo):
+        modelo.__table__.create(engine, checkfirst=True)
+
+def _cupos(engine: Engine) -> None:
+    # Curso.cupo (NULL = sin límite, como hasta ahora) también en el archivo, y la lista de espera
+    from data.models import ListaEspera
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for tabla in ("curso", "curso_archivo"):
+            if "cupo" not in {c["name"] for c in inspector.get_columns(tabla)}:
+                conn.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN cupo INTEGER")
+    ListaEspera.__table__.create(engine, checkfirst=True)
+
+def _busqueda_activos(engine: Engine) -> None:
+    # Búsqueda solo sobre filas activas (SQLite: triggers nuevos y reindexado) y sin acentos
+    # (PostgreSQL: unaccent e índices trigram sobre f_unaccent(lower(col)))
+    from operations.busqueda import crear_indices_busqueda
+    crear_indices_busqueda(engine, reconstruir=True)
+
+def _cambios_pendientes(engine: Engine) -> None:
+    # PostgreSQL: los cambios se escriben sin el advisory lock global y reciben su offset al secuenciarse
+    from data.models import CambioPendiente
+    CambioPendiente.__table__.create(engine, checkfirst=True)
+
+def _busqueda_subcadenas(engine: Engine) -> None:
+    # SQLite: tablas FTS5 trigram para los filtros nombre=/codigo= (subcadena, como ilike)
+    from operations.busqueda import crear_indices_busqueda
+    crear_indices_busqueda(engine)
+
+MIGRACIONES: List[Migracion] = [
+    Migracion(1, "Tablas de data/models.py", _esquema_base),
+    Migracion(2, "Índices inversos y parciales", _indices),
+    Migracion(3, "Índices de búsqueda de texto (FTS5 / pg_trgm)", _busqueda),
+    Migracion(4, "Contadores de estadísticas", _estadisticas),
+    Migracion(5, "Franjas horarias y ocupación", _franjas),
+    Migracion(6, "Versión de fila y fecha de modificación (ETag / If-Match)", _versiones),
+    Migracion(7, "Registro de cambios (feed /changes)", _cambios),
+    Migracion(8, "Fecha de borrado y tablas de archivo", _archivo),
+    Migracion(9, "Cupo de cursos y lista de espera", _cupos),
+    Migracion(10, "Índices de búsqueda solo con filas activas y sin acentos", _busqueda_activos),
+    Migracion(11, "Cambios pendientes de offset (PostgreSQL)", _cambios_pendientes),
+    Migracion(12, "Índices trigram para los filtros de listado", _busqueda_subcadenas),
+]
+ULTIMA = MIGRACIONES[-1].version
+
+
+# VERSIÓN
+
+def version_actual(engine: Engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(VERSION_ESQUEMA.name):
+            return 0
+        return conn.execute(select(func.max(VERSION_ESQUEMA.c.version))).scalar() or 0
+
+def pendientes(engine: Engine) -> List[Migracion]:
+    actual = version_actual(engine)
+    return [m for m in MIGRACIONES if m.version > actual]
+
+@contextmanager
+def _bloqueo(engine: Engine):
+    # PostgreSQL: advisory lock para que dos procesos no migren a la vez.
+    # SQLite serializa las escrituras y cada paso es idempotente.
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    clave = zlib.crc32(b"universidad.migraciones")
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"SELECT pg_advisory_lock({clave})")
+        try:
+            yield
+        finally:
+            conn.exec_driver_sql(f"SELECT pg_advisory_unlock({clave})")
+            conn.commit()
+
+def migrar(engine: Engine, hasta: Optional[int] = None) -> List[int]:
+    aplicadas = []
+    with _bloqueo(engine):
+        _metadata.create_all(engine)
+        for m in pendientes(engine):
+            if hasta is not None and m.version > hasta:
+                break
+            inicio = time.perf_counter()
+            m.aplicar(engine)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(VERSION_ESQUEMA).values(
+                        version=m.version, descripcion=m.descripcion, aplicada_en=datetime.now(timezone.utc),
+                    ))
+            except IntegrityError:
+                pass  # otro proceso la registró mientras tanto
+            log.info("migración %s aplicada en %.2fs: %s", m.version, time.perf_counter() - inicio, m.descripcion)
+            aplicadas.append(m.version)
+    return aplicadas
+
+def verificar(engine: Engine, migrar_si_falta: Optional[bool] = None) -> int:
+    # Lo que corre en cada arranque: una consulta si la base ya está al día
+    actual = version_actual(engine)
+    if actual == ULTIMA:
+        return actual
+    if actual > ULTIMA:
+        raise RuntimeError(f"La base está en la versión {actual} y este código solo conoce hasta la {ULTIMA}")
+    if not (MIGRAR_AL_ARRANCAR if migrar_si_falta is None else migrar_si_falta):
+        raise RuntimeError(
+            f"Esquema en versión {actual}, se requiere la {ULTIMA}: ejecute `python -m utils.migraciones migrate`"
+        )
+    migrar(engine)
+    return ULTIMA
+
+
+# CLI (python -m utils.migraciones status|migrate)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Migraciones versionadas del esquema")
+    parser.add_argument("comando", choices=("status", "migrate"))
+    parser.add_argument("--hasta", type=int, help="Versión objetivo (por defecto la última)")
+    parser.add_argument("--database-url", help="Por defecto DATABASE_URL")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from utils.db import crear_engine, engine as engine_app
+    engine = crear_engine(args.database_url) if args.database_url else engine_app
+
+    if args.comando == "migrate":
+        aplicadas = migrar(engine, args.hasta)
+        print(f"{len(aplicadas)} migraciones aplicadas" + (f": {aplicadas}" if aplicadas else ""))
+    actual = version_actual(engine)
+    print(f"versión actual: {actual} / última: {ULTIMA}")
+    for m in MIGRACIONES:
+        print(f"  [{'x' if m.version <= actual else ' '}] {m.version:>3} {m.descripcion}")
+
+
+if __name__ == "__main__":
+    main()
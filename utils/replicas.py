@@ -0,0 +1,288 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import func, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from utils.db import DB_MODO, engine, crear_engine, crear_async_engine, estadisticas_pool
+
+log = logging.getLogger("universidad.replicas")
+
+# Las lecturas (listar_*, obtener_*, buscar_*, rosters, estadísticas, exportación) se reparten en round-robin
+# entre las réplicas sanas; las escrituras y todo lo que no pase por get_read_session siguen en el primario.
+# Una réplica deja de recibir lecturas si no responde o si su atraso supera REPLICA_MAX_ATRASO_S (se mide
+# contra el feed de cambios: antigüedad de la escritura más vieja que la réplica aún no tiene). Sin réplicas
+# sanas todo va al primario.
+# Read-your-writes: tras una escritura correcta el cliente recibe la cookie leer_primario (también como
+# cabecera X-Leer-Primario, para clientes sin cookies) y sus lecturas van al primario durante
+# REPLICA_VENTANA_S segundos.
+
+# CONFIGURACIÓN
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_VENTANA_S = float(os.getenv("REPLICA_VENTANA_S", 5))        # lecturas al primario tras escribir
+REPLICA_CHEQUEO_S = float(os.getenv("REPLICA_CHEQUEO_S", 5))        # intervalo de los chequeos de salud
+REPLICA_MAX_ATRASO_S = float(os.getenv("REPLICA_MAX_ATRASO_S", 30))
+
+COOKIE = "leer_primario"
+CABECERA = "x-leer-primario"
+METODOS_ESCRITURA = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+# RÉPLICAS Y SALUD
+
+class Replica:
+    def __init__(self, nombre: str, url: str):
+        self.nombre = nombre
+        self.url = url
+        self.engine = crear_engine(url)
+        self.async_engine = crear_async_engine(url) if DB_MODO == "async" else None
+        self.sana = True            # optimista hasta el primer chequeo
+        self.atraso_s: Optional[float] = None
+        self.fallos = 0
+        self.lecturas = 0
+        self.ultimo_error: Optional[str] = None
+        self.ultimo_chequeo: Optional[float] = None
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "url": make_url(self.url).render_as_string(hide_password=True),
+            "sana": self.sana,
+            "atraso_s": self.atraso_s,
+            "fallos": self.fallos,
+            "lecturas": self.lecturas,
+            "ultimo_error": self.ultimo_error,
+            "pool": estadisticas_pool(self.engine),
+        }
+
+def _ultimo_cambio(engine_: Engine) -> int:
+    from data.models import Cambio
+    with Session(engine_) as session:
+        return session.exec(select(func.coalesce(func.max(Cambio.id), 0))).one()
+
+def medir_atraso(replica: Replica, primario: Engine = None) -> float:
+    # Segundos desde la escritura más antigua del primario que la réplica todavía no tiene (0 si está al día)
+    from data.models import Cambio, ahora
+    from operations.cambios import secuenciar
+    with Session(replica.engine) as session:
+        session.exec(text("SELECT 1"))
+    visto = _ultimo_cambio(replica.engine)
+    secuenciar(primario or engine)
+    with Session(primario or engine) as session:
+        pendiente = session.exec(
+            select(Cambio.creado_en).where(Cambio.id > visto).order_by(Cambio.id).limit(1)
+        ).first()
+    if pendiente is None:
+        return 0.0
+    return max((ahora() - pendiente).total_seconds(), 0.0)
+
+
+# ENRUTADOR
+
+class Enrutador:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(urls, 1)]
+        self.lecturas_primario = {"sin_replicas": 0, "pegajosa": 0}
+        self._turno = itertools.count()
+        self._lock = threading.Lock()
+        self._tarea: Optional[asyncio.Task] = None
+
+    def elegir(self) -> Optional[Replica]:
+        sanas = [r for r in self.replicas if r.sana]
+        if not sanas:
+            return None
+        return sanas[next(self._turno) % len(sanas)]
+
+    def chequear(self) -> None:
+        for replica in self.replicas:
+            try:
+                atraso = medir_atraso(replica)
+            except Exception as e:
+                self.marcar_caida(replica, e)
+                continue
+            with self._lock:
+                replica.atraso_s = round(atraso, 3)
+                replica.ultimo_chequeo = time.time()
+                replica.ultimo_error = None
+                sana = atraso <= REPLICA_MAX_ATRASO_S
+                if sana != replica.sana:
+                    log.warning("%s %s (atraso %.1fs)", replica.nombre, "vuelve al reparto" if sana else "sale del reparto", atraso)
+                replica.sana = sana
+
+    def marcar_caida(self, replica: Replica, error: Exception) -> None:
+        mensaje = str(error).splitlines()[0][:200]
+        with self._lock:
+            if replica.sana:
+                log.warning("%s sale del reparto: %s", replica.nombre, mensaje)
+            replica.sana = False
+            replica.fallos += 1
+            replica.ultimo_error = mensaje
+            replica.ultimo_chequeo = time.time()
+
+    def contar(self, replica: Optional[Replica], motivo: str = "sin_replicas") -> None:
+        with self._lock:
+            if replica is not None:
+                replica.lecturas += 1
+            else:
+                self.lecturas_primario[motivo] += 1
+
+    # Chequeo periódico en el proceso (arranca con la aplicación si hay réplicas)
+    def iniciar(self) -> None:
+        if self.replicas and REPLICA_CHEQUEO_S > 0 and self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._ciclo())
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _ciclo(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.chequear)
+            except Exception:
+                log.exception("Error al chequear réplicas")
+            await asyncio.sleep(REPLICA_CHEQUEO_S)
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "ventana_s": REPLICA_VENTANA_S,
+            "max_atraso_s": REPLICA_MAX_ATRASO_S,
+            "lecturas_primario": dict(self.lecturas_primario),
+            "replicas": {r.nombre: r.estado() for r in self.replicas},
+        }
+
+enrutador = Enrutador(DATABASE_REPLICA_URLS)
+
+def gauges() -> Dict[Tuple[Tuple[str, str], ...], float]:
+    datos = {(("destino", "primario"), ("dato", f"lecturas_{k}")): v for k, v in enrutador.lecturas_primario.items()}
+    for r in enrutador.replicas:
+        datos[(("destino", r.nombre), ("dato", "sana"))] = int(r.sana)
+        datos[(("destino", r.nombre), ("dato", "lecturas"))] = r.lecturas
+        if r.atraso_s is not None:
+            datos[(("destino", r.nombre), ("dato", "atraso_s"))] = r.atraso_s
+    return datos
+
+
+# READ-YOUR-WRITES
+
+def pegada_al_primario(request: Request) -> bool:
+    valor = request.cookies.get(COOKIE) or request.headers.get(CABECERA)
+    try:
+        return float(valor) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+def replica_para(request: Request) -> Optional[Replica]:
+    # None = primario. Deja el destino en request.state para la cabecera X-Origen-Lectura
+    if not enrutador.replicas:
+        replica, motivo = None, "sin_replicas"
+    elif pegada_al_primario(request):
+        replica, motivo = None, "pegajosa"
+    else:
+        replica = enrutador.elegir()
+        motivo = "sin_replicas"
+    enrutador.contar(replica, motivo)
+    request.state.origen_lectura = replica.nombre if replica else "primario"
+    return replica
+
+class LecturaPrimarioMiddleware:
+    # Tras una escritura con respuesta 2xx/3xx marca al cliente para leer del primario REPLICA_VENTANA_S
+    # segundos; en las lecturas informa el destino en X-Origen-Lectura
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enrutador.replicas:
+            await self.app(scope, receive, send)
+            return
+        escritura = scope["method"] in METODOS_ESCRITURA
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                cabeceras = list(mensaje.get("headers", []))
+                if escritura and mensaje["status"] < 400:
+                    hasta = f"{time.time() + REPLICA_VENTANA_S:.3f}"
+                    cabeceras.append((b"set-cookie", (
+                        f"{COOKIE}={hasta}; Max-Age={int(REPLICA_VENTANA_S) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                    ).encode()))
+                    cabeceras.append((CABECERA.encode(), hasta.encode()))
+                origen = scope.get("state", {}).get("origen_lectura")
+                if origen:
+                    cabeceras.append((b"x-origen-lectura", origen.encode()))
+                mensaje["headers"] = cabeceras
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+
+
+# SESIONES DE LECTURA
+
+def engine_lectura(request: Request) -> Engine:
+    replica = replica_para(request)
+    return replica.engine if replica else engine
+
+def get_read_session(request: Request):
+    replica = replica_para(request)
+    if replica is None:
+        with Session(engine) as session:
+            yield session
+        return
+    with Session(replica.engine, info={"replica": replica.nombre}) as session:
+        try:
+            yield session
+        except OperationalError as e:
+            enrutador.marcar_caida(replica, e)   # las siguientes lecturas van a otra réplica o al primario
+            raise
+
+async def get_async_read_session(request: Request):
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from utils.db import async_engine
+    replica = replica_para(request)
+    if replica is None:
+        async with AsyncSession(async_engine) as session:
+            yield session
+        return
+    async with AsyncSession(replica.async_engine, info={"replica": replica.nombre}) as session:
+        try:
+            yield session
+        except OperationalError as e:
+            enrutador.marcar_caida(replica, e)
+            raise
+
+
+# RÉPLICA LOCAL PARA PRUEBAS (python -m utils.replicas copiar --origen a.db --destino b.db --intervalo 2)
+# Copia el archivo SQLite primario sobre la réplica con la API de backup cada --intervalo segundos:
+# simula una réplica asíncrona con ese atraso.
+
+def copiar_sqlite(origen: str, destino: str) -> None:
+    import sqlite3
+    from contextlib import closing
+    with closing(sqlite3.connect(origen)) as fuente, closing(sqlite3.connect(destino)) as copia:
+        fuente.backup(copia)
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Mantiene una réplica SQLite local copiando el primario")
+    parser.add_argument("comando", choices=("copiar",))
+    parser.add_argument("--origen", required=True, help="Archivo SQLite primario")
+    parser.add_argument("--destino", required=True, help="Archivo SQLite réplica")
+    parser.add_argument("--intervalo", type=float, default=0, help="Segundos entre copias (0: una sola)")
+    args = parser.parse_args(argv)
+    while True:
+        t0 = time.perf_counter()
+        copiar_sqlite(args.origen, args.destino)
+        print(f"réplica actualizada en {(time.perf_counter() - t0) * 1000:.0f} ms")
+        if args.intervalo <= 0:
+            break
+        time.sleep(args.intervalo)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import gzip
+import os
+from typing import Any, Dict, Optional
+
+import brotli
+import orjson
+from fastapi import Request, Response
+
+# RESPUESTAS RÁPIDAS (listas y rosters)
+# Las filas salen de la base ya validadas al escribirse: se serializan con orjson sin pasar por response_model
+# (en un roster grande la revalidación de EmailStr y json.dumps son la mayor parte del tiempo de la petición).
+
+COMPRIMIR_MIN_BYTES = int(os.getenv("COMPRIMIR_MIN_BYTES", "1024"))
+NIVEL_GZIP = int(os.getenv("NIVEL_GZIP", "5"))
+NIVEL_BROTLI = int(os.getenv("NIVEL_BROTLI", "4"))
+
+CODIFICACIONES = ("br", "gzip")   # a igual q se prefiere br: comprime más con un costo parecido
+
+def _aceptadas(valor: str) -> Dict[str, float]:
+    # "gzip;q=0.8, br" -> {"gzip": 0.8, "br": 1.0}
+    aceptadas = {}
+    for parte in valor.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, numero = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    q = float(numero)
+                except ValueError:
+                    q = 0.0
+        aceptadas[nombre] = q
+    return aceptadas
+
+def elegir_codificacion(request: Request) -> Optional[str]:
+    aceptadas = _aceptadas(request.headers.get("accept-encoding", ""))
+    comodin = aceptadas.get("*", 0.0)
+    q, _, codificacion = max((aceptadas.get(c, comodin), -i, c) for i, c in enumerate(CODIFICACIONES))
+    return codificacion if q > 0 else None
+
+def comprimir(cuerpo: bytes, codificacion: str) -> bytes:
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=NIVEL_BROTLI)
+    return gzip.compress(cuerpo, compresslevel=NIVEL_GZIP)
+
+def json_rapido(request: Request, response: Response, datos: Any) -> Response:
+    # Conserva las cabeceras ya puestas en `response` (X-Next-Cursor, ETag...): al devolver un Response
+    # propio FastAPI no las copia
+    cabeceras = {k: v for k, v in response.headers.items() if k != "content-length"}
+    cabeceras["Vary"] = "Accept-Encoding"
+    cuerpo = orjson.dumps(datos)
+    codificacion = elegir_codificacion(request) if len(cuerpo) >= COMPRIMIR_MIN_BYTES else None
+    if codificacion:
+        cuerpo = comprimir(cuerpo, codificacion)
+        cabeceras["Content-Encoding"] = codificacion
+        if "etag" in cabeceras and not cabeceras["etag"].startswith("W/"):
+            # Otra codificación, otros bytes: la etiqueta pasa a débil (If-None-Match compara débil)
+            cabeceras["etag"] = "W/" + cabeceras["etag"]
+    return Response(cuerpo, status_code=response.status_code or 200, headers=cabeceras, media_type="application/json")